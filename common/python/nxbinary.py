@@ -0,0 +1,294 @@
+# Copyright 2021, Peter Birch, mailto:peter@lightlogic.co.uk
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from enum import IntEnum
+import json
+import mmap
+from pathlib import Path
+import struct
+
+import numpy as np
+
+# File identification
+NXB_MAGIC   = b"NXB\x00"
+NXB_VERSION = 1
+
+# Header - magic, version, section count, rows, columns, node inputs, node
+# outputs, node registers, node slots
+HEADER = struct.Struct("<4sHHIIIIII")
+# Section directory entry - section ID, item size, byte offset, byte size
+SECTION = struct.Struct("<IIQQ")
+# Alignment of every section within the file
+ALIGNMENT = 8
+
+class Section(IntEnum):
+    NODES    = 0 # Per-node table (position and instruction range)
+    INSTRS   = 1 # All instructions, concatenated in node order
+    LOOPBACK = 2 # Loopback masks as 32-bit words, one row per node
+    OUTPUTS  = 3 # Range of mappings for every output of every node
+    MAPPINGS = 4 # All output mappings, concatenated in node/output order
+    METADATA = 5 # JSON encoded reports, operation signatures and node memory
+
+# Fixed-width record layouts
+NODE_DTYPE = np.dtype([
+    ("row",         "<u2"),
+    ("column",      "<u2"),
+    ("instr_start", "<u4"),
+    ("instr_count", "<u4"),
+])
+INSTR_DTYPE    = np.dtype("<u4")
+LOOPBACK_DTYPE = np.dtype("<u4")
+OUTPUT_DTYPE   = np.dtype([
+    ("start", "<u4"),
+    ("count", "<u4"),
+])
+MAPPING_DTYPE = np.dtype([
+    ("row",    "<u2"),
+    ("column", "<u2"),
+    ("index",  "<u2"),
+    ("is_seq", "<u1"),
+    ("pad",    "<u1"),
+])
+
+# Keys of the compiled design dictionary (matching nxcompile's export)
+DESIGN_CONFIG  = "configuration"
+DESIGN_NODES   = "nodes"
+DESIGN_REPORTS = "reports"
+CONFIG_ROWS    = "rows"
+CONFIG_COLUMNS = "columns"
+CONFIG_NODE    = "node"
+CFG_ND_INPUTS  = "inputs"
+CFG_ND_OUTPUTS = "outputs"
+CFG_ND_REGS    = "registers"
+CFG_ND_SLOTS   = "slots"
+CFG_ND_MEMORY  = "memory"
+NODE_ROW       = "row"
+NODE_COLUMN    = "column"
+NODE_INSTRS    = "instructions"
+NODE_LOOPBACK  = "loopback"
+NODE_OUTPUTS   = "outputs"
+NODE_SIGS      = "signatures"
+MAPPING_ROW    = "row"
+MAPPING_COLUMN = "column"
+MAPPING_INDEX  = "index"
+MAPPING_IS_SEQ = "is_seq"
+
+def loopback_words(inputs):
+    """ Number of 32-bit words required to hold a loopback mask.
+
+    Args:
+        inputs: Number of inputs per node
+    """
+    return max(1, (inputs + 31) // 32)
+
+def is_nxb(path):
+    """ Test whether a file is a binary compiled design.
+
+    Args:
+        path: Path to the file
+
+    Returns: True if the file starts with the binary container's magic
+    """
+    with open(path, "rb") as fh:
+        return fh.read(len(NXB_MAGIC)) == NXB_MAGIC
+
+def write_nxb(path, design):
+    """ Write a compiled design out as a binary container.
+
+    Args:
+        path  : Path to the output file
+        design: Dictionary describing the compiled design
+    """
+    config   = design[DESIGN_CONFIG]
+    rows     = config[CONFIG_ROWS]
+    columns  = config[CONFIG_COLUMNS]
+    node_cfg = config[CONFIG_NODE]
+    inputs   = node_cfg[CFG_ND_INPUTS]
+    outputs  = node_cfg[CFG_ND_OUTPUTS]
+    lb_words = loopback_words(inputs)
+    nodes    = design[DESIGN_NODES]
+    # Build up the fixed-width sections
+    node_tbl = np.zeros(len(nodes), dtype=NODE_DTYPE)
+    loopback = np.zeros((len(nodes), lb_words), dtype=LOOPBACK_DTYPE)
+    out_tbl  = np.zeros((len(nodes), outputs), dtype=OUTPUT_DTYPE)
+    instrs, mappings, signatures = [], [], []
+    for idx, node in enumerate(nodes):
+        node_tbl[idx] = (
+            node[NODE_ROW], node[NODE_COLUMN], len(instrs),
+            len(node[NODE_INSTRS]),
+        )
+        instrs += node[NODE_INSTRS]
+        for word in range(lb_words):
+            loopback[idx, word] = (node[NODE_LOOPBACK] >> (32 * word)) & 0xFFFFFFFF
+        for out_idx, entries in enumerate(node[NODE_OUTPUTS]):
+            out_tbl[idx, out_idx] = (len(mappings), len(entries))
+            mappings += [(
+                x[MAPPING_ROW], x[MAPPING_COLUMN], x[MAPPING_INDEX],
+                1 if x[MAPPING_IS_SEQ] else 0, 0,
+            ) for x in entries]
+        signatures.append(node.get(NODE_SIGS, None))
+    metadata = { DESIGN_REPORTS: design.get(DESIGN_REPORTS, {}) }
+    if CFG_ND_MEMORY in node_cfg:
+        metadata[CFG_ND_MEMORY] = node_cfg[CFG_ND_MEMORY]
+    if any(x is not None for x in signatures):
+        metadata[NODE_SIGS] = signatures
+    sections = [
+        (Section.NODES,    NODE_DTYPE.itemsize,    node_tbl.tobytes()),
+        (Section.INSTRS,   INSTR_DTYPE.itemsize,   np.array(instrs, dtype=INSTR_DTYPE).tobytes()),
+        (Section.LOOPBACK, LOOPBACK_DTYPE.itemsize, loopback.tobytes()),
+        (Section.OUTPUTS,  OUTPUT_DTYPE.itemsize,  out_tbl.tobytes()),
+        (Section.MAPPINGS, MAPPING_DTYPE.itemsize, np.array(mappings, dtype=MAPPING_DTYPE).tobytes()),
+        (Section.METADATA, 1,                      json.dumps(metadata).encode("utf-8")),
+    ]
+    # Lay out the sections after the header and directory
+    def align(offset): return (offset + ALIGNMENT - 1) // ALIGNMENT * ALIGNMENT
+    offset    = align(HEADER.size + (SECTION.size * len(sections)))
+    directory = []
+    for sect_id, item_size, data in sections:
+        directory.append((sect_id, item_size, offset, len(data)))
+        offset = align(offset + len(data))
+    # Write out the file
+    with open(path, "wb") as fh:
+        fh.write(HEADER.pack(
+            NXB_MAGIC, NXB_VERSION, len(sections), rows, columns, inputs,
+            outputs, node_cfg[CFG_ND_REGS], node_cfg[CFG_ND_SLOTS],
+        ))
+        for entry in directory: fh.write(SECTION.pack(*entry))
+        for (_, _, data), (_, _, offset, _) in zip(sections, directory):
+            fh.write(b"\x00" * (offset - fh.tell()))
+            fh.write(data)
+
+class NXBinary:
+    """
+    Read-only view of a binary compiled design. The file is memory mapped and
+    every fixed-width section is exposed as a NumPy array referencing the
+    mapping directly, so no data is copied until it is accessed.
+    """
+
+    def __init__(self, path):
+        """ Open a binary compiled design.
+
+        Args:
+            path: Path to the file
+        """
+        self.path = Path(path)
+        with open(self.path, "rb") as fh:
+            self.__map = mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ)
+        # Decode the header
+        (
+            magic, version, num_sects, self.rows, self.columns, self.inputs,
+            self.outputs, self.registers, self.slots
+        ) = HEADER.unpack_from(self.__map, 0)
+        if magic != NXB_MAGIC:
+            raise Exception(f"{self.path} is not a binary compiled design")
+        if version != NXB_VERSION:
+            raise Exception(
+                f"Unsupported binary design version {version} (expecting "
+                f"{NXB_VERSION})"
+            )
+        # Decode the section directory
+        self.__sections = {}
+        for idx in range(num_sects):
+            sect_id, item_size, offset, size = SECTION.unpack_from(
+                self.__map, HEADER.size + (idx * SECTION.size)
+            )
+            self.__sections[sect_id] = (item_size, offset, size)
+        # Create views onto each section
+        self.nodes        = self.__view(Section.NODES,    NODE_DTYPE)
+        self.instructions = self.__view(Section.INSTRS,   INSTR_DTYPE)
+        self.loopback     = self.__view(Section.LOOPBACK, LOOPBACK_DTYPE).reshape(
+            -1, loopback_words(self.inputs)
+        )
+        self.output_table = self.__view(Section.OUTPUTS,  OUTPUT_DTYPE).reshape(
+            -1, self.outputs
+        )
+        self.mappings     = self.__view(Section.MAPPINGS, MAPPING_DTYPE)
+        self.__metadata   = None
+
+    def __view(self, section, dtype):
+        item_size, offset, size = self.__sections[section]
+        assert item_size == dtype.itemsize, \
+            f"Section {Section(section).name} has unexpected item size {item_size}"
+        return np.frombuffer(
+            self.__map, dtype=dtype, count=(size // item_size), offset=offset
+        )
+
+    @property
+    def metadata(self):
+        """ Decoded reports and signatures (parsed on first access) """
+        if self.__metadata is None:
+            _, offset, size = self.__sections[Section.METADATA]
+            self.__metadata = json.loads(self.__map[offset:offset+size])
+        return self.__metadata
+
+    @property
+    def reports(self):
+        return self.metadata[DESIGN_REPORTS]
+
+    def node_loopback(self, index):
+        """ Reassemble the loopback mask of a node from its words.
+
+        Args:
+            index: Index of the node within the node table
+        """
+        return sum(
+            (int(x) << (32 * i)) for i, x in enumerate(self.loopback[index])
+        )
+
+    def to_design(self):
+        """ Rebuild the dictionary form of the design (as exported to JSON).
+
+        Returns: Dictionary describing the design
+        """
+        signatures = self.metadata.get(NODE_SIGS, None)
+        nodes      = []
+        for idx, entry in enumerate(self.nodes):
+            start, count = int(entry["instr_start"]), int(entry["instr_count"])
+            outputs = []
+            for out in self.output_table[idx]:
+                outputs.append([{
+                    MAPPING_ROW   : int(x["row"]),
+                    MAPPING_COLUMN: int(x["column"]),
+                    MAPPING_INDEX : int(x["index"]),
+                    MAPPING_IS_SEQ: bool(x["is_seq"]),
+                } for x in self.mappings[out["start"]:out["start"]+out["count"]]])
+            # Nodes without any messages carry an empty list of outputs
+            if not any(outputs): outputs = []
+            node = {
+                NODE_ROW     : int(entry["row"]),
+                NODE_COLUMN  : int(entry["column"]),
+                NODE_INSTRS  : [int(x) for x in self.instructions[start:start+count]],
+                NODE_LOOPBACK: self.node_loopback(idx),
+                NODE_OUTPUTS : outputs,
+            }
+            if signatures and signatures[idx] is not None:
+                node[NODE_SIGS] = signatures[idx]
+            nodes.append(node)
+        design = {
+            DESIGN_CONFIG: {
+                CONFIG_ROWS   : self.rows,
+                CONFIG_COLUMNS: self.columns,
+                CONFIG_NODE   : {
+                    CFG_ND_INPUTS : self.inputs,
+                    CFG_ND_OUTPUTS: self.outputs,
+                    CFG_ND_REGS   : self.registers,
+                    CFG_ND_SLOTS  : self.slots,
+                },
+            },
+            DESIGN_NODES  : nodes,
+            DESIGN_REPORTS: self.reports,
+        }
+        if CFG_ND_MEMORY in self.metadata:
+            design[DESIGN_CONFIG][CONFIG_NODE][CFG_ND_MEMORY] = self.metadata[CFG_ND_MEMORY]
+        return design
@@ -0,0 +1,374 @@
+# Copyright 2021, Peter Birch, mailto:peter@lightlogic.co.uk
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import importlib
+import importlib.util
+import inspect
+import logging
+from pathlib import Path
+import random
+import sys
+
+import click
+import numpy as np
+from packtype import Enum, Package, Struct
+from packtype.instance import Instance
+from packtype.templates.common import snake_case
+
+logging.basicConfig(level="INFO", format="%(message)s")
+log = logging.getLogger("nxcodegen")
+
+# Name of the generated module
+OUTPUT_NAME = "nxcodecs"
+
+# Field kinds recorded in the generated layout table
+KIND_SCALAR = "scalar"
+KIND_ENUM   = "enum"
+KIND_STRUCT = "struct"
+
+def load_package(spec):
+    """ Import a packtype specification and return the package it declares.
+
+    Args:
+        spec: Path to the specification
+    """
+    imp_spec = importlib.util.spec_from_file_location(spec.stem, spec.absolute())
+    pt_spec  = importlib.util.module_from_spec(imp_spec)
+    imp_spec.loader.exec_module(pt_spec)
+    pkgs = [
+        x for _, x in inspect.getmembers(pt_spec) if isinstance(x, Package)
+    ]
+    assert len(pkgs) == 1, f"Expected a single package in {spec}, found {len(pkgs)}"
+    return pkgs[0]
+
+def extract_layouts(package):
+    """ Determine the layout of every struct declared in a package.
+
+    Args:
+        package: The packtype package
+
+    Returns: Dictionary of struct name to tuple of the total width and a tuple
+             of (name, LSB, width, kind, detail) for each field, ordered from
+             the least significant field. The detail is the tuple of legal
+             values for enumerations, or the struct name for nested structs.
+    """
+    layouts = {}
+    for name, obj in package._pt_items():
+        if not isinstance(obj, Struct): continue
+        fields = []
+        for f_name, field in obj._pt_items():
+            kind, detail = KIND_SCALAR, None
+            if isinstance(field, Instance) and isinstance(field._pt_container, Enum):
+                kind   = KIND_ENUM
+                detail = tuple(sorted(
+                    int(x.value) for _, x in field._pt_container._pt_items()
+                ))
+            elif isinstance(field, Instance) and isinstance(field._pt_container, Struct):
+                kind   = KIND_STRUCT
+                detail = field._pt_container._pt_name
+            fields.append((f_name, field._pt_lsb, field._pt_width, kind, detail))
+        layouts[name] = (obj._pt_width, tuple(sorted(fields, key=lambda x: x[1])))
+    return layouts
+
+def render(source, layouts):
+    """ Render the codec module for a set of struct layouts.
+
+    Args:
+        source : Path of the specification the layouts came from
+        layouts: Layouts as returned by 'extract_layouts'
+
+    Returns: Source code of the generated module
+    """
+    lines = [
+        f"# Generated by nxcodegen from {source.name} - do not edit",
+        "",
+        "from collections import namedtuple",
+        "",
+        "import numpy as np",
+        "",
+        "# Layout of every struct - total width and (name, LSB, width, kind, detail)",
+        "# for each field, least significant first",
+        "LAYOUTS = {",
+    ]
+    for name, (width, fields) in layouts.items():
+        lines.append(f"    {name!r}: ({width}, (")
+        for field in fields: lines.append(f"        {field!r},")
+        lines.append("    )),")
+    lines += [
+        "}",
+        "",
+        "def _place(out, value, lsb, width):",
+        "    \"\"\" OR a field of up to 64 bits into an array of 64-bit words \"\"\"",
+        "    value = np.asarray(value).astype(np.uint64) & np.uint64((1 << width) - 1)",
+        "    word, shift = divmod(lsb, 64)",
+        "    out[..., word] |= value << np.uint64(shift)",
+        "    if shift and (shift + width) > 64:",
+        "        out[..., word + 1] |= value >> np.uint64(64 - shift)",
+        "",
+        "def _take(words, lsb, width):",
+        "    \"\"\" Extract a field of up to 64 bits from an array of 64-bit words \"\"\"",
+        "    word, shift = divmod(lsb, 64)",
+        "    value = words[..., word] >> np.uint64(shift)",
+        "    if shift and (shift + width) > 64:",
+        "        value = value | (words[..., word + 1] << np.uint64(64 - shift))",
+        "    return value & np.uint64((1 << width) - 1)",
+        "",
+    ]
+    for name, (width, fields) in layouts.items():
+        lines += render_struct(name, width, fields)
+    return "\n".join(lines) + "\n"
+
+def render_struct(name, width, fields):
+    """ Render the scalar and array codecs for a single struct.
+
+    Args:
+        name  : Name of the struct
+        width : Total width of the struct in bits
+        fields: Fields of the struct, least significant first
+
+    Returns: List of lines of source code
+    """
+    func   = snake_case(name)
+    names  = [x[0] for x in fields]
+    args   = ", ".join(f"{x}=0" for x in names)
+    words  = (width + 63) // 64
+    lines  = [
+        "# " + ("=" * 78),
+        f"# {name} ({width} bits)",
+        "# " + ("=" * 78),
+        "",
+        f"{name}Fields = namedtuple({name + 'Fields'!r}, {names!r})",
+        "",
+        f"def encode_{func}({args}):",
+        f"    \"\"\" Encode {name} fields into a {width} bit scalar \"\"\"",
+        "    return (",
+    ]
+    lines += [
+        f"        ((int({f_name}) & 0x{(1 << f_width) - 1:X}) << {f_lsb}) |"
+        for f_name, f_lsb, f_width, _, _ in fields
+    ]
+    lines[-1] = lines[-1][:-2]
+    lines += [
+        "    )",
+        "",
+        f"def decode_{func}(scalar):",
+        f"    \"\"\" Decode a {width} bit scalar into {name} fields \"\"\"",
+        f"    return {name}Fields(",
+    ]
+    lines += [
+        f"        (scalar >> {f_lsb}) & 0x{(1 << f_width) - 1:X},"
+        for _, f_lsb, f_width, _, _ in fields
+    ]
+    lines += ["    )", ""]
+    # Structs that fit within 64 bits are handled as flat uint64 arrays
+    if width <= 64:
+        lines += [
+            f"def encode_{func}_array({args}):",
+            f"    \"\"\" Encode arrays of {name} fields into a uint64 array \"\"\"",
+            "    return (",
+        ]
+        lines += [
+            f"        ((np.asarray({f_name}).astype(np.uint64) & "
+            f"np.uint64(0x{(1 << f_width) - 1:X})) << np.uint64({f_lsb})) |"
+            for f_name, f_lsb, f_width, _, _ in fields
+        ]
+        lines[-1] = lines[-1][:-2]
+        lines += [
+            "    )",
+            "",
+            f"def decode_{func}_array(scalars):",
+            f"    \"\"\" Decode a uint64 array into arrays of {name} fields \"\"\"",
+            "    scalars = np.asarray(scalars).astype(np.uint64)",
+            f"    return {name}Fields(",
+        ]
+        lines += [
+            f"        (scalars >> np.uint64({f_lsb})) & np.uint64(0x{(1 << f_width) - 1:X}),"
+            for _, f_lsb, f_width, _, _ in fields
+        ]
+        lines += ["    )", ""]
+        return lines
+    # Wider structs are held as little-endian 64-bit words in the last axis, as
+    # are any fields wider than 64 bits
+    narrow = [x[0] for x in fields if x[2] <= 64]
+    wide   = [x[0] for x in fields if x[2] > 64]
+    lines += [
+        f"def encode_{func}_array({args}):",
+        f"    \"\"\"",
+        f"    Encode arrays of {name} fields into a uint64 array with {words} words",
+        f"    in the last axis (least significant first). Fields wider than 64",
+        f"    bits are provided in the same form.",
+        f"    \"\"\"",
+        "    shape = np.broadcast(" + ", ".join(
+            [f"np.asarray({x})" for x in narrow] +
+            [f"np.asarray({x})[..., 0]" for x in wide]
+        ) + (",)" if len(narrow + wide) == 1 else ")") + ".shape",
+        f"    out   = np.zeros(shape + ({words},), dtype=np.uint64)",
+    ]
+    for f_name, f_lsb, f_width, _, _ in fields:
+        if f_width <= 64:
+            lines.append(f"    _place(out, {f_name}, {f_lsb}, {f_width})")
+        else:
+            lines.append(f"    {f_name} = np.asarray({f_name})")
+            for idx in range((f_width + 63) // 64):
+                lines.append(
+                    f"    _place(out, {f_name}[..., {idx}], {f_lsb + (64 * idx)}, "
+                    f"{min(64, f_width - (64 * idx))})"
+                )
+    lines += [
+        "    return out",
+        "",
+        f"def decode_{func}_array(words):",
+        f"    \"\"\"",
+        f"    Decode a uint64 array with {words} words in the last axis (least",
+        f"    significant first) into arrays of {name} fields. Fields wider than",
+        f"    64 bits are returned in the same form.",
+        f"    \"\"\"",
+        "    words = np.asarray(words).astype(np.uint64)",
+        f"    return {name}Fields(",
+    ]
+    for _, f_lsb, f_width, _, _ in fields:
+        if f_width <= 64:
+            lines.append(f"        _take(words, {f_lsb}, {f_width}),")
+        else:
+            lines.append("        np.stack((" + " ".join(
+                f"_take(words, {f_lsb + (64 * idx)}, {min(64, f_width - (64 * idx))}),"
+                for idx in range((f_width + 63) // 64)
+            ) + "), axis=-1),")
+    lines += ["    )", ""]
+    return lines
+
+def random_value(layouts, kind, width, detail, rng):
+    """ Choose a random legal value for a field.
+
+    Args:
+        layouts: All struct layouts
+        kind   : Kind of the field
+        width  : Width of the field
+        detail : Legal enumeration values, or nested struct name
+        rng    : Random number generator
+    """
+    if kind == KIND_ENUM:
+        return rng.choice(detail)
+    elif kind == KIND_STRUCT:
+        value = 0
+        for _, f_lsb, f_width, f_kind, f_detail in layouts[detail][1]:
+            value |= random_value(layouts, f_kind, f_width, f_detail, rng) << f_lsb
+        return value
+    else:
+        return rng.getrandbits(width)
+
+def to_words(value, count):
+    """ Split a scalar into little-endian 64-bit words.
+
+    Args:
+        value: The scalar
+        count: Number of words
+    """
+    return [(value >> (64 * x)) & ((1 << 64) - 1) for x in range(count)]
+
+def check(layouts, reference, codecs, count=256, seed=0):
+    """
+    Cross-check the generated codecs against the packtype classes, encoding and
+    decoding randomised fields through both scalar and array variants.
+
+    Args:
+        layouts  : All struct layouts
+        reference: Module holding the packtype-generated classes
+        codecs   : Module holding the generated codecs
+        count    : Number of random values to test for each struct
+        seed     : Seed for the random number generator
+
+    Returns: Number of mismatches found
+    """
+    rng    = random.Random(seed)
+    errors = 0
+    for name, (width, fields) in layouts.items():
+        cls     = getattr(reference, name)
+        func    = snake_case(name)
+        enc     = getattr(codecs, f"encode_{func}")
+        dec     = getattr(codecs, f"decode_{func}")
+        enc_arr = getattr(codecs, f"encode_{func}_array")
+        dec_arr = getattr(codecs, f"decode_{func}_array")
+        words   = (width + 63) // 64
+        samples = [{
+            x[0]: random_value(layouts, x[3], x[2], x[4], rng) for x in fields
+        } for _ in range(count)]
+        expected = []
+        for sample in samples:
+            obj = cls()
+            for key, value in sample.items():
+                setattr(obj, key, value)
+            expected.append(obj.pack())
+            if enc(**sample) != expected[-1]:
+                log.error(f"{name}: encode mismatch for {sample}")
+                errors += 1
+            if dec(expected[-1])._asdict() != sample:
+                log.error(f"{name}: decode mismatch for {expected[-1]:#x}")
+                errors += 1
+        # Exercise the array variants
+        def column(key, f_width):
+            if f_width <= 64:
+                return np.array([x[key] for x in samples], dtype=np.uint64)
+            return np.array(
+                [to_words(x[key], (f_width + 63) // 64) for x in samples],
+                dtype=np.uint64,
+            )
+        columns = { x[0]: column(x[0], x[2]) for x in fields }
+        packed  = enc_arr(**columns)
+        if width <= 64:
+            ref_arr = np.array(expected, dtype=np.uint64)
+        else:
+            ref_arr = np.array([to_words(x, words) for x in expected], dtype=np.uint64)
+        if not np.array_equal(packed, ref_arr):
+            log.error(f"{name}: array encode mismatch")
+            errors += 1
+        decoded = dec_arr(ref_arr)
+        for key, value in columns.items():
+            if not np.array_equal(getattr(decoded, key), value):
+                log.error(f"{name}: array decode mismatch for field {key}")
+                errors += 1
+        log.debug(f"Checked {count} values of {name}")
+    return errors
+
+@click.command()
+@click.option("--check-count", type=int, default=0, help="Randomised values to cross-check per struct")
+@click.option("--seed",        type=int, default=0, help="Seed for the cross-check")
+@click.argument("spec",   type=click.Path(exists=True, dir_okay=False))
+@click.argument("outdir", type=click.Path(file_okay=False), default=".")
+def main(check_count, seed, spec, outdir):
+    """
+    Generates plain shift and mask codecs for every struct declared in a
+    packtype SPEC, writing them into OUTDIR. If --check-count is non-zero the
+    codecs are cross-checked against the packtype-generated Python module,
+    which must already exist in OUTDIR.
+    """
+    spec, outdir = Path(spec), Path(outdir)
+    package = load_package(spec)
+    layouts = extract_layouts(package)
+    outdir.mkdir(parents=True, exist_ok=True)
+    out_path = outdir / f"{OUTPUT_NAME}.py"
+    with open(out_path, "w") as fh: fh.write(render(spec, layouts))
+    log.info(f"Generated codecs for {len(layouts)} structs into {out_path}")
+    if check_count > 0:
+        sys.path.insert(0, outdir.absolute().as_posix())
+        reference = importlib.import_module(snake_case(package._pt_name))
+        codecs    = importlib.import_module(OUTPUT_NAME)
+        errors    = check(layouts, reference, codecs, count=check_count, seed=seed)
+        if errors:
+            log.error(f"Cross-check against packtype failed with {errors} errors")
+            sys.exit(1)
+        log.info(f"Cross-checked {check_count} values per struct against packtype")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+# Copyright 2021, Peter Birch, mailto:peter@lightlogic.co.uk
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from functools import lru_cache
+import inspect
+
+import numpy as np
+
+@lru_cache(maxsize=None)
+def field_layout(cls):
+    """
+    Determine the bit layout of a packtype struct whose fields are all plain
+    integers. The layout is probed from the generated class itself (setting each
+    field to all ones and packing), so it always tracks nxconstants.
+
+    Args:
+        cls: The packtype struct class (e.g. nxconstants.Instruction)
+
+    Returns: Dictionary of field name to tuple of (LSB, width), ordered from
+             the least significant field
+    """
+    names = [
+        x for x in inspect.signature(cls.__init__).parameters
+        if x != "self" and not x.startswith("_pt_")
+    ]
+    layout = {}
+    for name in names:
+        probe = cls()
+        setattr(probe, name, -1)
+        mask = probe.pack()
+        assert mask > 0, f"Field {name} of {cls.__name__} has no width"
+        lsb  = (mask & -mask).bit_length() - 1
+        layout[name] = (lsb, (mask >> lsb).bit_length())
+    return dict(sorted(layout.items(), key=lambda x: x[1][0]))
+
+def unpack_fields(cls, words):
+    """ Decode an array of packed values into one array per field.
+
+    Args:
+        cls  : The packtype struct class
+        words: Array-like of packed values (must fit within 64 bits)
+
+    Returns: Dictionary of field name to NumPy array of field values
+    """
+    words = np.asarray(words, dtype=np.uint64)
+    return {
+        name: ((words >> np.uint64(lsb)) & np.uint64((1 << width) - 1))
+        for name, (lsb, width) in field_layout(cls).items()
+    }
+
+def pack_fields(cls, **fields):
+    """ Encode arrays of field values into an array of packed values.
+
+    Args:
+        cls   : The packtype struct class
+        fields: Array-like values for each field (missing fields are zero)
+
+    Returns: NumPy array of packed values
+    """
+    packed = None
+    for name, (lsb, width) in field_layout(cls).items():
+        if name not in fields: continue
+        value  = np.asarray(fields[name]).astype(np.uint64)
+        value  = (value & np.uint64((1 << width) - 1)) << np.uint64(lsb)
+        packed = value if packed is None else (packed | value)
+    assert packed is not None, f"No fields of {cls.__name__} were provided"
+    return packed
@@ -12,22 +12,74 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
-from dataclasses import dataclass, field
 import json
 from pathlib import Path
-from typing import List
 
+import numpy as np
+
+from nxbinary import (INSTR_DTYPE, LOOPBACK_DTYPE, MAPPING_DTYPE, NODE_DTYPE,
+                      OUTPUT_DTYPE, NXBinary, is_nxb, loopback_words)
 from nxconstants import Instruction, OutputLookup, OutputMapping
+from nxdecode import pack_fields, unpack_fields
 
-@dataclass
 class NodeState:
-    instructions : List[Instruction] = field(default_factory=list)
-    loopback     : int = 0
-    lookup       : List[OutputLookup] = field(default_factory=list)
-    mappings     : List[OutputMapping] = field(default_factory=list)
+    """
+    Program of a single node held as arrays of packed words - the packtype
+    objects ('instructions', 'lookup', and 'mappings') are only constructed when
+    they are first accessed.
+    """
+
+    def __init__(self, instr_words=None, loopback=0, lookup_words=None,
+                 mapping_words=None):
+        """ Initialise the NodeState instance.
+
+        Args:
+            instr_words  : Array of encoded instructions
+            loopback     : Loopback mask
+            lookup_words : Array of encoded output lookups
+            mapping_words: Array of encoded output mappings
+        """
+        def words(x): return np.zeros(0, dtype=np.uint64) if x is None else x
+        self.instr_words   = words(instr_words)
+        self.loopback      = loopback
+        self.lookup_words  = words(lookup_words)
+        self.mapping_words = words(mapping_words)
+        self.__objects     = {}
+
+    def __build(self, cls, words):
+        if cls not in self.__objects:
+            self.__objects[cls] = [cls(_pt_value=int(x)) for x in words]
+        return self.__objects[cls]
+
+    @property
+    def instructions(self): return self.__build(Instruction, self.instr_words)
+
+    @property
+    def lookup(self): return self.__build(OutputLookup, self.lookup_words)
+
+    @property
+    def mappings(self): return self.__build(OutputMapping, self.mapping_words)
+
+    @property
+    def fields(self):
+        """ Decoded instruction fields, as one array per field """
+        return unpack_fields(Instruction, self.instr_words)
+
+    @property
+    def stream(self):
+        """ Encoded instructions, lookups, and mappings in load order """
+        return np.concatenate((
+            self.instr_words, self.lookup_words, self.mapping_words
+        )).astype(np.uint64).tolist()
 
 class NXLoader:
-    """ Parses JSON designs exported by nxcompile """
+    """
+    Parses designs exported by nxcompile, either in the binary container format
+    (which is memory mapped) or in JSON (which is useful for debugging). Both
+    formats are presented through the same set of arrays - 'nodes',
+    'instructions', 'loopback', 'output_table', and 'mappings' - laid out as
+    described in nxbinary.
+    """
 
     # Main sections
     DESIGN_CONFIG  = "configuration"
@@ -57,57 +109,142 @@ class NXLoader:
         """ Load a design
 
         Args:
-            path: File handle or path to the JSON description of the design
+            path: File handle or path to the binary or JSON description of the
+                  design, or an already decoded design dictionary
         """
-        # Parse in the JSON description
-        if isinstance(path, Path):
+        # Binary designs are memory mapped, JSON designs are parsed
+        if isinstance(path, dict):
+            self.load_json(path)
+        elif isinstance(path, (str, Path)) and is_nxb(path):
+            self.load_binary(path)
+        elif isinstance(path, (str, Path)):
             with open(path, "r") as fh:
-                model = json.load(fh)
+                self.load_json(json.load(fh))
         else:
-            model = json.load(path)
+            self.load_json(json.load(path))
+        # Decode the tables
+        self.decode()
+        # Track state for each node
+        self.state = [
+            [NodeState() for _ in range(self.cfg_cols)] for _ in range(self.cfg_rows)
+        ]
+        for node_idx, entry in enumerate(self.nodes):
+            start = int(entry["instr_start"])
+            self.state[entry["row"]][entry["column"]] = NodeState(
+                instr_words  =self.instructions[start:start+int(entry["instr_count"])],
+                loopback     =sum(
+                    (int(x) << (32 * i)) for i, x in enumerate(self.loopback[node_idx])
+                ),
+                lookup_words =self.lookup_words[node_idx],
+                mapping_words=self.mapping_words[self.node_mappings[node_idx]],
+            )
+
+    def decode(self):
+        """
+        Decode the instruction and output tables as whole arrays. This produces:
+
+         * 'instr_fields'   - dictionary of instruction field name to an array
+                              holding that field for every instruction;
+         * 'lookup_active', 'lookup_start', and 'lookup_stop' - arrays of shape
+                              (nodes, outputs) describing each output lookup;
+         * 'lookup_words'   - encoded output lookups, shape (nodes, outputs);
+         * 'mapping_words'  - encoded output mappings;
+         * 'node_mappings'  - per-node index arrays into 'mapping_words' in
+                              output order.
+        """
+        self.instr_fields = unpack_fields(Instruction, self.instructions)
+        # Output lookups follow the instructions and the lookup table itself
+        counts = self.output_table["count"].astype(np.int64)
+        starts = self.output_table["start"].astype(np.int64)
+        first  = (
+            self.nodes["instr_count"].astype(np.int64)[:, None] + self.cfg_outs +
+            np.cumsum(counts, axis=1) - counts
+        )
+        self.lookup_active = counts > 0
+        self.lookup_start  = first
+        self.lookup_stop   = first + counts - 1
+        self.lookup_words  = pack_fields(
+            OutputLookup,
+            active=self.lookup_active,
+            start =self.lookup_start,
+            stop  =self.lookup_stop,
+        ).reshape(counts.shape)
+        # Encode every mapping, then gather each node's mappings in output order
+        self.mapping_words = pack_fields(
+            OutputMapping,
+            row   =self.mappings["row"],
+            column=self.mappings["column"],
+            index =self.mappings["index"],
+            is_seq=self.mappings["is_seq"],
+        ) if len(self.mappings) else np.zeros(0, dtype=np.uint64)
+        totals = counts.sum(axis=1)
+        self.node_mappings = []
+        for node_idx, total in enumerate(totals):
+            # Offset of each entry from the start of its output's range
+            rel = np.arange(total) - np.repeat(
+                np.cumsum(counts[node_idx]) - counts[node_idx], counts[node_idx]
+            )
+            self.node_mappings.append(
+                np.repeat(starts[node_idx], counts[node_idx]) + rel
+            )
+
+    def load_binary(self, path):
+        """ Map a binary design, using views onto the file for every table.
+
+        Args:
+            path: Path to the binary design
+        """
+        self.binary       = NXBinary(path)
+        self.cfg_rows     = self.binary.rows
+        self.cfg_cols     = self.binary.columns
+        self.cfg_ins      = self.binary.inputs
+        self.cfg_outs     = self.binary.outputs
+        self.cfg_regs     = self.binary.registers
+        self.nodes        = self.binary.nodes
+        self.instructions = self.binary.instructions
+        self.loopback     = self.binary.loopback
+        self.output_table = self.binary.output_table
+        self.mappings     = self.binary.mappings
+        self.reports      = self.binary.reports
+
+    def load_json(self, model):
+        """ Convert a JSON design into the same tables as a binary design.
+
+        Args:
+            model: The decoded JSON design
+        """
+        self.binary = None
         # Pickup the configuration section
         config        = model[NXLoader.DESIGN_CONFIG]
         self.cfg_rows = config[NXLoader.CONFIG_ROWS]
         self.cfg_cols = config[NXLoader.CONFIG_COLUMNS]
+        self.cfg_ins  = config[NXLoader.CONFIG_NODE][NXLoader.CFG_ND_INPUTS]
         self.cfg_outs = config[NXLoader.CONFIG_NODE][NXLoader.CFG_ND_OUTPUTS]
-        # Track state for each node
-        self.state = [
-            [NodeState() for _ in range(self.cfg_cols)] for _ in range(self.cfg_rows)
-        ]
-        # Start loading the compiled design into the mesh
-        nodes = model[NXLoader.DESIGN_NODES]
-        for node_data in nodes:
-            # Get the row and column of the target node
-            n_row = node_data[NXLoader.NODE_ROW]
-            n_col = node_data[NXLoader.NODE_COLUMN]
-            # Get point to the state object
-            state = self.state[n_row][n_col]
-            # Read in all of the instructions
-            for raw in node_data[NXLoader.NODE_INSTRS]:
-                instr = Instruction()
-                instr.unpack(raw)
-                state.instructions.append(instr)
-            # Pickup the loopback mapping
-            state.loopback = node_data[NXLoader.NODE_LOOPBACK]
-            # Read in all of the output mappings
-            counts = {}
+        self.cfg_regs = config[NXLoader.CONFIG_NODE][NXLoader.CFG_ND_REGS]
+        self.reports  = model.get(NXLoader.DESIGN_REPORTS, {})
+        # Build up the tables
+        nodes    = model[NXLoader.DESIGN_NODES]
+        lb_words = loopback_words(self.cfg_ins)
+        self.nodes        = np.zeros(len(nodes), dtype=NODE_DTYPE)
+        self.loopback     = np.zeros((len(nodes), lb_words), dtype=LOOPBACK_DTYPE)
+        self.output_table = np.zeros((len(nodes), self.cfg_outs), dtype=OUTPUT_DTYPE)
+        instrs, mappings  = [], []
+        for node_idx, node_data in enumerate(nodes):
+            self.nodes[node_idx] = (
+                node_data[NXLoader.NODE_ROW], node_data[NXLoader.NODE_COLUMN],
+                len(instrs), len(node_data[NXLoader.NODE_INSTRS]),
+            )
+            instrs += node_data[NXLoader.NODE_INSTRS]
+            for word in range(lb_words):
+                self.loopback[node_idx, word] = (
+                    node_data[NXLoader.NODE_LOOPBACK] >> (32 * word)
+                ) & 0xFFFFFFFF
             for idx, entries in enumerate(node_data[NXLoader.NODE_OUTPUTS]):
-                counts[idx] = len(entries)
-                for entry in entries:
-                    mapping = OutputMapping(
-                        row   =entry[NXLoader.MAPPING_ROW],
-                        column=entry[NXLoader.MAPPING_COLUMN],
-                        index =entry[NXLoader.MAPPING_INDEX],
-                        is_seq=entry[NXLoader.MAPPING_IS_SEQ],
-                    )
-                    state.mappings.append(mapping)
-            # Generate output lookups
-            offset = len(state.instructions) + self.cfg_outs
-            for idx in range(self.cfg_outs):
-                lookup = OutputLookup(
-                    active=(counts.get(idx, 0) > 0),
-                    start =offset,
-                    stop  =(offset + counts.get(idx, 0) - 1),
-                )
-                state.lookup.append(lookup)
-                offset += counts.get(idx, 0)
+                self.output_table[node_idx, idx] = (len(mappings), len(entries))
+                mappings += [(
+                    x[NXLoader.MAPPING_ROW], x[NXLoader.MAPPING_COLUMN],
+                    x[NXLoader.MAPPING_INDEX], 1 if x[NXLoader.MAPPING_IS_SEQ] else 0,
+                    0,
+                ) for x in entries]
+        self.instructions = np.array(instrs, dtype=INSTR_DTYPE)
+        self.mappings     = np.array(mappings, dtype=MAPPING_DTYPE)
@@ -0,0 +1,121 @@
+# Copyright 2021, Peter Birch, mailto:peter@lightlogic.co.uk
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import numpy as np
+
+from nxcodecs import (encode_control_request_to_mesh_array, encode_node_control,
+                      encode_node_control_array, encode_node_header,
+                      encode_node_load_array)
+from nxconstants import (ControlReqType, NodeCommand, NodeParameter,
+                         CONTROL_WIDTH, LOAD_SEG_WIDTH, NODE_PARAM_WIDTH)
+
+# Default width of each node's instruction RAM
+RAM_DATA_W = 32
+
+# Size of each wrapped request in bytes
+REQUEST_BYTES = CONTROL_WIDTH // 8
+
+def node_messages(row, column, stream, loopback, num_instrs, num_inputs,
+                  ram_data_w=RAM_DATA_W):
+    """
+    Encode the messages that load a node - the data stream split into segments,
+    the loopback mask, and the INSTRUCTIONS parameter - in the same order as
+    'load_data', 'load_loopback', and 'load_parameter' in the testbenches.
+
+    Args:
+        row       : Row of the node
+        column    : Column of the node
+        stream    : Encoded instructions, lookups, and mappings to load
+        loopback  : Loopback mask
+        num_instrs: Number of instructions
+        num_inputs: Number of inputs per node
+        ram_data_w: Width of the node's RAM
+
+    Returns: NumPy array of encoded 28-bit messages
+    """
+    load_hdr = encode_node_header(row=row, column=column, command=NodeCommand.LOAD)
+    ctrl_hdr = encode_node_header(row=row, column=column, command=NodeCommand.CONTROL)
+    # Split every entry into segments, most significant first
+    chunks   = ram_data_w // LOAD_SEG_WIDTH
+    words    = np.asarray(stream, dtype=np.uint64).reshape(-1, 1)
+    shifts   = np.arange(chunks - 1, -1, -1, dtype=np.uint64) * np.uint64(LOAD_SEG_WIDTH)
+    loads    = encode_node_load_array(
+        header=load_hdr,
+        last  =(np.arange(chunks) == (chunks - 1)),
+        data  =(words >> shifts),
+    )
+    # Program the loopback mask, most significant section first
+    selects  = np.arange(num_inputs // NODE_PARAM_WIDTH, -1, -1)
+    sections = [(loopback >> (int(x) * NODE_PARAM_WIDTH)) for x in selects]
+    lb_msgs  = encode_node_control_array(
+        header=ctrl_hdr,
+        param =NodeParameter.LOOPBACK,
+        value =np.array(
+            [x & ((1 << NODE_PARAM_WIDTH) - 1) for x in sections], dtype=np.uint64
+        ),
+    )
+    # Set the number of instructions
+    instrs = encode_node_control(
+        header=ctrl_hdr, param=NodeParameter.INSTRUCTIONS, value=num_instrs,
+    )
+    return np.concatenate((
+        loads.reshape(-1), lb_msgs, np.array([instrs], dtype=np.uint64)
+    )).astype(np.uint32)
+
+def design_messages(loader, ram_data_w=RAM_DATA_W):
+    """ Encode the messages that load every node of a design, in row order.
+
+    Args:
+        loader    : NXLoader holding the design
+        ram_data_w: Width of the node's RAM
+
+    Returns: NumPy array of encoded 28-bit messages
+    """
+    messages = []
+    for row, row_state in enumerate(loader.state):
+        for column, node in enumerate(row_state):
+            messages.append(node_messages(
+                row, column, node.stream, node.loopback, len(node.instr_words),
+                loader.cfg_ins, ram_data_w,
+            ))
+    return np.concatenate(messages)
+
+def wrap_messages(messages):
+    """
+    Wrap messages as ControlRequestToMesh requests, each encoded as a 128-bit
+    little-endian word exactly as sent to the controller.
+
+    Args:
+        messages: Array of encoded 28-bit messages
+
+    Returns: NumPy array of bytes, REQUEST_BYTES per message
+    """
+    words = encode_control_request_to_mesh_array(
+        command=ControlReqType.TO_MESH, message=messages,
+    )
+    return words.astype("<u8").view(np.uint8).reshape(-1)
+
+def write_load_stream(path, loader, ram_data_w=RAM_DATA_W):
+    """ Write the wrapped load stream of a design out as a flat binary blob.
+
+    Args:
+        path      : Path to the output file
+        loader    : NXLoader holding the design
+        ram_data_w: Width of the node's RAM
+
+    Returns: Number of requests written
+    """
+    blob = wrap_messages(design_messages(loader, ram_data_w))
+    with open(path, "wb") as fh: fh.write(blob.tobytes())
+    return len(blob) // REQUEST_BYTES
@@ -17,8 +17,10 @@ from typing import Any, List, Optional
 from drivers.stream.common import StreamTransaction
 from drivers.stream.init import StreamInitiator
 
-from nxconstants import (NodeCommand, NodeControl, NodeID, NodeLoad,
-                         NodeParameter, LOAD_SEG_WIDTH, NODE_PARAM_WIDTH)
+from nxcodecs import (NodeControlFields, decode_node_control, encode_node_control,
+                      encode_node_header, encode_node_load)
+from nxconstants import (NodeCommand, NodeID, NodeParameter, LOAD_SEG_WIDTH,
+                         NODE_PARAM_WIDTH)
 from nxmodel import NXMessagePipe, unpack_node_control, unpack_node_load
 
 def load_data(
@@ -40,20 +42,18 @@ def load_data(
         model     : Inbound message pipe to the model
     """
     chunks = ram_data_w // LOAD_SEG_WIDTH
-    mask   = (1 << LOAD_SEG_WIDTH) - 1
+    header = encode_node_header(
+        row=node_id.row, column=node_id.column, command=NodeCommand.LOAD
+    )
     for entry in stream:
         data = entry if isinstance(entry, int) else entry.pack()
-        for chunk in range(ram_data_w // LOAD_SEG_WIDTH):
-            msg = NodeLoad()
-            msg.header.row     = node_id.row
-            msg.header.column  = node_id.column
-            msg.header.command = NodeCommand.LOAD
-            msg.last           = (chunk == (chunks - 1))
-            msg.data           = (
-                (data >> ((chunks - chunk - 1) * LOAD_SEG_WIDTH)) & mask
+        for chunk in range(chunks):
+            encoded = encode_node_load(
+                header=header,
+                last  =(chunk == (chunks - 1)),
+                data  =(data >> ((chunks - chunk - 1) * LOAD_SEG_WIDTH)),
             )
             # Queue up into the testbench driver
-            encoded = msg.pack()
             inbound.append(StreamTransaction(data=encoded))
             # Queue up into the C++ model if required
             if model: model.enqueue(unpack_node_load(encoded))
@@ -75,17 +75,16 @@ def load_loopback(
         mask      : Loopback mask
         model     : Inbound message pipe to the model
     """
+    header = encode_node_header(
+        row=node_id.row, column=node_id.column, command=NodeCommand.CONTROL
+    )
     for select in range(num_inputs // NODE_PARAM_WIDTH, -1, -1):
-        msg = NodeControl()
-        msg.header.row     = node_id.row
-        msg.header.column  = node_id.column
-        msg.header.command = NodeCommand.CONTROL
-        msg.param          = NodeParameter.LOOPBACK
-        msg.value          = (
-            (mask >> (select * NODE_PARAM_WIDTH)) & ((1 << NODE_PARAM_WIDTH) - 1)
+        encoded = encode_node_control(
+            header=header,
+            param =NodeParameter.LOOPBACK,
+            value =(mask >> (select * NODE_PARAM_WIDTH)),
         )
         # Queue up into the testbench driver
-        encoded = msg.pack()
         inbound.append(StreamTransaction(data=encoded))
         # Queue up into the C++ model if required
         if model: model.enqueue(unpack_node_control(encoded))
@@ -96,7 +95,7 @@ def load_parameter(
     parameter : NodeParameter,
     value     : int,
     model     : Optional[NXMessagePipe] = None,
-) -> NodeControl:
+) -> NodeControlFields:
     """
     Load a parameter into a node
 
@@ -107,18 +106,16 @@ def load_parameter(
         value    : Value to set
         model    : Inbound message pipe to the model
 
-    Returns: The NodeControl message for submission to monitors/scoreboarding
+    Returns: The decoded NodeControl fields for submission to monitors and
+             scoreboarding
     """
-    msg = NodeControl()
-    msg.header.row     = node_id.row
-    msg.header.column  = node_id.column
-    msg.header.command = NodeCommand.CONTROL
-    msg.param          = parameter
-    msg.value          = value
+    header  = encode_node_header(
+        row=node_id.row, column=node_id.column, command=NodeCommand.CONTROL
+    )
+    encoded = encode_node_control(header=header, param=parameter, value=value)
     # Queue up into the testbench driver
-    encoded = msg.pack()
     inbound.append(StreamTransaction(data=encoded))
     # Queue up into the C++ model if required
     if model: model.enqueue(unpack_node_control(encoded))
     # Return message for scoreboarding
-    return msg
+    return decode_node_control(encoded)
@@ -73,7 +73,7 @@ async def mission_mode(dut):
                 inbound   =proxy,
                 node_id   =node_id,
                 ram_data_w=ram_data_w,
-                stream    =[x.pack() for x in (node.instructions + node.lookup + node.mappings)],
+                stream    =node.stream,
                 model     =model.get_ingress(),
             )
             # Program the loopback
@@ -87,7 +87,7 @@ async def mission_mode(dut):
             # Set parameters
             load_parameter(
                 proxy, node_id, NodeParameter.INSTRUCTIONS,
-                len(node.instructions), model.get_ingress()
+                len(node.instr_words), model.get_ingress()
             )
 
     # Wait for the inbound driver to drain
@@ -101,7 +101,7 @@ async def mission_mode(dut):
     # Check the next load address for every core
     for row, col in product(range(num_rows), range(num_cols)):
         state   = design.state[row][col]
-        exp_val = len(state.instructions + state.lookup + state.mappings)
+        exp_val = len(state.stream)
         rtl_val = int(dut.nodes[row][col].u_decoder.load_address_q)
         dut.info(f"Checking node {row}, {col} has loaded {exp_val} entries")
         assert rtl_val == exp_val, f"{row}, {col}: RTL {rtl_val} != EXP {exp_val}"
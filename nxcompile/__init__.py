@@ -18,6 +18,7 @@ from pathlib import Path
 
 root = Path(__file__).parent.parent
 sys.path.append((root / "common" / "work").as_posix())
+sys.path.append((root / "common" / "python").as_posix())
 
 # If available, use Rich to colourise the output log
 try:
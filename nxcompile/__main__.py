@@ -17,13 +17,91 @@ from pathlib import Path
 
 import click
 
+from nxconstants import MAX_NODE_MEMORY
+from nxloader import NXLoader
+from nxstream import RAM_DATA_W, write_load_stream
+
 from .debug import export_rtl
-from .flow import compile, elaborate, export, flatten, simplify
+from .flow import build_design, compile, elaborate, flatten, simplify, write_design
+from .flow.cache import StageCache, pack_netlist, unpack_netlist
+from .flow.eco import load_base, mark_changes
+from .flow.verify import verify as verify_design
 from .parser import Parser
 
 log = logging.getLogger("compiler")
 log.setLevel(logging.INFO)
 
+# Names of cached stages
+STAGE_NETLIST = "netlist"
+STAGE_DESIGN  = "design"
+
+def build_netlist(input, top, jobs, show_modules, show_models, export_flat):
+    """ Parse, elaborate, flatten, and simplify the design.
+
+    Args:
+        input       : Path to the Yosys JSON export
+        top         : The name of the top-level module in the design
+        jobs        : Number of processes to parse modules with
+        show_modules: Print out parsed modules
+        show_models : Print out parsed models
+        export_flat : Optional path to export the flattened model to
+
+    Returns: The simplified module, or None if the top-level was not found
+    """
+    # Run the parse step on the Yosys JSON input - unless every module and
+    # model is to be printed, only index the file and parse modules on demand
+    log.info(f"Parsing Yosys JSON file: {input}")
+    parser = Parser(input, jobs=jobs)
+    if show_modules or show_models:
+        parser.parse()
+    else:
+        parser.index()
+        if top in parser.module_lookup: parser.preload(top)
+    if show_modules:
+        for module in parser.modules: print(module)
+    if show_models:
+        for model in parser.models: print(model)
+
+    # Check for the requested top
+    log.info(f"Looking for design top-level '{top}'")
+    if top not in parser.module_lookup:
+        log.error(f"Could not resolve top-level '{top}' within JSON design")
+        return None
+    top_mod = parser.module_lookup[top]
+
+    # Map the Yosys JSON model into internal model
+    log.info(f"Elaborating from top-level '{top_mod.name}'")
+    model = elaborate(
+        top    =top_mod,
+        modules=parser.module_lookup,
+        models =parser.model_lookup,
+    )
+
+    # Flatten the module
+    log.info("Flattening hierarchy")
+    flat = flatten(model)
+
+    # Optionally write out the flattened model
+    if export_flat:
+        log.info(f"Writing out flattened model to {export_flat}")
+        export_rtl(flat, export_flat)
+
+    # Simplify the module (propagate constants, etc)
+    log.info("Simplifying module")
+    return simplify(flat)
+
+def check_fanout(ctx, param, value):
+    """ Check that a fan-out limit is either disabled (0) or at least 2 """
+    if value != 0 and value < 2:
+        raise click.BadParameter(f"must be 0 (disabled) or at least 2, not {value}")
+    return value
+
+def check_jobs(ctx, param, value):
+    """ Check that a job count is either all CPUs (0) or positive """
+    if value < 0:
+        raise click.BadParameter(f"must be 0 (all CPUs) or positive, not {value}")
+    return value
+
 @click.command()
 # Mesh configuration
 @click.option("-r", "--rows", type=int, default=4, help="Number of rows in the mesh")
@@ -33,6 +111,22 @@ log.setLevel(logging.INFO)
 @click.option("--node-outputs",   type=int, default= 32, help="Outputs per node")
 @click.option("--node-registers", type=int, default=  8, help="Working registers")
 @click.option("--node-slots",     type=int, default=512, help="Max instructions per node")
+@click.option("--node-memory",    type=int, default=MAX_NODE_MEMORY, help="Memory rows per node")
+@click.option("--ram-data-w",     type=int, default=RAM_DATA_W, help="Width of each node's RAM")
+@click.option("--max-fanout",     type=int, default=  0, callback=check_fanout, help="Messages per output before relaying (0 disables)")
+# Performance options
+@click.option("-j", "--jobs", type=int, default=1, callback=check_jobs, help="Parallel parsing processes (0 uses all CPUs)")
+# Load stream export
+@click.option("--load-stream", type=click.Path(dir_okay=False), help="Write the encoded load requests to a binary file")
+# Incremental compilation
+@click.option("--base", type=click.Path(exists=True, dir_okay=False), help="Previous compile to reuse placement from")
+# Verification options
+@click.option("--verify",       type=int, default=0,  help="Check the compiled design against the netlist for N cycles")
+@click.option("--verify-lanes", type=int, default=64, help="Number of random starting states to verify with")
+@click.option("--verify-seed",  type=int, default=0,  help="Seed for the random starting states")
+# Cache options
+@click.option("--cache-dir",  type=click.Path(file_okay=False), help="Directory to cache stage outputs in")
+@click.option("--cache-size", type=int, default=1024, help="Maximum size of the cache in MB")
 # Debug options
 @click.option("--show-modules",  count=True,        help="Print out parsed modules")
 @click.option("--show-models",   count=True,        help="Print out parsed models")
@@ -47,7 +141,18 @@ def main(
     # Mesh configuration
     rows, cols,
     # Node configuration
-    node_inputs, node_outputs, node_registers, node_slots,
+    node_inputs, node_outputs, node_registers, node_slots, node_memory, ram_data_w,
+    max_fanout,
+    # Performance options
+    jobs,
+    # Load stream export
+    load_stream,
+    # Incremental compilation
+    base,
+    # Verification options
+    verify, verify_lanes, verify_seed,
+    # Cache options
+    cache_dir, cache_size,
     # Debug options
     show_modules, show_models, debug, export_simple, export_flat,
     # Positional arguments
@@ -62,69 +167,109 @@ def main(
         top   : The name of the top-level module in the design
 
         output: Output file for the compiled design, to use with model or RTL
+                (written in the binary format if the name ends with .nxb)
     """
     # Alter the logging verbosity
     if debug: log.setLevel(logging.DEBUG)
 
-    # Run the parse step on the Yosys JSON input
-    log.info(f"Parsing Yosys JSON file: {input}")
-    parser = Parser(input)
-    parser.parse()
-    if show_modules:
-        for module in parser.modules: print(module)
-    if show_models:
-        for model in parser.models: print(model)
-
-    # Check for the requested top
-    log.info(f"Looking for design top-level '{top}'")
-    found = [x for x in parser.modules if x.name == top]
-    if len(found) != 1:
-        log.error(f"Could not resolve top-level '{top}' within JSON design")
-        return False
-    top_mod = found[0]
-
-    # Map the Yosys JSON model into internal model
-    log.info(f"Elaborating from top-level '{top_mod.name}'")
-    model = elaborate(
-        top    =top_mod,
-        modules=parser.modules,
-        models =parser.models,
-    )
+    # Write out the compiled design, and optionally the stream that loads it
+    def write_outputs(design):
+        log.info(f"Exporting compiled design to {output}")
+        write_design(output, design)
+        if load_stream:
+            count = write_load_stream(load_stream, NXLoader(design), ram_data_w)
+            log.info(f"Wrote {count} load requests to {load_stream}")
 
-    # Flatten the module
-    log.info("Flattening hierarchy")
-    flat = flatten(model)
+    # Setup the stage cache, keying on everything that affects each stage
+    cache, net_key, dsg_key = None, None, None
+    if cache_dir:
+        cache   = StageCache(cache_dir, cache_size * 1024 * 1024)
+        net_key = cache.key(StageCache.hash_file(input), top)
+        dsg_key = cache.key(
+            net_key, rows, cols,
+            node_inputs, node_outputs, node_registers, node_slots, node_memory,
+            max_fanout,
+            (StageCache.hash_file(base) if base else None),
+        )
+    show_parse = (show_modules or show_models)
 
-    # Optionally write out the flattened model
-    if export_flat:
-        log.info(f"Writing out flattened model to {export_flat}")
-        export_rtl(flat, export_flat)
+    # Reuse a previously compiled design if no stage inputs have changed
+    if cache and not (show_parse or export_flat or export_simple or verify):
+        design = cache.load(dsg_key, STAGE_DESIGN)
+        if design is not None:
+            log.info("Using cached design")
+            write_outputs(design)
+            return
 
-    # Simplify the module (propagate constants, etc)
-    log.info("Simplifying module")
-    smpl = simplify(flat)
+    # Reuse a previously simplified netlist, otherwise build it from scratch
+    smpl = None
+    if cache and not (show_parse or export_flat):
+        packed = cache.load(net_key, STAGE_NETLIST)
+        if packed is not None: smpl = unpack_netlist(packed)
+    if smpl is None:
+        smpl = build_netlist(
+            input, top, jobs, show_modules, show_models, export_flat,
+        )
+        if smpl is None: return False
+        if cache: cache.store(net_key, STAGE_NETLIST, pack_netlist(smpl))
 
     # Optionally write out the simplified model
     if export_simple:
         log.info(f"Writing out simplified model to {export_simple}")
         export_rtl(smpl, export_simple)
 
+    # Load the base design for incremental compilation
+    base_design = None
+    if base:
+        log.info(f"Loading base design from {base}")
+        base_design = load_base(base)
+
     # Compile onto mesh
     log.info("Compiling design onto mesh")
-    c_instrs, c_lbs, c_msgs, c_state_map, c_output_map = compile(
+    c_instrs, c_lbs, c_msgs, c_state_map, c_output_map, c_sigs = compile(
         smpl, rows=rows, columns=cols,
         node_inputs=node_inputs, node_outputs=node_outputs,
         node_registers=node_registers, node_slots=node_slots,
+        node_memory=node_memory, base=base_design, max_fanout=max_fanout,
     )
-
-    # Export to JSON
-    log.info(f"Exporting compiled design to {output}")
-    export(
-        output,
+    design = build_design(
         rows, cols,
         node_inputs, node_outputs, node_registers, node_slots,
-        c_instrs, c_lbs, c_msgs, c_state_map, c_output_map,
+        c_instrs, c_lbs, c_msgs, c_state_map, c_output_map, c_sigs,
+        node_memory=node_memory,
     )
 
+    # Identify which nodes need to be reloaded relative to the base
+    if base_design: mark_changes(base_design, design)
+
+    # Store the compiled design into the cache
+    if cache: cache.store(dsg_key, STAGE_DESIGN, design)
+
+    # Export the design
+    write_outputs(design)
+
+    # Check the compiled design behaves the same as the netlist
+    if verify:
+        log.info(f"Verifying for {verify} cycles across {verify_lanes} lanes")
+        failure = verify_design(smpl, design, verify, lanes=verify_lanes, seed=verify_seed)
+        if failure:
+            log.error(
+                f"Mismatch on {failure['signal']} in cycle {failure['cycle']} "
+                f"(lane {failure['lane']})"
+            )
+            if failure["instruction"] is not None:
+                log.error(
+                    f"First divergence at row {failure['row']}, column "
+                    f"{failure['column']}, instruction {failure['instruction']} "
+                    f"(gate {failure['gate']})"
+                )
+            else:
+                log.error(
+                    f"All instructions agree, check routing into row "
+                    f"{failure['row']}, column {failure['column']}"
+                )
+            raise click.ClickException("Compiled design does not match the netlist")
+        log.info("Compiled design matches the netlist")
+
 if __name__ == "__main__":
     main()
@@ -14,6 +14,7 @@
 
 from .compile import compile
 from .elaborate import elaborate
-from .export import export
+from .export import build_design, export, write_design
 from .flatten import flatten
 from .simplify import simplify
+from .verify import verify
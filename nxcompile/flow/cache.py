@@ -0,0 +1,287 @@
+# Copyright 2021, Peter Birch, mailto:peter@lightlogic.co.uk
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import hashlib
+import logging
+import os
+from pathlib import Path
+import pickle
+import re
+import tempfile
+
+from ..models.constant import Constant
+from ..models import gate as nexus_gate
+from ..models.flop import Flop
+from ..models.gate import Gate
+from ..models.module import Module
+from ..models.port import Port, PortBit, PortDirection
+
+log = logging.getLogger("compiler.cache")
+
+# Entry types within a packed netlist
+ENTRY_MODULE = 0
+ENTRY_PORT   = 1
+ENTRY_BIT    = 2
+ENTRY_GATE   = 3
+ENTRY_CONST  = 4
+
+# Flop port aliases
+FLOP_ALIASES = ("clock", "reset", "input", "output", "output_inv")
+
+def pack_netlist(module):
+    """
+    Encode a netlist into a flat, picklable form. Every module, port, bit, gate,
+    and constant is assigned an index in a table, with all connectivity held as
+    references into that table - this avoids deep recursion when pickling long
+    chains of logic. Names and IDs are preserved exactly.
+
+    Args:
+        module: The top-level Module of the netlist
+
+    Returns: Tuple of the object table and the connectivity of each entry
+    """
+    table, objects, index = [], [], {}
+    def add(obj, entry):
+        index[id(obj)] = len(table)
+        table.append(entry)
+        objects.append(obj)
+    # Walk the hierarchy, registering modules, ports, bits, and gates
+    def walk(mod, parent):
+        aliases = None
+        if isinstance(mod, Flop):
+            aliases = [
+                (getattr(mod, x).name if getattr(mod, x) else None)
+                for x in FLOP_ALIASES
+            ]
+        add(mod, (ENTRY_MODULE, mod.id, mod.name, mod.type, parent, aliases))
+        mod_idx = index[id(mod)]
+        for port in mod.ports.values():
+            add(port, (ENTRY_PORT, port.name, int(port.direction), mod_idx))
+            for bit in port.bits:
+                add(bit, (ENTRY_BIT, bit.id, index[id(port)], bit.index))
+        for child in mod.children.values():
+            if isinstance(child, Gate):
+                add(child, (
+                    ENTRY_GATE, type(child).__name__, child.id, child.name,
+                    int(child.op), mod_idx,
+                ))
+            else:
+                walk(child, mod_idx)
+    walk(module, None)
+    # Resolve references, registering constants as they are encountered
+    def ref(obj):
+        if id(obj) not in index:
+            assert isinstance(obj, Constant), f"Unknown object {obj}"
+            add(obj, (ENTRY_CONST, obj.id, obj.value))
+        return index[id(obj)]
+    links, obj_idx = [], 0
+    while obj_idx < len(objects):
+        obj = objects[obj_idx]
+        if isinstance(obj, PortBit):
+            links.append((
+                (ref(obj.driver) if obj.driver else None),
+                [ref(x) for x in obj.targets],
+            ))
+        elif isinstance(obj, Gate):
+            links.append((
+                [ref(x) for x in obj.inputs], [ref(x) for x in obj.outputs],
+            ))
+        else:
+            links.append(None)
+        obj_idx += 1
+    return table, links
+
+def unpack_netlist(packed):
+    """ Rebuild a netlist from the form produced by 'pack_netlist'.
+
+    Args:
+        packed: Tuple of the object table and connectivity
+
+    Returns: The top-level Module of the netlist
+    """
+    table, links = packed
+    objects = []
+    for entry in table:
+        if entry[0] == ENTRY_MODULE:
+            _, mod_id, name, mod_type, parent, aliases = entry
+            obj    = Flop(name) if aliases is not None else Module(name, mod_type)
+            obj.id = mod_id
+            if parent is not None: objects[parent].add_child(obj)
+        elif entry[0] == ENTRY_PORT:
+            _, name, direction, parent = entry
+            obj = Port(name, PortDirection(direction), 1)
+            obj.bits = []
+            objects[parent].add_raw_port(obj)
+        elif entry[0] == ENTRY_BIT:
+            _, bit_id, port, bit_idx = entry
+            obj    = PortBit(objects[port], bit_idx)
+            obj.id = bit_id
+            objects[port].bits.append(obj)
+        elif entry[0] == ENTRY_GATE:
+            _, cls_name, gate_id, name, op, parent = entry
+            cls = getattr(nexus_gate, cls_name)
+            obj = Gate(op, [], []) if cls == Gate else cls(None, None)
+            obj.id, obj.name = gate_id, name
+            objects[parent].add_child(obj)
+        elif entry[0] == ENTRY_CONST:
+            _, const_id, value = entry
+            obj    = Constant(value)
+            obj.id = const_id
+        else:
+            raise Exception(f"Unknown netlist entry type {entry[0]}")
+        objects.append(obj)
+    # Restore the port aliases of flops
+    for entry, obj in zip(table, objects):
+        if entry[0] != ENTRY_MODULE or entry[5] is None: continue
+        for alias, name in zip(FLOP_ALIASES, entry[5]):
+            setattr(obj, alias, obj.ports[name] if name else None)
+    # Restore connectivity
+    for obj, link in zip(objects, links):
+        if isinstance(obj, PortBit):
+            driver, targets = link
+            if driver is not None: obj.driver = objects[driver]
+            for tgt in targets: obj.add_target(objects[tgt])
+        elif isinstance(obj, Gate):
+            obj.inputs  = [objects[x] for x in link[0]]
+            obj.outputs = [objects[x] for x in link[1]]
+    # Ensure newly issued IDs do not collide with those that were restored
+    def advance(cls, attr, match):
+        used = [int(re.sub(r"[^0-9]", "", x.id)) for x in objects if match(x)]
+        if used: setattr(cls, attr, max(getattr(cls, attr), max(used) + 1))
+    advance(Module,   "ID",       lambda x: isinstance(x, Module))
+    advance(Gate,     "ID",       lambda x: isinstance(x, Gate))
+    advance(PortBit,  "ID",       lambda x: type(x) == PortBit)
+    advance(Constant, "CONST_ID", lambda x: type(x) == Constant)
+    return objects[0]
+
+class StageCache:
+    """
+    Content-addressed store for the outputs of compiler stages. Entries are
+    keyed on a hash of everything that affects the stage's result, and the
+    least recently used entries are evicted once the total size of the cache
+    exceeds a limit.
+    """
+
+    # Bump when the format of any cached stage output changes
+    VERSION = 1
+
+    def __init__(self, path, max_bytes):
+        """ Initialise the StageCache instance.
+
+        Args:
+            path     : Directory to store cached entries within
+            max_bytes: Maximum total size of all entries in bytes
+        """
+        self.path      = Path(path)
+        self.max_bytes = max_bytes
+        self.path.mkdir(parents=True, exist_ok=True)
+
+    @staticmethod
+    def hash_file(path, chunk_size=4*1024*1024):
+        """ Calculate the SHA-256 digest of a file's contents.
+
+        Args:
+            path      : Path to the file
+            chunk_size: Number of bytes to read at a time
+
+        Returns: Hexadecimal digest string
+        """
+        digest = hashlib.sha256()
+        with open(path, "rb") as fh:
+            for chunk in iter(lambda: fh.read(chunk_size), b""):
+                digest.update(chunk)
+        return digest.hexdigest()
+
+    def key(self, *parts):
+        """ Form a cache key from the values that determine a stage's result.
+
+        Args:
+            parts: Values to include in the key (must have a stable 'repr')
+
+        Returns: Hexadecimal key string
+        """
+        return hashlib.sha256(
+            repr((StageCache.VERSION, *parts)).encode("utf-8")
+        ).hexdigest()
+
+    def entry_path(self, key, stage):
+        """ Path to the file holding an entry.
+
+        Args:
+            key  : Key of the entry
+            stage: Name of the stage that produced the entry
+        """
+        return self.path / f"{stage}-{key}.pkl"
+
+    def load(self, key, stage):
+        """ Retrieve an entry from the cache.
+
+        Args:
+            key  : Key of the entry
+            stage: Name of the stage that produced the entry
+
+        Returns: The stored object, or None if not present
+        """
+        path = self.entry_path(key, stage)
+        try:
+            with open(path, "rb") as fh: data = pickle.load(fh)
+        except FileNotFoundError:
+            log.info(f"Cache miss for stage '{stage}'")
+            return None
+        except Exception as e:
+            log.warning(f"Discarding unreadable cache entry {path.name}: {e}")
+            path.unlink(missing_ok=True)
+            return None
+        # Mark the entry as recently used
+        os.utime(path)
+        log.info(f"Cache hit for stage '{stage}'")
+        return data
+
+    def store(self, key, stage, data):
+        """ Insert an entry into the cache, then evict to honour the size limit.
+
+        Args:
+            key  : Key of the entry
+            stage: Name of the stage that produced the entry
+            data : Picklable object to store
+        """
+        path = self.entry_path(key, stage)
+        # Write to a temporary file then move into place to stay atomic
+        fd, tmp = tempfile.mkstemp(dir=self.path, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as fh:
+                pickle.dump(data, fh, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp, path)
+        except BaseException:
+            os.unlink(tmp)
+            raise
+        self.evict(keep=path)
+
+    def evict(self, keep=None):
+        """ Remove least recently used entries until within the size limit.
+
+        Args:
+            keep: Path to an entry that should never be evicted (optional)
+        """
+        entries = []
+        for path in self.path.glob("*.pkl"):
+            stat = path.stat()
+            entries.append((stat.st_mtime, stat.st_size, path))
+        total = sum(x[1] for x in entries)
+        for _, size, path in sorted(entries, key=lambda x: x[0]):
+            if total <= self.max_bytes: break
+            if path == keep: continue
+            log.info(f"Evicting cache entry {path.name}")
+            path.unlink(missing_ok=True)
+            total -= size
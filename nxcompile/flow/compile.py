@@ -18,42 +18,17 @@ from statistics import mean
 from ..models.constant import Constant
 from ..models.flop import Flop
 from ..models.gate import Gate, Operation
+from .eco import base_placement, compute_signatures
+from .elements import Input, Instruction, Output, State
+from .export import CFG_ND_INPUTS, CFG_ND_MEMORY, CFG_ND_OUTPUTS, CFG_ND_REGS, CFG_ND_SLOTS
+from .export import CONFIG_COLUMNS, CONFIG_NODE, CONFIG_ROWS, DESIGN_CONFIG
+from .relay import build_relays
 
 from nxconstants import Instruction as NXInstruction
+from nxconstants import MAX_NODE_MEMORY
 
 log = logging.getLogger("compiler.compile")
 
-class Input:
-    """ Represents a boundary input to the logic """
-    def __init__(self, bit, targets):
-        self.bit     = bit
-        self.targets = targets
-
-    def __repr__(self): return f"<Input {self.bit}>"
-
-class Output:
-    """ Represents a boundary output from the logic """
-    def __init__(self, bit, source):
-        self.bit    = bit
-        self.source = source
-
-    def __repr__(self): return f"<Output {self.bit}>"
-
-class State:
-    def __init__(self, bit, source, targets):
-        self.bit     = bit
-        self.source  = source
-        self.targets = targets
-
-class Instruction:
-
-    def __init__(self, op, sources, targets, node):
-        self.op      = op
-        self.sources = sources
-        self.targets = targets
-        self.node    = node
-
-
 class Node:
     """
     Represents a logic node within the mesh, keeps track of input, output, and
@@ -62,7 +37,8 @@ class Node:
     """
 
     def __init__(
-        self, mesh, row, column, inputs=8, outputs=8, slots=12, registers=8
+        self, mesh, row, column, inputs=8, outputs=8, slots=12, registers=8,
+        memory=MAX_NODE_MEMORY,
     ):
         """ Initialise the Node.
 
@@ -74,6 +50,8 @@ class Node:
             outputs  : Number of output positions
             slots    : Maximum number of operations
             registers: Number of working registers
+            memory   : Number of memory rows shared by instructions, output
+                       lookups, and output mappings
         """
         # Keep a reference to the mesh
         self.mesh = mesh
@@ -84,10 +62,12 @@ class Node:
         self.__num_outputs   = outputs
         self.__num_slots     = slots
         self.__num_registers = registers
+        self.__num_memory    = memory
         # Keep track of how many of each type of resource is consumed
         self.__used_inputs    = 0
         self.__used_outputs   = 0
         self.__used_registers = []
+        self.__used_memory    = 0
         # Keep a list of all operations
         self.__ops = []
 
@@ -96,7 +76,8 @@ class Node:
             f"<Node {self.position} - "
             f"In: {self.__used_inputs}/{self.__num_inputs}, "
             f"Out: {self.__used_outputs}/{self.__num_outputs}, "
-            f"Ops: {len(self.__ops)}/{self.__num_slots}>"
+            f"Ops: {len(self.__ops)}/{self.__num_slots}, "
+            f"Mem: {self.__used_memory}/{self.__num_memory}>"
         )
 
     @property
@@ -106,11 +87,16 @@ class Node:
     @property
     def slot_usage(self): return (len(self.__ops) / self.__num_slots)
     @property
+    def memory_usage(self): return (self.__used_memory / self.__num_memory)
+    @property
     def ops(self): return self.__ops[:]
 
     @property
     def usage(self):
-        return max(self.input_usage, self.output_usage, self.slot_usage)
+        return max(
+            self.input_usage, self.output_usage, self.slot_usage,
+            self.memory_usage,
+        )
 
     @property
     def capacity(self):
@@ -153,13 +139,69 @@ class Node:
             op_outputs += self.count_op_output_usage(op)
         return op_inputs, op_outputs
 
+    def count_op_message_usage(self, *ops):
+        """
+        Estimate how many output mappings a set of operations held by this node
+        requires - one for every other node consuming each value, and one for
+        every boundary output. Consumers that are yet to be placed are counted
+        as if they were all placed in different nodes, so the estimate never
+        falls short of the final count.
+
+        Args:
+            ops: The operations held by the node
+
+        Returns: Number of output mappings
+        """
+        local    = set(ops)
+        messages = 0
+        for op in ops:
+            consumers = set()
+            for tgt in op.targets:
+                # Flopped values are sent separately from the raw value
+                value = tgt if isinstance(tgt, State) else op
+                for user in (tgt.targets if isinstance(tgt, State) else [tgt]):
+                    if isinstance(user, Output):
+                        consumers.add(user)
+                    elif isinstance(user, Instruction) and user not in local:
+                        consumers.add((value, user.node or user))
+            messages += len(consumers)
+        return messages
+
+    def count_op_memory_usage(self, *ops):
+        """
+        Count the memory rows required for a set of operations - one row for
+        every instruction, one lookup row for every output, and one row for
+        every output mapping.
+
+        Args:
+            ops: The operations held by the node
+
+        Returns: Number of memory rows
+        """
+        return len(ops) + self.__num_outputs + self.count_op_message_usage(*ops)
+
+    def record_memory(self, rows):
+        """ Record the final memory footprint once messages have been compiled.
+
+        Args:
+            rows: Number of memory rows used
+        """
+        if rows > self.__num_memory:
+            raise Exception(
+                f"Node {self.position} requires {rows} memory rows, only "
+                f"{self.__num_memory} are available"
+            )
+        self.__used_memory = rows
+
     def recount(self):
         # Count how many inputs and outputs are required
         self.__used_inputs, self.__used_outputs = self.count_op_usage(*self.ops)
+        self.__used_memory = self.count_op_memory_usage(*self.ops)
         # Check that resources haven't been exceeded
         assert self.__used_inputs  <= self.__num_inputs
         assert self.__used_outputs <= self.__num_outputs
         assert len(self.__ops)     <= self.__num_slots
+        assert self.__used_memory  <= self.__num_memory
 
     def remove_op(self, op):
         assert self.contains_op(op)
@@ -172,10 +214,12 @@ class Node:
 
     def space_for_op(self, *ops):
         new_inputs, new_outputs = self.count_op_usage(*self.ops, *ops)
+        new_memory = self.count_op_memory_usage(*self.ops, *ops)
         return (
-            (new_inputs                 < self.__num_inputs ) and
-            (new_outputs                < self.__num_outputs) and
-            ((len(ops) + len(self.ops)) < self.__num_slots  )
+            (new_inputs                 <  self.__num_inputs ) and
+            (new_outputs                <  self.__num_outputs) and
+            ((len(ops) + len(self.ops)) <  self.__num_slots  ) and
+            (new_memory                 <= self.__num_memory )
         )
 
     def encode(self, op, sources, tgt_reg, output):
@@ -219,7 +263,7 @@ class Node:
         """ Compile operations allocated to this node into encoded values
 
         Returns: Tuple of input allocation map, output allocation map, bytecode
-                 encoded operations
+                 encoded operations, and the operations in program order
         """
         # Sort all of the operations based on dependencies
         unordered = self.ops[:]
@@ -326,8 +370,8 @@ class Node:
                         f"{reg.op.id} from REG[{reg_idx}]"
                     )
                     regs[reg_idx] = None
-        # Return I/O mappings and the bytecode instruction stream
-        return inputs, outputs, encoded
+        # Return I/O mappings, the bytecode instruction stream, and program order
+        return inputs, outputs, encoded, ordered
 
 class Mesh:
     """ Mesh of node models to suppport allocation and scheduling of operations """
@@ -426,6 +470,7 @@ class Mesh:
                 if   metric == "input"  : u_val = node.input_usage
                 elif metric == "output" : u_val = node.output_usage
                 elif metric == "slot"   : u_val = node.slot_usage
+                elif metric == "memory" : u_val = node.memory_usage
                 elif metric == "summary": u_val = node.usage
                 else: raise Exception(f"Unknown metric {metric}")
                 row_str += f"{u_val:01.03f} "
@@ -435,6 +480,34 @@ class Mesh:
         print(f"Max: {max(values):.02f}, Min: {min(values):.02f}, Mean: {mean(values):.02f}")
         print("=" * 80)
 
+    def show_emission(self, compiled_msgs):
+        """
+        Print out a table of the most messages any output of each node emits
+        serially when its value changes.
+
+        Args:
+            compiled_msgs: Dictionary of compiled messages for the whole mesh
+
+        Returns: The largest serial emission count of any node
+        """
+        print("=" * 80)
+        print("Serial Emission:")
+        print("")
+        print("      " + " ".join([f"{x:^5d}" for x in range(len(self.nodes[0]))]))
+        print("------" + "-".join(["-----" for x in range(len(self.nodes[0]))]))
+        values = []
+        for r_idx, row in enumerate(self.nodes):
+            row_str = ""
+            for node in row:
+                count = max([len(x) for x in compiled_msgs.get(node.position, [])] + [0])
+                row_str += f"{count:^5d} "
+                values.append(count)
+            print(f"{r_idx:3d} | {row_str}")
+        print("")
+        print(f"Max: {max(values)}, Min: {min(values)}, Mean: {mean(values):.02f}")
+        print("=" * 80)
+        return max(values)
+
     def report_state(self, compiled_inputs):
         """ Produce a report on where state (flops) has been located.
 
@@ -475,11 +548,16 @@ def compile(
     module,
     rows=4, columns=4,
     node_inputs=32, node_outputs=32, node_registers=8, node_slots=512,
+    node_memory=MAX_NODE_MEMORY, base=None, max_fanout=0,
 ):
     """
     Manage the compilation process - converting the logical model of the design
     into operations, messages, and handling configurations.
 
+    When a base design is provided, every operation whose logic cone is
+    unchanged (identified by its signature) is pinned to the node it previously
+    occupied, and only new or changed operations are placed.
+
     Args:
         module        : The logic module to compile
         rows          : Number of rows in the mesh (default: 4)
@@ -488,12 +566,17 @@ def compile(
         node_outputs  : Number of outputs per node
         node_registers: Number of registers per node
         node_slots    : Number of instruction slots per node
+        node_memory   : Number of memory rows per node
+        base          : Previously compiled design to reuse placement from
+        max_fanout    : Maximum messages emitted by any output before relay
+                        trees are built to share the load (0 disables relays)
     """
     # Create a mesh of the requested configuration
     mesh = Mesh(
         rows=rows, columns=columns,
         node_inputs=node_inputs, node_outputs=node_outputs,
         node_registers=node_registers, node_slots=node_slots,
+        node_memory=node_memory,
     )
     # Convert gates to instructions, flops to state objects
     terms   = {}
@@ -543,9 +626,40 @@ def compile(
                     bit_map[bit.id].targets.append(bit_map[tgt.id])
             elif port.is_output:
                 bit_map[bit.id].source = bit_map[bit.driver.id]
+    # Calculate the signature of every operation
+    signatures = compute_signatures(list(terms.values()))
+    # Check the base design was compiled for the same mesh
+    if base and base[DESIGN_CONFIG] != {
+        CONFIG_ROWS   : rows,
+        CONFIG_COLUMNS: columns,
+        CONFIG_NODE   : {
+            CFG_ND_INPUTS : node_inputs,
+            CFG_ND_OUTPUTS: node_outputs,
+            CFG_ND_REGS   : node_registers,
+            CFG_ND_SLOTS  : node_slots,
+            CFG_ND_MEMORY : node_memory,
+        },
+    }:
+        log.warning("Base design has a different configuration, ignoring it")
+        base = None
+    # Pin operations that are unchanged from the base into their previous nodes,
+    # adding them in their previous program order
+    pinned = set()
+    if base:
+        placement  = base_placement(base)
+        candidates = []
+        for op in terms.values():
+            slots = placement.get(signatures[op], None)
+            if slots: candidates.append((*slots.pop(0), op))
+        for row, col, _, op in sorted(candidates, key=lambda x: x[:3]):
+            node = mesh[row, col]
+            if not node.space_for_op(op): continue
+            node.add_op(op)
+            pinned.add(op)
+        log.info(f"Pinned {len(pinned)} of {len(terms)} operations from base")
     # Place operations into the mesh, starting with the most used
     log.info("Starting to schedule operations into mesh")
-    to_place    = list(terms.values())
+    to_place    = [x for x in terms.values() if x not in pinned]
     stall_count = 0
     while to_place:
         # Detect placement deadlock and abort
@@ -590,8 +704,11 @@ def compile(
             if not node and len(src_nodes) > 1:
                 for src_node in src_nodes:
                     if src_node.space_for_op(op, *src_ops):
+                        moving = [x for x in src_ops if x not in src_node.ops]
+                        # Pinned operations must stay where they are
+                        if pinned.intersection(moving): continue
                         node    = src_node
-                        to_move = [x for x in src_ops if x not in node.ops]
+                        to_move = moving
                         break
             # Otherwise, need to find a node in the next row down
             if not node:
@@ -630,12 +747,15 @@ def compile(
     compiled_inputs  = {}
     compiled_outputs = {}
     compiled_instrs  = {}
+    compiled_sigs    = {}
     for node in mesh.all_nodes:
         (
             compiled_inputs[node.position],
             compiled_outputs[node.position],
             compiled_instrs[node.position],
+            ordered,
         ) = node.compile_operations()
+        compiled_sigs[node.position] = [signatures[x] for x in ordered]
     # Compile signal state updates
     compiled_loopback = {}
     compiled_msgs     = {}
@@ -704,6 +824,22 @@ def compile(
             })
             # Increment the output counter
             output_counter += 1
+    # Limit the fan-out of any one output by relaying through other nodes
+    if max_fanout:
+        build_relays(
+            mesh, compiled_inputs, compiled_outputs, compiled_instrs,
+            compiled_msgs, compiled_sigs, signatures, node_slots, node_memory,
+            max_fanout,
+        )
+    max_emission = mesh.show_emission(compiled_msgs)
+    log.info(f"Maximum serial emission count {max_emission}")
+    # Check the final memory footprint of every node
+    for node in mesh.all_nodes:
+        node.record_memory(
+            len(compiled_instrs[node.position]) + node_outputs +
+            sum(len(x) for x in compiled_msgs.get(node.position, []))
+        )
+    mesh.show_utilisation("memory")
     # Accumulate message statistics
     msg_counts = [sum([len(y) for y in x]) for x in compiled_msgs.values()]
     log.info(f"Total messages {sum(msg_counts)}")
@@ -713,5 +849,5 @@ def compile(
     # Return instruction sequences, input handling, output handling
     return (
         compiled_instrs, compiled_loopback, compiled_msgs,
-        mesh.report_state(compiled_inputs), output_drivers
+        mesh.report_state(compiled_inputs), output_drivers, compiled_sigs,
     )
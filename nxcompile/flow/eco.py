@@ -0,0 +1,127 @@
+# Copyright 2021, Peter Birch, mailto:peter@lightlogic.co.uk
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import hashlib
+import json
+import logging
+
+from nxbinary import NXBinary, is_nxb
+
+from ..models.constant import Constant
+from .elements import Input, Instruction, State
+from .export import (DESIGN_NODES, DESIGN_REPORTS, DSG_REP_CHANGED, NODE_COLUMN,
+                     NODE_INSTRS, NODE_LOOP, NODE_OUTS, NODE_ROW, NODE_SIGS)
+
+log = logging.getLogger("compiler.eco")
+
+# Number of hexadecimal characters retained from each signature digest
+SIG_LENGTH = 16
+
+def compute_signatures(ops):
+    """
+    Calculate a Merkle-style signature for every instruction, formed from the
+    operation it performs and the signatures of its sources. Boundary inputs and
+    flop outputs are identified by the name of the bit, so the signature of an
+    instruction only changes if the logic cone feeding it changes.
+
+    Args:
+        ops: List of compiler Instructions
+
+    Returns: Dictionary of instruction to signature string
+    """
+    sigs = {}
+    def leaf(src):
+        if isinstance(src, Constant): return f"C:{src.value}"
+        elif isinstance(src, Input) : return f"I:{src.bit}"
+        elif isinstance(src, State) : return f"S:{src.bit}"
+        else: raise Exception(f"Unexpected source {src}")
+    for root in ops:
+        # Walk the cone iteratively to avoid hitting the recursion limit
+        stack, active = [root], set()
+        while stack:
+            op = stack[-1]
+            if op in sigs:
+                stack.pop()
+                continue
+            pending = [
+                x for x in op.sources
+                if isinstance(x, Instruction) and x not in sigs
+            ]
+            if pending:
+                if op in active:
+                    raise Exception(f"Combinatorial loop detected at {op.op.id}")
+                active.add(op)
+                stack += pending
+                continue
+            sources = [
+                (sigs[x] if isinstance(x, Instruction) else leaf(x))
+                for x in op.sources
+            ]
+            sigs[op] = hashlib.sha256(
+                f"{op.op.op.name}({','.join(sources)})".encode("utf-8")
+            ).hexdigest()[:SIG_LENGTH]
+            active.discard(op)
+            stack.pop()
+    return sigs
+
+def load_base(path):
+    """ Load a previously compiled design to use as the base for an ECO.
+
+    Args:
+        path: Path to the compiled design (either binary or JSON)
+
+    Returns: Dictionary describing the design
+    """
+    if is_nxb(path): return NXBinary(path).to_design()
+    with open(path, "r") as fh: return json.load(fh)
+
+def base_placement(base):
+    """ Extract where every signature was placed within a base design.
+
+    Args:
+        base: Dictionary describing the base design
+
+    Returns: Dictionary of signature to a list of (row, column, program index)
+    """
+    placement = {}
+    for node in base[DESIGN_NODES]:
+        for idx, sig in enumerate(node.get(NODE_SIGS, [])):
+            placement.setdefault(sig, []).append(
+                (node[NODE_ROW], node[NODE_COLUMN], idx)
+            )
+    return placement
+
+def mark_changes(base, design):
+    """
+    Compare the program of every node against the base design, recording those
+    that differ into the design's reports so only they need to be reloaded.
+
+    Args:
+        base  : Dictionary describing the base design
+        design: Dictionary describing the newly compiled design
+
+    Returns: List of (row, column) of every changed node
+    """
+    previous = { (x[NODE_ROW], x[NODE_COLUMN]): x for x in base[DESIGN_NODES] }
+    changed  = []
+    for node in design[DESIGN_NODES]:
+        old = previous.get((node[NODE_ROW], node[NODE_COLUMN]), None)
+        if old is None or any(
+            old.get(x, None) != node[x] for x in (NODE_INSTRS, NODE_LOOP, NODE_OUTS)
+        ):
+            changed.append((node[NODE_ROW], node[NODE_COLUMN]))
+    design[DESIGN_REPORTS][DSG_REP_CHANGED] = [list(x) for x in changed]
+    log.info(f"{len(changed)} of {len(design[DESIGN_NODES])} nodes changed")
+    for row, col in changed: log.info(f" - Row {row}, Column {col}")
+    return changed
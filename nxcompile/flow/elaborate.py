@@ -12,6 +12,7 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+from collections.abc import Mapping
 import logging
 
 log = logging.getLogger("elaborate")
@@ -114,8 +115,6 @@ def _build_module(src, ymodules, ymodels, instance=None):
     log.info(f"Building compiler module from Yosys module '{src.name}'")
     # Sanity checks
     assert isinstance(src, YModule)
-    assert len([x for x in ymodules.values() if not isinstance(x, YModule)]) == 0
-    assert len([x for x in ymodels.values()  if not isinstance(x, YModel )]) == 0
     assert isinstance(instance, str) or instance == None
     # If no name provided, adopt the module type
     if not instance: instance = src.name
@@ -137,13 +136,17 @@ def _build_module(src, ymodules, ymodels, instance=None):
             )
             if cell.model not in ymodels:
                 raise Exception(f"Failed to resolve cell model '{cell.model}'")
+            ymodel = ymodels[cell.model]
+            assert isinstance(ymodel, YModel)
             # Get the I/O for the operation
-            nmod.add_child(_build_cell_model(cell, ymodels[cell.model]))
+            nmod.add_child(_build_cell_model(cell, ymodel))
         # Nested modules
         elif cell.type in ymodules:
             log.info(f" - Cell {cell.name} - Type: {cell.type}")
+            ymodule = ymodules[cell.type]
+            assert isinstance(ymodule, YModule)
             nmod.add_child(_build_module(
-                ymodules[cell.type], ymodules, ymodels, instance=cell.name,
+                ymodule, ymodules, ymodels, instance=cell.name,
             ))
         # Flop primitive
         elif cell.type == "$adff":
@@ -204,22 +207,29 @@ def _build_module(src, ymodules, ymodels, instance=None):
 def elaborate(top, modules, models):
     """ Convert parsed Yosys JSON into the compiler's internal representation.
 
+    Modules and models may be provided either as lists, or as mappings keyed by
+    name - in which case only those reachable from the top are accessed, which
+    allows lazily parsed lookups to be used.
+
     Args:
         top    : The top level Yosys Module to convert
-        modules: List of Yosys Modules to use when elaborating
-        models : List of Yosys Models for complex cells
+        modules: List or mapping of Yosys Modules to use when elaborating
+        models : List or mapping of Yosys Models for complex cells
 
     Return: Instance of Module (from models.module) containing elaborated design
     """
     # Sanity checks
-    assert isinstance(top,     YModule)
-    assert isinstance(modules, list   )
-    assert isinstance(models,  list   )
-    assert len([x for x in modules if not isinstance(x, YModule)]) == 0
-    assert len([x for x in models  if not isinstance(x, YModel )]) == 0
+    assert isinstance(top,     YModule       )
+    assert isinstance(modules, (list, Mapping))
+    assert isinstance(models,  (list, Mapping))
     # Convert module and model lists into lookups
-    mod_lkp = { x.name: x for x in modules }
-    mdl_lkp = { x.name: x for x in models  }
+    if isinstance(modules, list):
+        assert len([x for x in modules if not isinstance(x, YModule)]) == 0
+        modules = { x.name: x for x in modules }
+    if isinstance(models, list):
+        assert len([x for x in models  if not isinstance(x, YModel )]) == 0
+        models = { x.name: x for x in models }
+    mod_lkp, mdl_lkp = modules, models
     # Start building from the top
     log.info(f"Elaborating from top '{top.name}'")
     mod = _build_module(top, ymodules=mod_lkp, ymodels=mdl_lkp)
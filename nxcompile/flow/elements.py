@@ -0,0 +1,43 @@
+# Copyright 2021, Peter Birch, mailto:peter@lightlogic.co.uk
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+class Input:
+    """ Represents a boundary input to the logic """
+    def __init__(self, bit, targets):
+        self.bit     = bit
+        self.targets = targets
+
+    def __repr__(self): return f"<Input {self.bit}>"
+
+class Output:
+    """ Represents a boundary output from the logic """
+    def __init__(self, bit, source):
+        self.bit    = bit
+        self.source = source
+
+    def __repr__(self): return f"<Output {self.bit}>"
+
+class State:
+    def __init__(self, bit, source, targets):
+        self.bit     = bit
+        self.source  = source
+        self.targets = targets
+
+class Instruction:
+
+    def __init__(self, op, sources, targets, node):
+        self.op      = op
+        self.sources = sources
+        self.targets = targets
+        self.node    = node
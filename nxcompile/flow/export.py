@@ -13,6 +13,13 @@
 # limitations under the License.
 
 import json
+from pathlib import Path
+
+from nxbinary import write_nxb
+from nxconstants import MAX_NODE_MEMORY
+
+# Suffix that selects the binary container format
+BINARY_SUFFIX = ".nxb"
 
 # Main sections
 DESIGN_CONFIG  = "configuration"
@@ -26,15 +33,18 @@ CFG_ND_INPUTS  = "inputs"
 CFG_ND_OUTPUTS = "outputs"
 CFG_ND_REGS    = "registers"
 CFG_ND_SLOTS   = "slots"
+CFG_ND_MEMORY  = "memory"
 # Per-node configuration
 NODE_ROW    = "row"
 NODE_COLUMN = "column"
 NODE_INSTRS = "instructions"
 NODE_LOOP   = "loopback"
 NODE_OUTS   = "outputs"
+NODE_SIGS   = "signatures"
 # Design reports
 DSG_REP_STATE   = "state"
 DSG_REP_OUTPUTS = "outputs"
+DSG_REP_CHANGED = "changed"
 
 def export(
     output_path,
@@ -60,6 +70,40 @@ def export(
         state_map     : Mapping of where each flop is held in the mesh
         output_map    : Mapping of where each output is driven from in the mesh
     """
+    write_design(output_path, build_design(
+        mesh_rows, mesh_columns,
+        node_inputs, node_outputs, node_registers, node_slots,
+        instructions, loopbacks, messages, state_map, output_map,
+    ))
+
+def build_design(
+    mesh_rows, mesh_columns,
+    node_inputs, node_outputs, node_registers, node_slots,
+    instructions, loopbacks, messages, state_map, output_map, signatures=None,
+    node_memory=MAX_NODE_MEMORY,
+):
+    """
+    Assemble the compiled design into a dictionary of plain values, ready to be
+    written out by 'write_design'.
+
+    Args:
+        mesh_rows     : Number of rows in the mesh
+        mesh_columns  : Number of columns in the mesh
+        node_inputs   : Number of inputs per node
+        node_outputs  : Number of outputs per node
+        node_registers: Number of working registers per node
+        node_slots    : Number of instruction slots per node
+        instructions  : Instruction sequences for every node
+        loopbacks     : The loopback mask for every node
+        messages      : Every message generated by every node
+        state_map     : Mapping of where each flop is held in the mesh
+        output_map    : Mapping of where each output is driven from in the mesh
+        signatures    : Signatures of the operations held by every node, in
+                        program order (optional, used as the base of an ECO)
+        node_memory   : Number of memory rows per node
+
+    Returns: Dictionary describing the design
+    """
     # Assemble the model
     model = {
         DESIGN_CONFIG: {
@@ -70,6 +114,7 @@ def export(
                 CFG_ND_OUTPUTS: node_outputs,
                 CFG_ND_REGS   : node_registers,
                 CFG_ND_SLOTS  : node_slots,
+                CFG_ND_MEMORY : node_memory,
             },
         },
         DESIGN_NODES  : [],
@@ -86,6 +131,8 @@ def export(
             NODE_LOOP  : loopbacks.get((row, col), 0),
             NODE_OUTS  : messages.get((row, col), []),
         }
+        if signatures is not None:
+            node[NODE_SIGS] = signatures.get((row, col), [])
         # Append node into the model
         model[DESIGN_NODES].append(node)
 
@@ -97,6 +144,20 @@ def export(
     # Insert the output mapping
     model[DESIGN_REPORTS][DSG_REP_OUTPUTS] = output_map
 
-    # Write the model to file
-    with open(output_path, "w") as fh:
-        json.dump(model, fh, indent=4)
+    # Return the assembled model
+    return model
+
+def write_design(output_path, model):
+    """
+    Write an assembled design out to file - paths ending in '.nxb' produce the
+    binary container format, otherwise the design is written as JSON.
+
+    Args:
+        output_path: Path to the output file to write
+        model      : The design dictionary from 'build_design'
+    """
+    if Path(output_path).suffix == BINARY_SUFFIX:
+        write_nxb(output_path, model)
+    else:
+        with open(output_path, "w") as fh:
+            json.dump(model, fh, indent=4)
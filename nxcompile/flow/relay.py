@@ -0,0 +1,167 @@
+# Copyright 2021, Peter Birch, mailto:peter@lightlogic.co.uk
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import hashlib
+import logging
+
+from nxconstants import Instruction as NXInstruction
+
+from .eco import SIG_LENGTH
+
+log = logging.getLogger("compiler.relay")
+
+class Relay:
+    """ Represents a node re-emitting a value received from another node """
+    def __init__(self, position, input, output, signature):
+        self.position  = position
+        self.input     = input
+        self.output    = output
+        self.signature = signature
+
+    def __repr__(self): return f"<Relay {self.position} I[{self.input}] O[{self.output}]>"
+
+def hops(src, tgt):
+    """ Number of hops a message takes between two (row, column) positions """
+    return abs(src[0] - tgt[0]) + abs(src[1] - tgt[1])
+
+def encode_relay(input):
+    """ Encode an instruction that copies a node input to the next output.
+
+    Args:
+        input: Index of the input to copy
+
+    Returns: Encoded instruction
+    """
+    instr          = NXInstruction()
+    instr.truth    = 0b1111_0000 # Result follows input A
+    instr.src_a    = input
+    instr.src_a_ip = 1
+    instr.tgt_reg  = 0
+    instr.gen_out  = 1
+    return instr.pack()
+
+def build_relays(
+    mesh, inputs, outputs, instrs, msgs, sigs, signatures, node_slots,
+    node_memory, max_fanout,
+):
+    """
+    Bound the number of messages any node output emits by building relay trees
+    for high fan-out signals. Targets are grouped by position and each group is
+    handed to an intermediate node, which receives the value combinationally and
+    re-emits the original messages, so the cycle behaviour is unchanged. Relay
+    nodes are chosen to minimise the hop distance from the source to the furthest
+    target of the group, and trees are built recursively where a single layer of
+    relays is not enough.
+
+    Boundary output messages are never relayed, as the output report identifies
+    the node that drives them.
+
+    Args:
+        mesh       : The Mesh that operations were placed into
+        inputs     : Compiled input allocation of every node (modified)
+        outputs    : Compiled output allocation of every node (modified)
+        instrs     : Encoded instructions of every node (modified)
+        msgs       : Compiled messages of every node (modified)
+        sigs       : Signatures of every node's instructions (modified)
+        signatures : Signature of every operation
+        node_slots : Maximum number of instructions per node
+        node_memory: Number of memory rows per node
+        max_fanout : Maximum number of messages per output
+
+    Returns: Number of relays inserted
+    """
+    assert max_fanout >= 2, f"Relay trees need a fan-out of at least 2, not {max_fanout}"
+    rows    = len(mesh.nodes)
+    created = []
+
+    def has_space(pos, messages):
+        memory = (
+            len(instrs[pos]) + len(outputs[pos]) +
+            sum(len(x) for x in msgs.get(pos, []))
+        )
+        return (
+            (len(instrs[pos]) < node_slots) and
+            (None in inputs[pos]) and (None in outputs[pos]) and
+            (memory + 1 + messages <= node_memory)
+        )
+
+    def distribute(src_pos, targets, budget, signature):
+        # If the targets fit within the budget, emit them directly
+        if len(targets) <= budget: return targets
+        # Split targets into at most 'budget' groups of neighbouring nodes
+        ordered = sorted(targets, key=lambda x: (x["row"], x["column"]))
+        size    = -(-len(ordered) // budget)
+        emitted = []
+        for group in (ordered[x:x+size] for x in range(0, len(ordered), size)):
+            if len(group) == 1:
+                emitted += group
+                continue
+            # Find the relay that minimises the worst hop count to the group
+            excluded = set([src_pos] + [(x["row"], x["column"]) for x in group])
+            best     = None
+            for node in mesh.all_nodes:
+                if node.position in excluded: continue
+                if not has_space(node.position, min(len(group), max_fanout)): continue
+                dists = [hops(node.position, (x["row"], x["column"])) for x in group]
+                cost  = (hops(src_pos, node.position) + max(dists), sum(dists))
+                if best is None or cost < best[0]: best = (cost, node.position)
+            if best is None:
+                log.warning(f"No space for a relay from {src_pos}, emitting directly")
+                emitted += group
+                continue
+            # Allocate the relay's input, output, and instruction
+            rly_pos   = best[1]
+            rly_sig   = hashlib.sha256(
+                f"RELAY({signature})".encode("utf-8")
+            ).hexdigest()[:SIG_LENGTH]
+            relay     = Relay(
+                rly_pos, inputs[rly_pos].index(None), outputs[rly_pos].index(None), rly_sig,
+            )
+            inputs[rly_pos][relay.input]   = relay
+            outputs[rly_pos][relay.output] = relay
+            instrs[rly_pos].append(encode_relay(relay.input))
+            sigs[rly_pos].append(rly_sig)
+            created.append(relay)
+            # Send the value to the relay, which then takes over the group
+            emitted.append({
+                "row": rly_pos[0], "column": rly_pos[1], "index": relay.input,
+                "is_seq": False
+            })
+            if rly_pos not in msgs:
+                msgs[rly_pos] = [[] for _ in range(len(outputs[rly_pos]))]
+            msgs[rly_pos][relay.output] = distribute(
+                rly_pos, group, max_fanout, rly_sig,
+            )
+        return emitted
+
+    for src_pos, node_msgs in list(msgs.items()):
+        for src_idx, messages in enumerate(node_msgs):
+            if len(messages) <= max_fanout: continue
+            source = outputs[src_pos][src_idx]
+            # Relays only take over from compiled operations
+            if isinstance(source, Relay): continue
+            boundary = [x for x in messages if x["row"] >= rows]
+            internal = [x for x in messages if x["row"] <  rows]
+            budget   = max_fanout - len(boundary)
+            if budget < 1:
+                log.warning(
+                    f"Output {src_idx} of {src_pos} drives {len(boundary)} "
+                    f"boundary outputs, unable to relay"
+                )
+                continue
+            node_msgs[src_idx] = boundary + distribute(
+                src_pos, internal, budget, signatures[source],
+            )
+    log.info(f"Inserted {len(created)} relays to limit fan-out to {max_fanout}")
+    return len(created)
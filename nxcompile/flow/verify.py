@@ -0,0 +1,236 @@
+# Copyright 2021, Peter Birch, mailto:peter@lightlogic.co.uk
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import logging
+import re
+
+import numpy as np
+
+from nxsim import NXSim, pack_lanes, unpack_lanes
+
+from ..models.constant import Constant
+from ..models.flop import Flop
+from ..models.gate import Gate, Operation
+from .eco import base_placement, compute_signatures
+from .elements import Input, Instruction, State
+from .export import DSG_REP_OUTPUTS, DSG_REP_STATE, DESIGN_REPORTS
+
+log = logging.getLogger("compiler.verify")
+
+class NetlistSim:
+    """
+    Bit-parallel simulation of a simplified module (gates and flops only), with
+    every signal held as 64-bit words carrying one lane per bit. Boundary inputs
+    are held low, as the mesh has no means of driving them.
+    """
+
+    def __init__(self, module, words):
+        """ Initialise the NetlistSim instance.
+
+        Args:
+            module: The simplified logic module
+            words : Number of 64-bit lane words to simulate
+        """
+        self.words = words
+        self.flops = [x for x in module.children.values() if isinstance(x, Flop)]
+        gates      = [x for x in module.children.values() if isinstance(x, Gate)]
+        # Order gates so that every gate follows its sources
+        self.order, done = [], set()
+        for root in gates:
+            stack = [(root, False)]
+            while stack:
+                gate, expanded = stack.pop()
+                if gate in done: continue
+                if expanded:
+                    done.add(gate)
+                    self.order.append(gate)
+                    continue
+                stack.append((gate, True))
+                stack += [(x, False) for x in gate.inputs if isinstance(x, Gate) and x not in done]
+        # Flop state and gate values
+        self.state  = { x: np.zeros(words, dtype=np.uint64) for x in self.flops }
+        self.values = {}
+
+    def value(self, src):
+        """ Resolve the current value of a gate, constant, or port bit """
+        if isinstance(src, Gate): return self.values[src]
+        if isinstance(src, Constant):
+            return np.full(self.words, np.uint64((1 << 64) - 1) if src.value else 0, dtype=np.uint64)
+        parent = src.port.parent if src.port else None
+        if isinstance(parent, Flop):
+            if parent.output     and src is parent.output[0]    : return self.state[parent]
+            if parent.output_inv and src is parent.output_inv[0]: return ~self.state[parent]
+        if src.driver is not None: return self.value(src.driver)
+        return np.zeros(self.words, dtype=np.uint64)
+
+    def evaluate(self):
+        """ Evaluate every gate against the current flop state """
+        for gate in self.order:
+            inputs = [self.value(x) for x in gate.inputs]
+            if gate.op == Operation.INVERT:
+                self.values[gate] = ~inputs[0]
+                continue
+            result = inputs[0].copy()
+            for other in inputs[1:]:
+                if   gate.op in (Operation.AND, Operation.NAND): result &= other
+                elif gate.op in (Operation.OR,  Operation.NOR ): result |= other
+                else                                           : result ^= other
+            if gate.op in (Operation.NAND, Operation.NOR, Operation.XNOR):
+                result = ~result
+            self.values[gate] = result
+
+    def next_state(self, flop):
+        """ The value a flop will capture at the end of the current cycle """
+        return self.value(flop.input[0].driver)
+
+    def tick(self):
+        """ Capture the next state into every flop """
+        nexts = { x: self.next_state(x) for x in self.flops }
+        self.state.update(nexts)
+
+def gate_placement(module, design):
+    """
+    Locate where every gate of the module was placed in the compiled design by
+    matching the signature of its logic cone against those held by each node.
+
+    Args:
+        module: The simplified logic module
+        design: Dictionary describing the compiled design
+
+    Returns: Dictionary of gate to a list of (row, column, instruction index)
+    """
+    terms  = {
+        x: Instruction(x, [], [], None)
+        for x in module.children.values() if isinstance(x, Gate)
+    }
+    states = {
+        x: State(x.input[0], None, [])
+        for x in module.children.values() if isinstance(x, Flop)
+    }
+    for gate, term in terms.items():
+        for src in gate.inputs:
+            if isinstance(src, Gate)    : term.sources.append(terms[src])
+            elif isinstance(src, Constant): term.sources.append(src)
+            elif isinstance(src.port.parent, Flop): term.sources.append(states[src.port.parent])
+            else: term.sources.append(Input(src, []))
+    signatures = compute_signatures(list(terms.values()))
+    placement  = base_placement(design)
+    return { x: placement.get(signatures[terms[x]], []) for x in terms }
+
+def verify(module, design, cycles, lanes=64, seed=None):
+    """
+    Check that a compiled design behaves the same as the simplified module it
+    was compiled from. Both are simulated side by side across many lanes, each
+    starting from a random flop state, and every output port bit and flop is
+    compared after each cycle. Output bits that the mesh registers are compared
+    against the value the flop will capture.
+
+    Args:
+        module: The simplified logic module
+        design: Dictionary describing the compiled design
+        cycles: Number of cycles to simulate
+        lanes : Number of independent lanes to simulate
+        seed  : Seed for the random initial state
+
+    Returns: None if no mismatch was found, otherwise a dictionary describing
+             the first divergence
+    """
+    mesh    = NXSim(design, lanes=lanes)
+    netlist = NetlistSim(module, mesh.words)
+    valid   = pack_lanes(np.ones(lanes, dtype=bool))
+    reports = design[DESIGN_REPORTS]
+    # Randomise the initial state of every flop in both simulations
+    rng     = np.random.default_rng(seed)
+    by_name = {}
+    for flop in netlist.flops:
+        values = rng.integers(0, 2, lanes).astype(bool)
+        netlist.state[flop] = pack_lanes(values)
+        if flop.output: by_name[str(flop.output[0])] = flop
+    for name in set(reports[DSG_REP_STATE].values()):
+        values = unpack_lanes(netlist.state[by_name[name]], lanes)
+        mesh.set_state(name, values)
+    # Work out what each output bit and flop should be compared against
+    checks = []
+    for key, name in reports[DSG_REP_STATE].items():
+        row, col, idx = map(int, re.match(r"R(\d+)C(\d+)I(\d+)", key).groups())
+        flop = by_name[name]
+        checks.append((
+            f"flop {name}", (row, col),
+            (lambda r=row, c=col, i=idx: mesh.inputs_next[mesh.node_index(r, c), i]),
+            (lambda f=flop: netlist.next_state(f)),
+        ))
+    for name, bits in reports[DSG_REP_OUTPUTS].items():
+        port = module.ports[name]
+        for idx_bit, (src_row, src_col, src_idx, *_, is_seq) in enumerate(bits):
+            driver = port.bits[idx_bit].driver
+            flop   = driver.port.parent if is_seq else None
+            if flop is not None and flop.output_inv and driver is flop.output_inv[0]:
+                expect = lambda f=flop: ~netlist.next_state(f)
+            elif flop is not None:
+                expect = lambda f=flop: netlist.next_state(f)
+            else:
+                expect = lambda d=driver: netlist.value(d)
+            checks.append((
+                f"output {name}[{idx_bit}]", (src_row, src_col),
+                (lambda r=src_row, c=src_col, i=src_idx: mesh.outputs[mesh.node_index(r, c), i]),
+                expect,
+            ))
+    # Run both simulations side by side
+    for cycle in range(cycles):
+        netlist.evaluate()
+        mesh.step()
+        for label, position, actual, expected in checks:
+            diff = (actual() ^ expected()) & valid
+            if not diff.any(): continue
+            lane = int(np.flatnonzero(unpack_lanes(diff, lanes))[0])
+            return diagnose(module, design, netlist, mesh, cycle, lane, label, position)
+        netlist.tick()
+    return None
+
+def diagnose(module, design, netlist, mesh, cycle, lane, label, position):
+    """
+    Find the first instruction whose result differs from the gate it was
+    compiled from, walking gates so that sources are checked before the gates
+    that they feed.
+
+    Args:
+        module  : The simplified logic module
+        design  : Dictionary describing the compiled design
+        netlist : The netlist simulation
+        mesh    : The mesh simulation
+        cycle   : Cycle in which the mismatch was seen
+        lane    : First lane showing the mismatch
+        label   : Description of the mismatching output or flop
+        position: The (row, column) of the node holding the mismatching signal
+
+    Returns: Dictionary describing the divergence
+    """
+    word, bit = divmod(lane, 64)
+    results   = mesh.evaluate(capture=True)
+    placement = gate_placement(module, design)
+    def lane_bit(values): return (int(values[word]) >> bit) & 1
+    failure   = {
+        "cycle": cycle, "lane": lane, "signal": label,
+        "row": position[0], "column": position[1], "instruction": None, "gate": None,
+    }
+    for gate in netlist.order:
+        slots = placement.get(gate, [])
+        if not slots: continue
+        expected = lane_bit(netlist.values[gate])
+        actual   = [lane_bit(results[idx, mesh.node_index(row, col)]) for row, col, idx in slots]
+        if expected in actual: continue
+        row, col, idx = slots[0]
+        failure.update(row=row, column=col, instruction=idx, gate=gate.name)
+        break
+    return failure
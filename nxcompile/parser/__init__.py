@@ -19,8 +19,11 @@ import re
 
 log = logging.getLogger("parser")
 
+from .lazy import LazyLookup
 from .model import Model
 from .module import Module
+from .parallel import ordered_map, pack_module, pack_module_range, resolve_jobs
+from .stream import JSONStream
 
 class Parser:
     """ Parser for the JSON file output from Yosys """
@@ -31,31 +34,129 @@ class Parser:
     MODELS  = "models"
 
     # Regular expressions
-    RGX_JSON_COMMENT = re.compile(r"(/[*][^*/]+[*]/)")
-    RGX_CREATOR      = re.compile(r"^Yosys ([^\s]+) [(](.*?)[)]$")
+    RGX_CREATOR = re.compile(r"^Yosys ([^\s]+) [(](.*?)[)]$")
 
-    def __init__(self, path):
+    def __init__(self, path, chunk_size=None, jobs=1):
         """ Initialise the Parser instance.
 
         Args:
-            path: Path to the file to read in
+            path      : Path to the file to read in
+            chunk_size: Number of bytes to read from the file at a time
+            jobs      : Number of processes to parse modules with, where 0 uses
+                        every CPU (default: 1, parse within this process)
         """
         # Store the file path
-        self.path = Path(path)
+        self.path       = Path(path)
+        self.chunk_size = chunk_size
+        self.jobs       = resolve_jobs(jobs)
+        # Parsed sections
+        self.creator = None
+        self.modules = []
+        self.models  = []
+        # Lookups of parsed modules and models by name
+        self.module_lookup = {}
+        self.model_lookup  = {}
 
     def parse(self):
-        """ Run the parser steps """
-        # Read in the raw data
-        raw_str = ""
-        with open(self.path, "r") as fh: raw_str = fh.read()
-        # Strip out comments in the form '/* ... */'
-        clean_str = Parser.RGX_JSON_COMMENT.sub("", raw_str)
-        # Convert JSON string into a dictionary
-        data = json.loads(clean_str)
-        # Digest each top-level section
-        self.creator = self.parse_creator(data.get(Parser.CREATOR, None))
-        self.modules = self.parse_modules(data.get(Parser.MODULES,   {}))
-        self.models  = self.parse_models (data.get(Parser.MODELS,    {}))
+        """
+        Run the parser steps. The file is streamed in chunks, with each module
+        and model decoded and digested as it is encountered so that the peak
+        memory usage tracks the largest entry rather than the whole file.
+
+        When multiple jobs are requested, modules are parsed across a pool of
+        processes and returned in packed form - the order of the modules is
+        always that of the file, regardless of the number of workers.
+        """
+        self.creator = None
+        self.modules = []
+        self.models  = []
+        with open(self.path, "rb") as fh:
+            stream = JSONStream(fh, chunk_size=self.chunk_size)
+            # Digest all other sections inline, forwarding on modules
+            def module_entries():
+                for section, key, _, _, raw in stream.entries(
+                    (Parser.MODULES, Parser.MODELS)
+                ):
+                    if section == Parser.CREATOR:
+                        self.creator = self.parse_creator(json.loads(raw))
+                    elif section == Parser.MODULES:
+                        yield key, raw
+                    elif section == Parser.MODELS:
+                        self.models.append(self.parse_model(key, json.loads(raw)))
+                    else:
+                        log.debug(f"Ignoring top-level section '{section}'")
+            # Parse modules either in parallel or within this process
+            if self.jobs > 1:
+                log.info(f"Parsing modules using {self.jobs} processes")
+                for packed in ordered_map(
+                    self.jobs, pack_module, module_entries()
+                ):
+                    self.modules.append(self.unpack_module(packed))
+            else:
+                for key, raw in module_entries():
+                    self.modules.append(self.parse_module(key, json.loads(raw)))
+        self.module_lookup = { x.name: x for x in self.modules }
+        self.model_lookup  = { x.name: x for x in self.models  }
+
+    def index(self):
+        """
+        Stream through the file recording the byte range of every module and
+        model without parsing them. The 'module_lookup' and 'model_lookup'
+        attributes are populated with lazy mappings, which only build the
+        modules and models that are actually accessed (e.g. those reachable
+        from the top-level during elaboration).
+        """
+        self.creator = None
+        self.modules = []
+        self.models  = []
+        mod_ranges, mdl_ranges = {}, {}
+        with open(self.path, "rb") as fh:
+            stream = JSONStream(fh, chunk_size=self.chunk_size)
+            for section, key, start, end, raw in stream.entries(
+                (Parser.MODULES, Parser.MODELS), keep=False
+            ):
+                if section == Parser.CREATOR:
+                    self.creator = self.parse_creator(json.loads(raw))
+                elif section == Parser.MODULES:
+                    mod_ranges[key] = (start, end)
+                elif section == Parser.MODELS:
+                    mdl_ranges[key] = (start, end)
+                else:
+                    log.debug(f"Ignoring top-level section '{section}'")
+        log.info(
+            f"Indexed {len(mod_ranges)} modules and {len(mdl_ranges)} models"
+        )
+        self.module_lookup = LazyLookup(self.path, mod_ranges, self.parse_module)
+        self.model_lookup  = LazyLookup(self.path, mdl_ranges, self.parse_model )
+
+    def preload(self, top):
+        """
+        Parse every module reachable from the top-level in parallel, working
+        through the hierarchy one level at a time, so that later accesses to the
+        lazy lookup do not need to parse anything. Only has an effect after
+        'index' has been called and when multiple jobs are requested.
+
+        Args:
+            top: Name of the top-level module
+        """
+        lookup = self.module_lookup
+        if not isinstance(lookup, LazyLookup) or self.jobs <= 1: return
+        log.info(f"Parsing modules using {self.jobs} processes")
+        level, seen = [top], { top }
+        while level:
+            todo = [x for x in level if x not in lookup.built]
+            for packed in ordered_map(self.jobs, pack_module_range, (
+                (self.path, x, *lookup.ranges[x]) for x in todo
+            )):
+                lookup.built[packed[0]] = self.unpack_module(packed)
+            # Find the next level of the hierarchy
+            next_level = []
+            for key in level:
+                for cell in lookup[key].cells:
+                    if cell.type in lookup and cell.type not in seen:
+                        seen.add(cell.type)
+                        next_level.append(cell.type)
+            level = next_level
 
     def parse_creator(self, raw):
         """ Parse the raw creator data string.
@@ -72,11 +173,26 @@ class Parser:
         Args:
             data: The dictionary parsed from Yosys JSON input
         """
-        mods = []
-        for key, desc in data.items():
-            log.info(f"Detected module '{key}'")
-            mods.append(Module(key, desc))
-        return mods
+        return [self.parse_module(k, v) for k, v in data.items()]
+
+    def parse_module(self, key, desc):
+        """ Parse a single Yosys JSON module description into an object.
+
+        Args:
+            key : Name of the module
+            desc: The dictionary describing the module
+        """
+        log.info(f"Detected module '{key}'")
+        return Module(key, desc)
+
+    def unpack_module(self, packed):
+        """ Rebuild a module parsed by a worker process from its packed form.
+
+        Args:
+            packed: The packed module (see Module.pack)
+        """
+        log.info(f"Detected module '{packed[0]}'")
+        return Module.unpack(packed)
 
     def parse_models(self, data):
         """ Parse the Yosys JSON model data into objects.
@@ -84,8 +200,14 @@ class Parser:
         Args:
             data: The dictionary parsed from Yosys JSON input
         """
-        models = []
-        for key, desc in data.items():
-            log.info(f"Detected model '{key}'")
-            models.append(Model(key, desc))
-        return models
+        return [self.parse_model(k, v) for k, v in data.items()]
+
+    def parse_model(self, key, desc):
+        """ Parse a single Yosys JSON model description into an object.
+
+        Args:
+            key : Name of the model
+            desc: The list describing the model
+        """
+        log.info(f"Detected model '{key}'")
+        return Model(key, desc)
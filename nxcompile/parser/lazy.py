@@ -0,0 +1,63 @@
+# Copyright 2021, Peter Birch, mailto:peter@lightlogic.co.uk
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from collections.abc import Mapping
+import io
+import json
+import logging
+
+log = logging.getLogger("parser.lazy")
+
+from .stream import JSONStream
+
+class LazyLookup(Mapping):
+    """
+    Read-only mapping from entry name to parsed object, where each entry is only
+    read back from the file and built the first time it is accessed. Membership
+    tests and iteration over the keys do not trigger any parsing.
+    """
+
+    def __init__(self, path, ranges, builder):
+        """ Initialise the LazyLookup instance.
+
+        Args:
+            path   : Path to the JSON file containing the entries
+            ranges : Dictionary of entry name to byte range (start, end)
+            builder: Function called with the name and decoded description of
+                     an entry, which returns the parsed object
+        """
+        self.path    = path
+        self.ranges  = ranges
+        self.builder = builder
+        self.built   = {}
+
+    def __getitem__(self, key):
+        if key not in self.built:
+            start, end = self.ranges[key]
+            with open(self.path, "rb") as fh:
+                fh.seek(start)
+                raw = fh.read(end - start)
+            # Pass through the stream to strip out any comments
+            _, _, raw = JSONStream(io.BytesIO(raw)).capture()
+            self.built[key] = self.builder(key, json.loads(raw))
+        return self.built[key]
+
+    def __contains__(self, key):
+        return key in self.ranges
+
+    def __iter__(self):
+        return iter(self.ranges)
+
+    def __len__(self):
+        return len(self.ranges)
@@ -140,6 +140,85 @@ class Module(Base):
             selects.append(Select(port, *[x[2] for x in components]))
         return selects
 
+    def pack(self):
+        """
+        Encode the parsed module into a compact, picklable form where every bit
+        is referred to by its index in the concatenation of the module's ports,
+        nets, and cell ports (in that order).
+
+        Returns: Tuple describing the module, which can be decoded by 'unpack'
+        """
+        signals = self.ports + self.nets
+        for cell in self.cells: signals += list(cell.ports.values())
+        bit_ids = {}
+        for signal in signals:
+            for bit in signal.bits: bit_ids[id(bit)] = len(bit_ids)
+        drivers, targets = [], []
+        for signal in signals:
+            for bit in signal.bits:
+                if isinstance(bit.driver, Constant):
+                    drivers.append(str(bit.driver.value))
+                elif bit.driver is not None:
+                    drivers.append(bit_ids[id(bit.driver)])
+                else:
+                    drivers.append(None)
+                targets.append([bit_ids[id(x)] for x in bit.targets])
+        return (
+            self.name, self.attributes, self.parameters,
+            [(x.name, int(x.direction), x.width) for x in self.ports],
+            [(x.name, x.width, x.hide, x.attributes) for x in self.nets],
+            [(
+                x.name, x.type, x.model, x.hide, x.parameters, x.attributes,
+                [(y.name, int(y.direction), y.width) for y in x.ports.values()],
+            ) for x in self.cells],
+            drivers, targets,
+        )
+
+    @classmethod
+    def unpack(cls, packed):
+        """ Rebuild a module from the compact form produced by 'pack'.
+
+        Args:
+            packed: Tuple describing the module
+
+        Returns: Instance of Module
+        """
+        (
+            name, attributes, parameters, ports, nets, cells, drivers, targets
+        ) = packed
+        module = cls.__new__(cls)
+        Base.__init__(module, name)
+        module.raw        = None
+        module.attributes = dict(attributes)
+        module.parameters = dict(parameters)
+        module.ports      = []
+        module.nets       = []
+        module.cells      = []
+        bits              = []
+        for p_name, p_dirx, p_width in ports:
+            port = Port(p_name, PortDirection(p_dirx), module, p_width)
+            module.ports.append(port)
+            bits += port.bits
+        for n_name, n_width, n_hide, n_attrs in nets:
+            net = Net(n_name, n_width, hide=n_hide)
+            for key, val in n_attrs.items(): net.set_attribute(key, val)
+            module.nets.append(net)
+            bits += net.bits
+        for c_name, c_type, c_model, c_hide, c_params, c_attrs, c_ports in cells:
+            cell = Cell(c_name, c_type, c_model, module, c_hide)
+            for key, val in c_params.items(): cell.add_parameter(key, val)
+            for key, val in c_attrs.items(): cell.set_attribute(key, val)
+            for p_name, p_dirx, p_width in c_ports:
+                bits += cell.add_port(p_name, PortDirection(p_dirx), p_width).bits
+            module.cells.append(cell)
+        for bit, driver, bit_tgts in zip(bits, drivers, targets):
+            if isinstance(driver, str):
+                bit.driver = Constant(int(driver))
+            elif driver is not None:
+                bit.driver = bits[driver]
+            for tgt in bit_tgts: bit.add_target(bits[tgt])
+        return module
+
     def parse(self):
         """ Parse the raw module data into a structured representation """
         # Capture attributes
@@ -0,0 +1,85 @@
+# Copyright 2021, Peter Birch, mailto:peter@lightlogic.co.uk
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+import io
+import json
+import os
+
+from .module import Module
+from .stream import JSONStream
+
+def pack_module(key, raw):
+    """ Parse a module from its raw JSON bytes and return it in packed form.
+
+    Args:
+        key: Name of the module
+        raw: Raw bytes of the module's JSON description (without comments)
+
+    Returns: Packed module (see Module.pack)
+    """
+    return Module(key, json.loads(raw)).pack()
+
+def pack_module_range(path, key, start, end):
+    """ Read a module from a byte range of a file and return it in packed form.
+
+    Args:
+        path : Path to the JSON file
+        key  : Name of the module
+        start: Offset of the first byte of the module's description
+        end  : Offset of the byte following the module's description
+
+    Returns: Packed module (see Module.pack)
+    """
+    with open(path, "rb") as fh:
+        fh.seek(start)
+        raw = fh.read(end - start)
+    # Pass through the stream to strip out any comments
+    _, _, raw = JSONStream(io.BytesIO(raw)).capture()
+    return pack_module(key, raw)
+
+def resolve_jobs(jobs):
+    """ Resolve the number of worker processes to use.
+
+    Args:
+        jobs: Requested number of jobs, where 0 or None uses every CPU
+
+    Returns: Number of worker processes
+    """
+    assert jobs is None or jobs >= 0, f"Job count must not be negative, not {jobs}"
+    return jobs if jobs else (os.cpu_count() or 1)
+
+def ordered_map(jobs, func, items):
+    """
+    Apply a function to a stream of argument tuples across a pool of worker
+    processes. Results are yielded in the order that the items were submitted,
+    regardless of which worker completes first, and the number of items in
+    flight is bounded so that the input stream is consumed incrementally.
+
+    Args:
+        jobs : Number of worker processes
+        func : Function to call (must be defined at module level)
+        items: Iterable of argument tuples
+
+    Yields: Result of each call in submission order
+    """
+    with ProcessPoolExecutor(max_workers=jobs) as pool:
+        pending = deque()
+        for args in items:
+            pending.append(pool.submit(func, *args))
+            if len(pending) >= (2 * jobs):
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
@@ -0,0 +1,253 @@
+# Copyright 2021, Peter Birch, mailto:peter@lightlogic.co.uk
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import json
+import re
+
+class JSONStream:
+    """
+    Incremental reader for large JSON documents. The file is tokenised in fixed
+    size chunks, with '/* ... */' comments stripped inline, and the raw bytes of
+    each entry are captured individually so that only one entry is ever held in
+    memory at a time.
+    """
+
+    # Default number of bytes to read on each access to the file
+    CHUNK_SIZE = 4 * 1024 * 1024
+
+    # Regular expressions
+    RGX_STRUCTURE  = re.compile(rb"[\"{}\[\]/]")
+    RGX_STRING     = re.compile(rb"[\"\\]")
+    RGX_SCALAR_END = re.compile(rb"[,{}\[\]\s/]")
+    RGX_NON_SPACE  = re.compile(rb"\S")
+
+    def __init__(self, fh, chunk_size=None):
+        """ Initialise the JSONStream instance.
+
+        Args:
+            fh        : File handle opened in binary mode
+            chunk_size: Number of bytes to read on each access (optional)
+        """
+        self.fh         = fh
+        self.chunk_size = chunk_size or JSONStream.CHUNK_SIZE
+        # Buffer holding the unconsumed tail of the file
+        self.__buffer = b""
+        self.__base   = 0
+        self.__pos    = 0
+        # Capture state (segments of the current entry, comments excluded)
+        self.__segments = []
+        self.__capture  = None
+
+    @property
+    def offset(self):
+        """ Absolute byte offset of the read position within the file """
+        return self.__base + self.__pos
+
+    def __fill(self):
+        """ Read the next chunk from the file, discarding consumed data.
+
+        Returns: True if more data was read, False at the end of the file
+        """
+        # Retain any captured data before the buffer is compacted
+        if self.__capture is not None:
+            self.__segments.append(self.__buffer[self.__capture:self.__pos])
+            self.__capture = 0
+        chunk = self.fh.read(self.chunk_size)
+        self.__base  += self.__pos
+        self.__buffer = self.__buffer[self.__pos:] + chunk
+        self.__pos    = 0
+        return len(chunk) > 0
+
+    def __need(self, count=1):
+        """ Ensure a number of bytes are available beyond the read position.
+
+        Args:
+            count: Number of bytes required
+        """
+        while (self.__pos + count) > len(self.__buffer):
+            if not self.__fill():
+                raise Exception(f"Unexpected end of JSON at offset {self.offset}")
+
+    def __skip_comment(self):
+        """ Skip over a '/* ... */' comment, excluding it from any capture """
+        self.__need(2)
+        if self.__buffer[self.__pos:self.__pos+2] != b"/*":
+            raise Exception(f"Unexpected '/' in JSON at offset {self.offset}")
+        # Suspend capture while skipping the comment
+        capturing = (self.__capture is not None)
+        if capturing:
+            self.__segments.append(self.__buffer[self.__capture:self.__pos])
+            self.__capture = None
+        self.__pos += 2
+        while True:
+            end = self.__buffer.find(b"*/", self.__pos)
+            if end >= 0:
+                self.__pos = end + 2
+                break
+            # Keep the last byte in case the terminator straddles two chunks
+            self.__pos = max(self.__pos, len(self.__buffer) - 1)
+            if not self.__fill():
+                raise Exception("Unterminated comment in JSON")
+        # Resume capture
+        if capturing: self.__capture = self.__pos
+
+    def __skip_string(self):
+        """ Skip over a string, starting from the opening quote """
+        self.__pos += 1
+        while True:
+            match = JSONStream.RGX_STRING.search(self.__buffer, self.__pos)
+            if not match:
+                self.__pos = len(self.__buffer)
+                self.__need()
+                continue
+            # Skip escaped characters (ensuring the escaped byte is loaded)
+            if match.group() == b"\\":
+                self.__pos = match.start()
+                self.__need(2)
+                self.__pos += 2
+                continue
+            # Closing quote found
+            self.__pos = match.end()
+            return
+
+    def __skip_scalar(self):
+        """ Skip over a number, boolean, or null value """
+        while True:
+            match = JSONStream.RGX_SCALAR_END.search(self.__buffer, self.__pos)
+            if match:
+                self.__pos = match.start()
+                return
+            self.__pos = len(self.__buffer)
+            if not self.__fill(): return
+
+    def __skip_container(self):
+        """ Skip over an object or array, starting from the opening bracket """
+        depth = 0
+        while True:
+            match = JSONStream.RGX_STRUCTURE.search(self.__buffer, self.__pos)
+            if not match:
+                self.__pos = len(self.__buffer)
+                self.__need()
+                continue
+            self.__pos = match.start()
+            char       = match.group()
+            if char == b"\"":
+                self.__skip_string()
+            elif char == b"/":
+                self.__skip_comment()
+            else:
+                self.__pos += 1
+                depth      += 1 if char in (b"{", b"[") else -1
+                if depth == 0: return
+
+    def __skip_value(self):
+        """ Skip over a value of any type """
+        char = self.peek()
+        if   char in (b"{", b"["): self.__skip_container()
+        elif char == b"\""       : self.__skip_string()
+        else                     : self.__skip_scalar()
+
+    def peek(self):
+        """ Skip whitespace and comments, then return the next byte.
+
+        Returns: The next significant byte, or None at the end of the file
+        """
+        while True:
+            match = JSONStream.RGX_NON_SPACE.search(self.__buffer, self.__pos)
+            if not match:
+                self.__pos = len(self.__buffer)
+                if not self.__fill(): return None
+                continue
+            self.__pos = match.start()
+            if match.group() == b"/":
+                self.__skip_comment()
+                continue
+            return match.group()
+
+    def expect(self, *chars):
+        """ Consume the next significant byte, checking it is as expected.
+
+        Args:
+            chars: Acceptable values for the next byte
+
+        Returns: The consumed byte
+        """
+        char = self.peek()
+        if char not in chars:
+            raise Exception(
+                f"Expected {' or '.join(x.decode() for x in chars)} in JSON at "
+                f"offset {self.offset}, got {char}"
+            )
+        self.__pos += 1
+        return char
+
+    def capture(self, keep=True):
+        """ Consume the next value, optionally capturing its raw bytes.
+
+        Args:
+            keep: Whether to capture the bytes of the value (default: True)
+
+        Returns: Tuple of the start offset, end offset, and the captured bytes
+                 with comments removed (None if not kept)
+        """
+        self.peek()
+        start = self.offset
+        if keep:
+            self.__segments = []
+            self.__capture  = self.__pos
+        try:
+            self.__skip_value()
+        finally:
+            if keep:
+                self.__segments.append(self.__buffer[self.__capture:self.__pos])
+                self.__capture = None
+        raw, self.__segments = b"".join(self.__segments), []
+        return start, self.offset, (raw if keep else None)
+
+    def members(self):
+        """ Iterate through the keys of an object, leaving the read position at
+            the start of each value. The value must be consumed (via 'capture')
+            before the iterator is advanced.
+
+        Yields: The decoded key of each member
+        """
+        self.expect(b"{")
+        if self.peek() == b"}":
+            self.__pos += 1
+            return
+        while True:
+            _, _, key = self.capture()
+            self.expect(b":")
+            yield json.loads(key)
+            if self.expect(b",", b"}") == b"}": return
+
+    def entries(self, expand, keep=True):
+        """
+        Walk the top-level object of the document, capturing each member of the
+        sections named in 'expand' separately and all other sections whole.
+
+        Args:
+            expand: Names of top-level sections to iterate through
+            keep  : Whether to capture the bytes of members of expanded sections,
+                    otherwise only their offsets are returned (default: True)
+
+        Yields: Tuple of section, key (None for whole sections), start offset,
+                end offset, and the raw bytes of the value
+        """
+        for section in self.members():
+            if section in expand:
+                for key in self.members():
+                    yield (section, key, *self.capture(keep=keep))
+            else:
+                yield (section, None, *self.capture())
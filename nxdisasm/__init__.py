@@ -18,3 +18,4 @@ from pathlib import Path
 
 root = Path(__file__).parent.parent
 sys.path.append((root / "common" / "work").as_posix())
+sys.path.append((root / "common" / "python").as_posix())
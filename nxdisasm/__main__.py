@@ -12,140 +12,169 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
-import json
+from collections import namedtuple
 from pathlib import Path
 
 import click
+import numpy as np
 from mako.lookup import TemplateLookup
 
-from nxconstants import Instruction
-
-# Main sections
-DESIGN_CONFIG  = "configuration"
-DESIGN_NODES   = "nodes"
-DESIGN_REPORTS = "reports"
-# Mesh configuration
-CONFIG_ROWS    = "rows"
-CONFIG_COLUMNS = "columns"
-CONFIG_NODE    = "node"
-CFG_ND_INPUTS  = "inputs"
-CFG_ND_OUTPUTS = "outputs"
-CFG_ND_REGS    = "registers"
-CFG_ND_SLOTS   = "slots"
-# Per-node configuration
-NODE_ROW    = "row"
-NODE_COLUMN = "column"
-NODE_INSTRS = "instructions"
-NODE_LOOP   = "loopback"
-NODE_OUTS   = "outputs"
+from nxloader import NXLoader
+
+from .pysim import write_python
+
 # Design reports
-DSG_REP_STATE   = "state"
 DSG_REP_OUTPUTS = "outputs"
 
 def verilog_safe(val):
     """ Reformat a name to be safe for Verilog """
     return val.translate(val.maketrans(".[", "__", "]"))
 
-@click.command()
-@click.option("--listing", type=click.File("w"), help="Dump a text listing of instructions")
-@click.option("--verilog", type=click.File("w"), help="Dump a Verilog conversion of the design")
-@click.argument("design", type=click.File("r"))
-def main(listing, verilog, design):
-    """ Disassemble a compiled design.
+def parse_selection(ctx, param, value):
+    """ Parse a selection of indices such as '0-3,5' into a set """
+    if value is None: return None
+    selected = set()
+    try:
+        for part in value.split(","):
+            first, _, last = part.partition("-")
+            selected.update(range(int(first), int(last or first) + 1))
+    except ValueError:
+        raise click.BadParameter(f"Expecting a list of indices or ranges, not '{value}'")
+    return selected
 
-    Arguments:\n
-        DESIGN: Path to the compiled design.
+class Disassembler:
     """
-    # Read in the design
-    model = json.load(design)
-    # Pickup the configuration section
-    config   = model[DESIGN_CONFIG]
-    cfg_rows = config[CONFIG_ROWS]
-    cfg_cols = config[CONFIG_COLUMNS]
-    cfg_node = config[CONFIG_NODE]
-    # Extract per node configuration
-    nc_inputs    = cfg_node[CFG_ND_INPUTS]
-    nc_outputs   = cfg_node[CFG_ND_OUTPUTS]
-    nc_registers = cfg_node[CFG_ND_REGS]
-    # Load the instruction sequences for every node
-    nodes = [
-        [[] for _c in range(cfg_cols)] for _r in range(cfg_rows)
-    ]
-    node_inputs = [
-        [{} for _c in range(cfg_cols)] for _r in range(cfg_cols)
-    ]
-    node_outputs = [
-        [{} for _c in range(cfg_cols)] for _r in range(cfg_cols)
-    ]
-    outputs = {}
-    for node_data in model[DESIGN_NODES]:
-        n_row = node_data[NODE_ROW]
-        n_col = node_data[NODE_COLUMN]
-        # Load the instruction sequence
-        out_idx = 0
-        for instr_idx, raw in enumerate(node_data[NODE_INSTRS]):
-            instr = Instruction()
-            instr.unpack(raw)
-            nodes[n_row][n_col].append(instr)
-            if instr.gen_out:
-                node_outputs[n_row][n_col][out_idx] = instr_idx
-                out_idx += 1
-        # Load the node loopback
-        lb_val = node_data[NODE_LOOP]
-        lb_idx = 0
-        while lb_val != 0:
-            # Check for loopback
-            if lb_val & 0x1:
-                node_inputs[n_row][n_col][lb_idx] = (n_row, n_col, lb_idx, 1, True)
-            # Shift to the next signal
-            lb_val >>= 1
-            lb_idx  += 1
-        # Load the node inputs
-        for idx_output, msgs in enumerate(node_data[NODE_OUTS]):
-            for msg in msgs:
-                tgt_row = msg["row"]
-                tgt_col = msg["column"]
-                tgt_idx = msg["index"]
-                tgt_seq = msg["is_seq"]
-                # Skip entries talking to 'fake' nodes
-                if tgt_row >= cfg_rows: continue
-                # Link input -> output
-                node_inputs[tgt_row][tgt_col][tgt_idx] = (
-                    n_row, n_col, idx_output, tgt_seq, False
-                )
-    for name, bits in model[DESIGN_REPORTS][DSG_REP_OUTPUTS].items():
-        for idx_bit, (src_row, src_col, src_idx, _, _, _, is_seq) in enumerate(bits):
-            if not name in outputs: outputs[name] = {}
-            outputs[name][idx_bit] = (src_row, src_col, src_idx, is_seq)
-    # Create a template lookup
-    tmpl_lkp = TemplateLookup(directories=[Path(__file__).parent / "templates"])
-    # Dump a text-based listing of all instructions
-    if listing:
-        listing.write(tmpl_lkp.get_template("disasm.txt").render(
-            nodes=nodes,
-        ))
-    # Dump a Verilog implementation of the instructions
-    if verilog:
-        verilog.write(tmpl_lkp.get_template("disasm.v").render(
-            # Node configurations
-            cfg_nd_ins =nc_inputs,
-            cfg_nd_outs=nc_outputs,
-            cfg_nd_regs=nc_registers,
-            # Instructions and mappings
-            nodes       =nodes,
-            node_inputs =node_inputs,
-            node_outputs=node_outputs,
-            outputs     =outputs,
-            # Helper functions
-            verilog_safe=verilog_safe,
-            # Constants
-            is_inverting=lambda x: (x.truth in (
+    Renders a compiled design one node at a time, decoding each node's slice of
+    the instruction arrays only when that node is reached so that output can
+    be streamed straight to file.
+    """
+
+    def __init__(self, loader, rows=None, columns=None):
+        """ Initialise the Disassembler instance.
+
+        Args:
+            loader : NXLoader instance holding the design
+            rows   : Optional set of rows to disassemble (defaults to all)
+            columns: Optional set of columns to disassemble (defaults to all)
+        """
+        self.loader   = loader
+        self.selected = [
+            (row, col)
+            for row in range(loader.cfg_rows) for col in range(loader.cfg_cols)
+            if (rows is None or row in rows) and (columns is None or col in columns)
+        ]
+        self.node_idx = {
+            (int(x["row"]), int(x["column"])): idx
+            for idx, x in enumerate(loader.nodes)
+        }
+        fields      = loader.instr_fields
+        self.Instr  = namedtuple("Instr", list(fields) + ["raw"])
+        self.fields = [fields[x] for x in fields] + [loader.instructions]
+        # Instruction index driving each output of every node
+        gen_out = fields["gen_out"].astype(bool)
+        self.node_outputs = {}
+        for (row, col), idx in self.node_idx.items():
+            start, count = self.span(idx)
+            self.node_outputs[row, col] = np.flatnonzero(gen_out[start:start+count])
+        # Source of every node input (loopbacks and mappings in node order)
+        self.node_inputs = {}
+        for idx, entry in enumerate(loader.nodes):
+            n_row, n_col = int(entry["row"]), int(entry["column"])
+            lb_val = loader.state[n_row][n_col].loopback
+            lb_idx = 0
+            while lb_val != 0:
+                if lb_val & 0x1:
+                    self.node_inputs[n_row, n_col, lb_idx] = (n_row, n_col, lb_idx, 1, True)
+                lb_val >>= 1
+                lb_idx  += 1
+            for out_idx, out in enumerate(loader.output_table[idx]):
+                start, count = int(out["start"]), int(out["count"])
+                for msg in loader.mappings[start:start+count]:
+                    tgt_row, tgt_col = int(msg["row"]), int(msg["column"])
+                    # Skip entries talking to 'fake' nodes
+                    if tgt_row >= loader.cfg_rows: continue
+                    self.node_inputs[tgt_row, tgt_col, int(msg["index"])] = (
+                        n_row, n_col, out_idx, bool(msg["is_seq"]), False
+                    )
+        # Boundary outputs
+        self.outputs = {}
+        for name, bits in loader.reports[DSG_REP_OUTPUTS].items():
+            self.outputs[name] = {
+                idx_bit: (src_row, src_col, src_idx, is_seq)
+                for idx_bit, (src_row, src_col, src_idx, _, _, _, is_seq) in enumerate(bits)
+            }
+
+    def span(self, idx):
+        """ Return the first instruction and instruction count of a node """
+        entry = self.loader.nodes[idx]
+        return int(entry["instr_start"]), int(entry["instr_count"])
+
+    def instructions(self, row, col):
+        """ Decode the instructions of a single node.
+
+        Args:
+            row: Row of the node
+            col: Column of the node
+
+        Returns: List of named tuples holding each instruction's fields
+        """
+        if (row, col) not in self.node_idx: return []
+        start, count = self.span(self.node_idx[row, col])
+        return [
+            self.Instr(*x) for x in
+            zip(*(arr[start:start+count].tolist() for arr in self.fields))
+        ]
+
+    def inputs(self, row, col):
+        """ Return the sources of every input of a single node """
+        return {
+            idx: self.node_inputs[row, col, idx]
+            for idx in range(self.loader.cfg_ins) if (row, col, idx) in self.node_inputs
+        }
+
+    def externals(self):
+        """ Outputs of unselected nodes that feed selected nodes """
+        selected, names = set(self.selected), []
+        for row, col in self.selected:
+            for src_row, src_col, src_pos, _, is_lb in self.inputs(row, col).values():
+                if is_lb or (src_row, src_col) in selected: continue
+                src_instr = self.node_outputs[src_row, src_col][src_pos]
+                name      = f"r{src_row}_c{src_col}_instr_{src_instr}"
+                if name not in names: names.append(name)
+        return names
+
+    def write_listing(self, fh, lookup):
+        """ Stream a text listing of every selected node's instructions.
+
+        Args:
+            fh    : File handle to write to
+            lookup: Mako template lookup
+        """
+        tmpl = lookup.get_template("disasm.txt").get_def("node")
+        for row, col in self.selected:
+            fh.write(tmpl.render(row=row, col=col, instrs=self.instructions(row, col)))
+
+    def write_verilog(self, fh, lookup):
+        """ Stream a Verilog conversion of every selected node.
+
+        Args:
+            fh    : File handle to write to
+            lookup: Mako template lookup
+        """
+        tmpl    = lookup.get_template("disasm.v")
+        helpers = {
+            "cfg_nd_ins"  : self.loader.cfg_ins,
+            "cfg_nd_outs" : self.loader.cfg_outs,
+            "cfg_nd_regs" : self.loader.cfg_regs,
+            "verilog_safe": verilog_safe,
+            "is_inverting": lambda x: (x.truth in (
                 0b0000_1111, # INVERT
                 0b0011_1111, # NAND
                 0b0000_0011, # NOR
                 0b1100_0011, # XNOR
             )),
-            verilog_op=lambda x: {
+            "verilog_op"  : lambda x: {
+                0b1111_0000 : "",  # BUFFER
                 0b0000_1111 : "!", # INVERT
                 0b1100_0000 : "&", # AND
                 0b0011_1111 : "&", # NAND
@@ -154,7 +183,49 @@ def main(listing, verilog, design):
                 0b0011_1100 : "^", # XOR
                 0b1100_0011 : "^", # XNOR
             }[x.truth],
+        }
+        fh.write(tmpl.get_def("header").render(
+            outputs=self.outputs, externals=self.externals(), **helpers,
+        ))
+        for row, col in self.selected:
+            fh.write(tmpl.get_def("node").render(
+                row         =row,
+                col         =col,
+                instrs      =self.instructions(row, col),
+                inputs      =self.inputs(row, col),
+                node_outputs=self.node_outputs,
+                **helpers,
+            ))
+        fh.write(tmpl.get_def("footer").render(
+            outputs=self.outputs, selected=set(self.selected), **helpers,
         ))
 
+@click.command()
+@click.option("--listing", type=click.File("w"), help="Dump a text listing of instructions")
+@click.option("--verilog", type=click.File("w"), help="Dump a Verilog conversion of the design")
+@click.option("--python",  type=click.Path(dir_okay=False), help="Generate a Python simulation module for the design")
+@click.option("--rows",    type=str, callback=parse_selection, help="Only disassemble these rows (e.g. '0-3,5')")
+@click.option("--columns", type=str, callback=parse_selection, help="Only disassemble these columns (e.g. '0-3,5')")
+@click.argument("design", type=click.Path(exists=True, dir_okay=False))
+def main(listing, verilog, python, rows, columns, design):
+    """ Disassemble a compiled design.
+
+    Arguments:\n
+        DESIGN: Path to the compiled design (binary or JSON).
+    """
+    # Generate a Python model (reused if the stamp matches the design)
+    if python:
+        write_python(design, python)
+    if not (listing or verilog): return
+    # Load the design and render the selected nodes
+    disasm = Disassembler(NXLoader(design), rows=rows, columns=columns)
+    lookup = TemplateLookup(directories=[Path(__file__).parent / "templates"])
+    # Dump a text-based listing of all instructions
+    if listing:
+        disasm.write_listing(listing, lookup)
+    # Dump a Verilog implementation of the instructions
+    if verilog:
+        disasm.write_verilog(verilog, lookup)
+
 if __name__ == "__main__":
     main(prog_name="nxdisasm")
@@ -0,0 +1,304 @@
+# Copyright 2021, Peter Birch, mailto:peter@lightlogic.co.uk
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import hashlib
+import importlib.util
+import logging
+import re
+from itertools import product
+from pathlib import Path
+
+from mako.lookup import TemplateLookup
+
+from nxloader import NXLoader
+
+log = logging.getLogger("nxdisasm.pysim")
+
+# Design reports
+DSG_REP_STATE   = "state"
+DSG_REP_OUTPUTS = "outputs"
+
+# Constant signals
+ZERO = "0"
+ONES = "M"
+
+# Line carrying the hash stamp in the generated module
+STAMP = "# nxdisasm-hash: "
+
+TEMPLATE = "disasm.py.mako"
+
+def expression(truth, sources):
+    """
+    Build a bitwise Python expression for a three input truth table, folding
+    away constant and repeated sources.
+
+    Args:
+        truth  : The 8-bit truth table (indexed by A in the MSB and C in the LSB)
+        sources: Expression for each of the A, B, and C inputs
+
+    Returns: String holding the expression
+    """
+    names = []
+    for src in sources:
+        if src not in (ZERO, ONES) and src not in names: names.append(src)
+    table = []
+    for bits in product((0, 1), repeat=len(names)):
+        env = dict(zip(names, bits), **{ ZERO: 0, ONES: 1 })
+        a, b, c = (env[x] for x in sources)
+        table.append((truth >> ((a << 2) | (b << 1) | c)) & 1)
+    return shannon(table, names)
+
+def shannon(table, names):
+    """ Recursively expand a truth table into an expression about its inputs.
+
+    Args:
+        table: List of output values, with the first name as the MSB of the index
+        names: Expressions for each input
+
+    Returns: String holding the expression
+    """
+    if not any(table): return ZERO
+    if all(table)    : return ONES
+    half     = len(table) // 2
+    var      = names[0]
+    lo, hi   = table[:half], table[half:]
+    if lo == hi: return shannon(lo, names[1:])
+    e_lo = shannon(lo, names[1:])
+    e_hi = shannon(hi, names[1:])
+    if e_lo == ZERO: return var if e_hi == ONES else f"({var} & {e_hi})"
+    if e_hi == ZERO: return f"(M ^ {var})" if e_lo == ONES else f"((M ^ {var}) & {e_lo})"
+    if e_hi == ONES: return f"({var} | {e_lo})"
+    if e_lo == ONES: return f"((M ^ {var}) | {e_hi})"
+    if all(x != y for x, y in zip(lo, hi)): return f"({var} ^ {e_lo})"
+    return f"({e_lo} ^ ({var} & ({e_hi} ^ {e_lo})))"
+
+def depends(truth, pos):
+    """ Test whether a truth table depends on one of its inputs.
+
+    Args:
+        truth: The 8-bit truth table
+        pos  : Bit position of the input within the table index (A=2, B=1, C=0)
+
+    Returns: True if the input affects the result
+    """
+    return any(
+        ((truth >> idx) & 1) != ((truth >> (idx | (1 << pos))) & 1)
+        for idx in range(8) if not (idx >> pos) & 1
+    )
+
+class PyDesign:
+    """
+    Flattens a compiled design into a straight-line sequence of bitwise
+    assignments, ordered so that every combinational path across the mesh is
+    resolved in a single pass. Working registers are renamed into the
+    instructions that last wrote them, and anything that cannot reach either a
+    flop or a boundary output is dropped.
+    """
+
+    def __init__(self, loader):
+        """ Initialise the PyDesign instance.
+
+        Args:
+            loader: NXLoader instance holding the design
+        """
+        self.loader = loader
+        self.rows   = loader.cfg_rows
+        # Signal name -> (truth table, sources)
+        self.signals = {}
+        # Flop name -> signal providing the next value
+        self.flops   = {}
+        self.__build()
+
+    def __build(self):
+        fields = self.loader.instr_fields
+        # Work out which instruction drives each node output
+        out_sig = {}
+        for entry in self.loader.nodes:
+            row, col = int(entry["row"]), int(entry["column"])
+            start    = int(entry["instr_start"])
+            count    = int(entry["instr_count"])
+            out_sig[row, col] = [
+                f"r{row}_c{col}_{idx}"
+                for idx in range(count) if fields["gen_out"][start + idx]
+            ]
+        def output(row, col, idx):
+            sigs = out_sig.get((row, col), [])
+            return sigs[idx] if idx < len(sigs) else ZERO
+        # Resolve the source of every node input
+        inputs = {}
+        for node_idx, entry in enumerate(self.loader.nodes):
+            row, col = int(entry["row"]), int(entry["column"])
+            for out_idx, out in enumerate(self.loader.output_table[node_idx]):
+                start, count = int(out["start"]), int(out["count"])
+                for mapping in self.loader.mappings[start:start+count]:
+                    tgt = (int(mapping["row"]), int(mapping["column"]), int(mapping["index"]))
+                    if tgt[0] >= self.rows: continue
+                    if not mapping["is_seq"]:
+                        inputs[tgt] = output(row, col, out_idx)
+                    elif tgt not in inputs:
+                        self.flops["r{}_c{}_i{}".format(*tgt)] = output(row, col, out_idx)
+            mask = self.loader.state[row][col].loopback
+            for idx in range(self.loader.cfg_ins):
+                if (mask >> idx) & 1 and (row, col, idx) not in inputs:
+                    self.flops[f"r{row}_c{col}_i{idx}"] = output(row, col, idx)
+        # Combinational inputs take precedence over any captured state
+        for row, col, idx in inputs:
+            self.flops.pop(f"r{row}_c{col}_i{idx}", None)
+        for name in self.flops: inputs.setdefault(
+            tuple(map(int, re.match(r"r(\d+)_c(\d+)_i(\d+)", name).groups())), name
+        )
+        # Translate every instruction into an expression
+        for entry in self.loader.nodes:
+            row, col = int(entry["row"]), int(entry["column"])
+            start    = int(entry["instr_start"])
+            regs     = {}
+            for idx in range(int(entry["instr_count"])):
+                truth   = int(fields["truth"][start + idx])
+                sources = []
+                for bit, pos in zip((2, 1, 0), ("a", "b", "c")):
+                    index = int(fields[f"src_{pos}"][start + idx])
+                    # Ignored sources are dropped to avoid false dependencies
+                    if not depends(truth, bit):
+                        sources.append(ZERO)
+                    elif fields[f"src_{pos}_ip"][start + idx]:
+                        sources.append(inputs.get((row, col, index), ZERO))
+                    else:
+                        sources.append(regs.get(index, ZERO))
+                name = f"r{row}_c{col}_{idx}"
+                self.signals[name] = (truth, sources)
+                regs[int(fields["tgt_reg"][start + idx])] = name
+        # Output and state reports
+        self.outputs = {
+            name: [output(b[0], b[1], b[2]) for b in bits]
+            for name, bits in self.loader.reports.get(DSG_REP_OUTPUTS, {}).items()
+        }
+        self.state = {}
+        for key, flop in self.loader.reports.get(DSG_REP_STATE, {}).items():
+            name = "r{}_c{}_i{}".format(*re.match(r"R(\d+)C(\d+)I(\d+)", key).groups())
+            if name in self.flops: self.state.setdefault(flop, []).append(name)
+
+    def schedule(self):
+        """
+        Order every live signal so that it follows all of its dependencies,
+        inlining signals that are simply copies or constants.
+
+        Returns: Tuple of the list of (name, expression) assignments and a
+                 function that resolves any signal to the expression for it
+        """
+        alias, order, state = {}, [], {}
+        def resolve(name):
+            return alias.get(name, name) if name in self.signals else name
+        roots = list(self.flops.values())
+        roots += [x for bits in self.outputs.values() for x in bits]
+        for root in roots:
+            stack = [root]
+            while stack:
+                name = stack[-1]
+                if name not in self.signals or state.get(name) == 2:
+                    stack.pop()
+                    continue
+                truth, deps = self.signals[name]
+                if state.get(name) == 1:
+                    stack.pop()
+                    state[name] = 2
+                    expr = expression(truth, [resolve(x) for x in deps])
+                    if re.fullmatch(r"\w+", expr):
+                        alias[name] = expr
+                    else:
+                        order.append((name, expr))
+                    continue
+                state[name] = 1
+                for dep in deps:
+                    if state.get(dep) == 1:
+                        raise Exception(f"Combinational loop through {dep}")
+                    stack.append(dep)
+        return order, resolve
+
+def design_hash(path):
+    """ Hash a design together with the code that generates its module.
+
+    Args:
+        path: Path to the compiled design
+
+    Returns: Hex digest string
+    """
+    digest = hashlib.sha256()
+    for part in (Path(path), Path(__file__), Path(__file__).parent / "templates" / TEMPLATE):
+        digest.update(part.read_bytes())
+    return digest.hexdigest()
+
+def cached_hash(path):
+    """ Read the hash stamp from a previously generated module.
+
+    Args:
+        path: Path to the generated module
+
+    Returns: Hex digest string, or None if the module is missing or unstamped
+    """
+    if not Path(path).exists(): return None
+    with open(path, "r") as fh:
+        for line in fh:
+            if line.startswith(STAMP): return line[len(STAMP):].strip()
+    return None
+
+def write_python(design, path):
+    """
+    Generate a Python simulation module for a compiled design, skipping the
+    work if the module already carries a stamp matching the design.
+
+    Args:
+        design: Path to the compiled design
+        path  : Path to write the generated module to
+
+    Returns: True if the module was regenerated, False if the cached copy was used
+    """
+    stamp = design_hash(design)
+    if cached_hash(path) == stamp:
+        log.info(f"Using cached Python model {path}")
+        return False
+    pydsg = PyDesign(NXLoader(design))
+    order, resolve = pydsg.schedule()
+    lookup = TemplateLookup(directories=[Path(__file__).parent / "templates"])
+    with open(path, "w") as fh:
+        fh.write(lookup.get_template(TEMPLATE).render(
+            stamp  =stamp,
+            design =Path(design).name,
+            order  =order,
+            flops  =list(pydsg.flops),
+            nexts  =[resolve(x) for x in pydsg.flops.values()],
+            state  ={ k: [list(pydsg.flops).index(x) for x in v] for k, v in pydsg.state.items() },
+            outputs={ k: [resolve(x) for x in v] for k, v in pydsg.outputs.items() },
+        ))
+    log.info(f"Generated Python model {path} with {len(order)} assignments")
+    return True
+
+def load_python(design, path=None):
+    """
+    Import the Python simulation module for a compiled design, generating it
+    next to the design if it is missing or out of date.
+
+    Args:
+        design: Path to the compiled design
+        path  : Optional path for the generated module, defaults to the design
+                path with a '_sim.py' suffix
+
+    Returns: The imported module
+    """
+    design = Path(design)
+    path   = Path(path) if path else design.with_name(f"{design.stem}_sim.py")
+    write_python(design, path)
+    spec   = importlib.util.spec_from_file_location(path.stem, path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
@@ -0,0 +1,155 @@
+<%doc>
+Copyright 2021, Peter Birch, mailto:peter@lightlogic.co.uk
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+</%doc>\
+# Generated by nxdisasm from ${design} - do not edit
+# nxdisasm-hash: ${stamp}
+#
+# Every signal is held as a Python integer where each bit carries the value of
+# an independent simulation lane, so one bitwise operation evaluates every lane.
+
+import random
+
+# Flop index for each named piece of state
+STATE = {
+%for name, indices in state.items():
+    ${repr(name)}: ${repr(indices)},
+%endfor
+}
+
+# Boundary outputs (LSB first)
+OUTPUTS = (
+%for name in outputs:
+    ${repr(name)},
+%endfor
+)
+
+class Model:
+    """ Straight-line simulation of the compiled design """
+
+    def __init__(self, lanes=1):
+        """ Initialise the model.
+
+        Args:
+            lanes: Number of independent lanes to simulate
+        """
+        self.lanes = lanes
+        self.mask  = (1 << lanes) - 1
+        self.reset()
+
+    def reset(self):
+        """ Return every lane to the initial (all zero) state """
+        self.cycle = 0
+        self.flops = [0] * ${len(flops)}
+        self.probe = [0] * ${sum(len(x) for x in outputs.values())}
+
+    def step(self, cycles=1):
+        """ Advance every lane by a number of cycles.
+
+        Args:
+            cycles: Number of cycles to run
+        """
+        if cycles <= 0: return
+        M = self.mask
+%if flops:
+        (
+    %for name in flops:
+            ${name},
+    %endfor
+        ) = self.flops
+%endif
+        for _ in range(cycles):
+%for name, expr in order:
+            ${name} = ${expr}
+%endfor
+%if flops:
+            (
+    %for name in flops:
+                ${name},
+    %endfor
+            ) = (
+    %for expr in nexts:
+                ${expr},
+    %endfor
+            )
+%else:
+            pass
+%endif
+        self.flops = [
+%for name in flops:
+            ${name},
+%endfor
+        ]
+        self.probe = [
+%for bits in outputs.values():
+    %for expr in bits:
+            ${expr},
+    %endfor
+%endfor
+        ]
+        self.cycle += cycles
+
+    def set_state(self, name, value):
+        """ Set the value held by a flop in every lane.
+
+        Args:
+            name : Name of the flop's output bit (as named in the state report)
+            value: Integer with one bit per lane
+        """
+        for index in STATE[name]: self.flops[index] = value & self.mask
+
+    def randomise_state(self, seed=None):
+        """ Give every flop of every lane a random value.
+
+        Args:
+            seed: Seed for the random number generator
+        """
+        rng = random.Random(seed)
+        for name in STATE: self.set_state(name, rng.getrandbits(self.lanes))
+
+    def get_output(self, name):
+        """ Read a boundary output of the design in every lane.
+
+        Args:
+            name: Name of the output port
+
+        Returns: List of the integer value of the output in each lane
+        """
+        bits = self.probe[OFFSETS[name]:OFFSETS[name]+WIDTHS[name]]
+        return [
+            sum(((bit >> lane) & 1) << idx for idx, bit in enumerate(bits))
+            for lane in range(self.lanes)
+        ]
+
+    def get_outputs(self):
+        """ Read every boundary output of the design in every lane.
+
+        Returns: Dictionary of output name to per-lane integer values
+        """
+        return { x: self.get_output(x) for x in OUTPUTS }
+
+<% offset = 0 %>\
+# Position of each output within the probes
+OFFSETS, WIDTHS = {}, {}
+%for name, bits in outputs.items():
+OFFSETS[${repr(name)}], WIDTHS[${repr(name)}] = ${offset}, ${len(bits)}
+<% offset += len(bits) %>\
+%endfor
+
+# Single lane instance for simple use
+_default   = Model()
+reset      = _default.reset
+step       = _default.step
+set_state  = _default.set_state
+get_output = _default.get_output
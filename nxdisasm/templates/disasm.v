@@ -13,16 +13,20 @@ WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
 See the License for the specific language governing permissions and
 limitations under the License.
 </%doc>
+<%def name="header(outputs, externals)">\
 module Top (
       input  wire clk
     , input  wire rst
+%for name in externals:
+    , input  wire ${name}
+%endfor
 %for name, bits in outputs.items():
     , output wire [${len(bits)-1}:0] ${verilog_safe(name)}
 %endfor
 );
 
-%for row, columns in enumerate(nodes):
-    %for col, instrs in enumerate(columns):
+</%def>
+<%def name="node(row, col, instrs, inputs, node_outputs)">\
 // =============================================================================
 // Row ${f"{row:03d}"}, Column ${f"{col:03d}"}
 // =============================================================================
@@ -33,12 +37,12 @@ module Top (
         loopback = []
 %>\
         %for idx in range(cfg_nd_ins):
-            %if idx not in node_inputs[row][col]:
+            %if idx not in inputs:
 wire r${row}_c${col}_input_${idx} = 1'b0;
             %else:
 <%
-                src_row, src_col, src_pos, state, is_lb = node_inputs[row][col][idx]
-                src_instr_idx = node_outputs[src_row][src_col][src_pos]
+                src_row, src_col, src_pos, state, is_lb = inputs[idx]
+                src_instr_idx = node_outputs[src_row, src_col][src_pos]
                 if is_lb:
                     loopback.append((idx, src_instr_idx))
                 elif state:
@@ -49,7 +53,7 @@ reg  r${row}_c${col}_input_${idx};
                 %else:
 wire r${row}_c${col}_input_${idx} = r${src_row}_c${src_col}_instr_${src_instr_idx};
                 %endif
-            %endif ## idx not in node_inputs[row][col]
+            %endif ## idx not in inputs
         %endfor ## idx in range(cfg_nd_ins)
         %if instrs:
 
@@ -68,7 +72,7 @@ r${row}_c${col}_input_${instr.src_a}\
                 %else:
 r${row}_c${col}_instr_${reg_state[instr.src_a]}\
                 %endif ## instr.src_a_ip
-                %if verilog_op(instr) != "!":
+                %if verilog_op(instr) not in ("!", ""):
  ${verilog_op(instr)} \
                     %if instr.src_b_ip:
 r${row}_c${col}_input_${instr.src_b}\
@@ -77,7 +81,7 @@ r${row}_c${col}_instr_${reg_state[instr.src_b]}\
                     %endif ## instr.src_b_ip
                 %else:
                 \
-                %endif ## verilog_op(instr) != "!"
+                %endif ## verilog_op(instr) not in ("!", "")
 ); // TT: ${f"{instr.truth:08b}"}
 <%              reg_state[instr.tgt_reg] = idx %>\
             %endfor ## idx, instr in enumerate(instrs)
@@ -86,11 +90,11 @@ r${row}_c${col}_instr_${reg_state[instr.src_b]}\
 wire [${cfg_nd_outs-1}:0] r${row}_c${col}_outputs_next;
             %for out_idx in range(cfg_nd_outs):
 assign r${row}_c${col}_outputs_next[${out_idx}] = \
-                %if out_idx in node_outputs[row][col]:
-r${row}_c${col}_instr_${node_outputs[row][col][out_idx]};
+                %if out_idx < len(node_outputs[row, col]):
+r${row}_c${col}_instr_${node_outputs[row, col][out_idx]};
                 %else:
 1'b0;
-                %endif ## out_idx in node_outputs[row][col]
+                %endif ## out_idx < len(node_outputs[row, col])
             %endfor ## out_idx in range(cfg_nd_outs)
         %endif ## instrs
         %if stateful or instrs:
@@ -125,14 +129,16 @@ always @(posedge clk, posedge rst) begin : p_r${row}_c${col}_state
 end
         %endif ## stateful or instrs
 
-    %endfor ## col, instr in enumerate(columns)
-%endfor ## row, columns in enumerate(nodes)
+</%def>
+<%def name="footer(outputs, selected)">\
 // =============================================================================
 // Boundary Output Mapping
 // =============================================================================
 %for name, bits in outputs.items():
     %for idx, (src_row, src_col, src_idx, is_seq) in bits.items():
-        %if is_seq:
+        %if (src_row, src_col) not in selected:
+assign ${verilog_safe(name)}[${idx}] = 1'b0; // Row ${src_row}, Column ${src_col} not disassembled
+        %elif is_seq:
 reg ${verilog_safe(name)}_${idx}_q;
 always @(posedge clk, posedge rst) ${verilog_safe(name)}_${idx}_q <= rst ? 1'b0 : r${src_row}_c${src_col}_outputs[${src_idx}];
 assign ${verilog_safe(name)}[${idx}] = ${verilog_safe(name)}_${idx}_q;
@@ -144,3 +150,4 @@ assign ${verilog_safe(name)}[${idx}] = r${src_row}_c${src_col}_outputs[${src_idx
 %endfor
 
 endmodule
+</%def>
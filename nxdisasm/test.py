@@ -0,0 +1,46 @@
+# Copyright 2021, Peter Birch, mailto:peter@lightlogic.co.uk
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import re
+import shutil
+import subprocess
+import tempfile
+from pathlib import Path
+
+from click.testing import CliRunner
+
+from nxdisasm.__main__ import main
+
+# Design compiled with '--max-fanout 2', so it contains relay instructions
+design = Path(__file__).parent.parent / "nxmodel" / "py" / "design_8x8.json"
+
+print("# Disassembling a relayed design to Verilog")
+with tempfile.TemporaryDirectory() as tmpdir:
+    verilog = Path(tmpdir) / "design.v"
+    result  = CliRunner().invoke(main, ["--verilog", verilog.as_posix(), design.as_posix()])
+    assert result.exit_code == 0, result.output + repr(result.exception)
+    text    = verilog.read_text()
+    # Relays pass input A straight through
+    relays  = re.findall(r"= +\((r\d+_c\d+_\w+) +\); // TT: 11110000", text)
+    assert relays, "No relays found in the Verilog conversion"
+    print(f"# Converted {len(relays)} relays to buffers")
+    # Check the conversion elaborates, where a simulator is available
+    if shutil.which("iverilog"):
+        subprocess.run(
+            ["iverilog", "-g2012", "-o", (Path(tmpdir) / "design.vvp").as_posix(), verilog.as_posix()],
+            check=True,
+        )
+        print("# Verilog conversion compiles with iverilog")
+
+print("# All done!")
@@ -0,0 +1,85 @@
+# Copyright 2021, Peter Birch, mailto:peter@lightlogic.co.uk
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import json
+import time
+
+import click
+
+from nxmodel import Nexus, NXLoader
+
+def create_model(design, threads):
+    """ Create a model sized to suit a compiled design and load the design.
+
+    Args:
+        design : Path to the compiled design (JSON)
+        threads: Number of threads to step the mesh with
+
+    Returns: The loaded Nexus instance
+    """
+    with open(design, "r") as fh:
+        config = json.load(fh)["configuration"]
+    model = Nexus(
+        config["rows"], config["columns"],
+        config["node"]["inputs"], config["node"]["outputs"],
+    )
+    model.set_quiet(True)
+    model.set_threads(threads)
+    NXLoader(model, design)
+    return model
+
+def measure(design, threads, cycles):
+    """ Measure the rate at which a design runs with a given number of threads.
+
+    Args:
+        design : Path to the compiled design (JSON)
+        threads: Number of threads to step the mesh with
+        cycles : Number of cycles to run for
+
+    Returns: Tuple of the achieved rate in Hz, the number of mesh steps, and
+             the captured outputs
+    """
+    model   = create_model(design, threads)
+    start   = time.perf_counter()
+    capture = model.run_capture(cycles)
+    elapsed = time.perf_counter() - start
+    return (cycles / elapsed), model.get_mesh().get_step_count(), capture
+
+@click.command()
+@click.option("--threads", type=str, default="1,2,4,8", help="Comma separated thread counts to try")
+@click.option("--cycles",  type=int, default=10000,     help="Number of cycles to run for")
+@click.argument("designs", type=click.Path(exists=True, dir_okay=False), nargs=-1, required=True)
+def main(threads, cycles, designs):
+    """ Report the rate nxmodel achieves against the number of threads.
+
+    Arguments:\n
+        DESIGNS: Paths to compiled designs, for example those compiled from
+                 tests/multilayer and tests/multilayer_8bit.
+    """
+    counts = [int(x) for x in threads.split(",")]
+    print(f"{'Design':<40} {'Threads':>7} {'Rate (Hz)':>12} {'Speedup':>8} {'Steps':>10}")
+    for design in designs:
+        reference = None
+        for count in counts:
+            rate, steps, capture = measure(design, count, cycles)
+            if reference is None: reference = (rate, capture)
+            if (capture != reference[1]).any():
+                raise Exception(f"Outputs of {design} differ with {count} threads")
+            print(
+                f"{design:<40} {count:>7} {rate:>12.1f} "
+                f"{rate / reference[0]:>7.2f}x {steps:>10}"
+            )
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+# Copyright 2021, Peter Birch, mailto:peter@lightlogic.co.uk
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from pathlib import Path
+
+CHECKPOINT_SUFFIX = ".nxstate"
+
+def checkpoint_path(directory, cycle):
+    """ Return the path of the checkpoint taken at a given cycle.
+
+    Args:
+        directory: Directory holding the checkpoints
+        cycle    : Cycle that the checkpoint was taken at
+
+    Returns: Path to the checkpoint
+    """
+    return Path(directory) / f"cycle_{cycle:012d}{CHECKPOINT_SUFFIX}"
+
+def list_checkpoints(directory):
+    """ Find every checkpoint in a directory.
+
+    Args:
+        directory: Directory holding the checkpoints
+
+    Returns: List of (cycle, path) sorted by cycle
+    """
+    found = []
+    for path in Path(directory).glob(f"cycle_*{CHECKPOINT_SUFFIX}"):
+        try:
+            found.append((int(path.stem.split("_")[1]), path))
+        except ValueError:
+            continue
+    return sorted(found)
+
+def run_with_checkpoints(model, cycles, every, directory, keep=None):
+    """
+    Run a model for a number of cycles, saving a checkpoint of its state every
+    time the cycle count reaches a multiple of 'every'.
+
+    Args:
+        model    : The Nexus instance to run
+        cycles   : Number of cycles to run for
+        every    : Interval (in cycles) between checkpoints
+        directory: Directory to write checkpoints into
+        keep     : Optional number of most recent checkpoints to retain
+
+    Returns: List of paths to the checkpoints that were written
+    """
+    if every <= 0: raise Exception(f"Checkpoint interval must be positive, not {every}")
+    directory = Path(directory)
+    directory.mkdir(parents=True, exist_ok=True)
+    written   = []
+    remaining = cycles
+    while remaining > 0:
+        # Run up to the next multiple of the interval
+        step = min(remaining, every - (model.get_cycle() % every))
+        model.run(step)
+        remaining -= step
+        if model.get_cycle() % every: continue
+        path = checkpoint_path(directory, model.get_cycle())
+        model.save_state(path.as_posix())
+        written.append(path)
+        # Discard older checkpoints
+        if keep is not None:
+            for _, stale in list_checkpoints(directory)[:-keep]: stale.unlink()
+    return written
+
+def restore_latest(model, directory, before=None):
+    """ Restore the most recent checkpoint in a directory.
+
+    Args:
+        model    : The Nexus instance to restore into
+        directory: Directory holding the checkpoints
+        before   : Optional cycle that the checkpoint must not be after
+
+    Returns: The cycle that the model was restored to, or None if no suitable
+             checkpoint was found
+    """
+    for cycle, path in reversed(list_checkpoints(directory)):
+        if before is not None and cycle > before: continue
+        model.load_state(path.as_posix())
+        return cycle
+    return None
@@ -0,0 +1,227 @@
+# Copyright 2021, Peter Birch, mailto:peter@lightlogic.co.uk
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import hashlib
+import json
+import os
+from pathlib import Path
+import sys
+import tempfile
+import time
+import zlib
+
+import click
+import numpy as np
+
+from nxmodel import Nexus, NXLoader
+
+root = Path(__file__).absolute().parent.parent.parent
+sys.path.append((root / "common" / "python").as_posix())
+
+from nxbinary import NXBinary, is_nxb, write_nxb
+
+# Outcome of running a single stimulus file
+Result = namedtuple("Result", ["stimulus", "cycles", "elapsed", "digest", "mismatch", "outputs"])
+
+# State of each worker process, created once by the pool initialiser
+WORKER = {}
+
+def init_worker(design, directory, threads):
+    """
+    Create the model of a worker process and load the design into it, then
+    checkpoint the freshly loaded state so that every stimulus can start from
+    it without loading the design again.
+
+    Args:
+        design   : Path to the binary compiled design (shared by every worker)
+        directory: Directory to hold the worker's checkpoint
+        threads  : Number of threads to step the mesh with
+    """
+    start  = time.perf_counter()
+    binary = NXBinary(design)
+    model  = Nexus(binary.rows, binary.columns, binary.inputs, binary.outputs)
+    model.set_quiet(True)
+    model.set_threads(threads)
+    NXLoader(model, design)
+    reset = Path(directory) / f"worker_{os.getpid()}.nxstate"
+    model.save_state(reset.as_posix())
+    WORKER.update(model=model, reset=reset.as_posix(), load_time=time.perf_counter() - start)
+
+def run_shard(stimuli, expected, fail_fast, keep_outputs):
+    """ Run a shard of stimulus files through the worker's model.
+
+    Args:
+        stimuli     : Paths to the stimulus files (each a .npy array of shape
+                      cycles x inputs, driving every named flop of the design)
+        expected    : Dictionary of stimulus path to the expected digest
+        fail_fast   : Stop at the first mismatch
+        keep_outputs: Return the compressed outputs of every stimulus, rather
+                      than just those that mismatch
+
+    Returns: Tuple of the worker's PID, the time it took to load the design,
+             and a list of Result
+    """
+    model, results = WORKER["model"], []
+    for path in stimuli:
+        stimulus = np.load(path, mmap_mode="r")
+        model.load_state(WORKER["reset"])
+        start    = time.perf_counter()
+        outputs  = model.run_with_stimulus(stimulus, packed=True)
+        elapsed  = time.perf_counter() - start
+        digest   = hashlib.sha256(outputs.tobytes()).hexdigest()
+        mismatch = (expected.get(path) is not None) and (expected[path] != digest)
+        results.append(Result(
+            path, stimulus.shape[0], elapsed, digest, mismatch,
+            zlib.compress(outputs.tobytes()) if (mismatch or keep_outputs) else None,
+        ))
+        if mismatch and fail_fast: break
+    return os.getpid(), WORKER["load_time"], results
+
+class FarmReport:
+    """ Aggregated results and throughput of a regression farm run """
+
+    def __init__(self):
+        self.results    = []
+        self.load_times = {}
+        self.wall_time  = 0
+
+    def add(self, pid, load_time, results):
+        """ Accumulate the results of one shard.
+
+        Args:
+            pid      : PID of the worker that ran the shard
+            load_time: Time the worker took to load the design
+            results  : List of Result
+        """
+        self.load_times[pid] = load_time
+        self.results        += results
+
+    @property
+    def mismatches(self): return [x for x in self.results if x.mismatch]
+
+    @property
+    def cycles(self): return sum(x.cycles for x in self.results)
+
+    @property
+    def rate(self):
+        """ Aggregate rate in Hz across all workers """
+        return (self.cycles / self.wall_time) if self.wall_time else 0
+
+    @property
+    def worker_rate(self):
+        """ Mean rate in Hz of a single worker while running stimulus """
+        busy = sum(x.elapsed for x in self.results)
+        return (self.cycles / busy) if busy else 0
+
+    @property
+    def digests(self): return { x.stimulus: x.digest for x in self.results }
+
+    def summary(self):
+        """ Describe the run in a few lines """
+        loads = list(self.load_times.values())
+        return "\n".join([
+            f"Ran {len(self.results)} stimuli ({self.cycles} cycles) across "
+            f"{len(self.load_times)} workers in {self.wall_time:.2f}s",
+            f"Aggregate rate {self.rate:.1f} Hz, per worker {self.worker_rate:.1f} Hz",
+            f"Design load took {(sum(loads) / max(1, len(loads))):.3f}s per worker",
+            f"{len(self.mismatches)} mismatches",
+        ])
+
+def run_farm(
+    design, stimuli, workers=None, shard_size=4, expected=None,
+    fail_fast=False, keep_outputs=False, threads=1,
+):
+    """
+    Run many stimulus files against the same compiled design, sharding them
+    across a pool of processes. Each worker loads the design once from a binary
+    container, which is memory mapped so that every worker shares the same
+    pages, and JSON designs are converted first.
+
+    Args:
+        design      : Path to the compiled design (binary or JSON)
+        stimuli     : Paths to the stimulus files
+        workers     : Number of worker processes (defaults to one per CPU)
+        shard_size  : Number of stimulus files handed to a worker at a time
+        expected    : Optional dictionary of stimulus path (as given) to the
+                      expected digest
+        fail_fast   : Stop at the first mismatch
+        keep_outputs: Return the compressed outputs of every stimulus
+        threads     : Number of threads each worker steps the mesh with
+
+    Returns: FarmReport
+    """
+    # Results are keyed by the path to each stimulus, so each must be unique
+    stimuli, seen = [Path(x).as_posix() for x in stimuli], set()
+    for path in stimuli:
+        if path in seen: raise Exception(f"Stimulus {path} is listed more than once")
+        seen.add(path)
+    report = FarmReport()
+    start  = time.perf_counter()
+    with tempfile.TemporaryDirectory() as directory:
+        if not is_nxb(design):
+            with open(design, "r") as fh: model = json.load(fh)
+            design = Path(directory) / "design.nxb"
+            write_nxb(design, model)
+        shards  = [stimuli[x:x+shard_size] for x in range(0, len(stimuli), shard_size)]
+        pool    = ProcessPoolExecutor(
+            max_workers=workers, initializer=init_worker,
+            initargs=(Path(design).as_posix(), directory, threads),
+        )
+        try:
+            pending = [pool.submit(
+                run_shard, shard,
+                { x: (expected or {}).get(x) for x in shard },
+                fail_fast, keep_outputs,
+            ) for shard in shards]
+            for future in as_completed(pending):
+                report.add(*future.result())
+                if fail_fast and report.mismatches: break
+        finally:
+            pool.shutdown(wait=True, cancel_futures=True)
+    report.wall_time = time.perf_counter() - start
+    return report
+
+@click.command()
+@click.option("--workers",    type=int, default=None, help="Number of worker processes")
+@click.option("--shard-size", type=int, default=4,    help="Stimulus files per shard")
+@click.option("--threads",    type=int, default=1,    help="Threads each worker steps the mesh with")
+@click.option("--expected",   type=click.Path(exists=True, dir_okay=False), help="JSON of expected digests")
+@click.option("--digests",    type=click.Path(dir_okay=False), help="Write the digests of every stimulus to JSON")
+@click.option("--fail-fast",  is_flag=True, default=False, help="Stop at the first mismatch")
+@click.argument("design", type=click.Path(exists=True, dir_okay=False))
+@click.argument("stimuli", type=click.Path(exists=True, dir_okay=False), nargs=-1, required=True)
+def main(workers, shard_size, threads, expected, digests, fail_fast, design, stimuli):
+    """ Run stimulus files against a compiled design across many processes.
+
+    Arguments:\n
+        DESIGN : Path to the compiled design (binary or JSON).\n
+        STIMULI: Paths to stimulus files, each a .npy array of cycles x inputs.
+    """
+    if expected:
+        with open(expected, "r") as fh: expected = json.load(fh)
+    report = run_farm(
+        design, stimuli, workers=workers, shard_size=shard_size,
+        expected=expected, fail_fast=fail_fast, threads=threads,
+    )
+    print(report.summary())
+    for result in report.mismatches:
+        print(f"MISMATCH {result.stimulus} - digest {result.digest}")
+    if digests:
+        with open(digests, "w") as fh: json.dump(report.digests, fh, indent=4)
+    if report.mismatches: sys.exit(1)
+
+if __name__ == "__main__":
+    main()
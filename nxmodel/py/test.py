@@ -12,10 +12,18 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import filecmp
+import tempfile
 from pathlib import Path
 
+import numpy as np
+
 from nxmodel import Nexus, NXMesh, NXNode, NXLoader
 
+from checkpoint import list_checkpoints, restore_latest, run_with_checkpoints
+from farm import run_farm
+from waveform import compact_to_vcd
+
 # Create an instance of the model
 print("# Creating a 3x3 mesh")
 instance = Nexus(3, 3, 32, 32)
@@ -36,6 +44,9 @@ print("# Loading model into the mesh")
 NXLoader(instance, (Path(__file__).parent / "design.json").as_posix())
 
 # Run the mesh for 10,000 cycles
+print("# Bounding output history to 1,000 cycles")
+instance.set_history(1000)
+
 print("# Running model for 10,000 cycles")
 instance.run(10000)
 
@@ -51,4 +62,125 @@ print(f"# Next inputs    : {inst_node.get_next_inputs()}")
 print(f"# Current outputs: {inst_node.get_current_outputs()}")
 
 # All good
+print("# Walking output changes")
+changes = sum(len(x) for _, x in instance.iter_changes())
+print(f"# Saw {changes} output changes")
+
+print("# Capturing outputs for 1,000 cycles")
+capture = instance.run_capture(1000)
+print(f"# Captured {capture.shape} for ports {instance.get_output_names()}")
+
+print("# Driving random state for 1,000 cycles")
+stimulus = np.random.default_rng(0).integers(
+    0, 2, (1000, len(instance.get_input_names())), dtype=np.uint8
+)
+capture = instance.run_with_stimulus(stimulus)
+print(f"# Captured {capture.shape} with {stimulus.shape[1]} driven inputs")
+
+print("# Checkpointing and restoring the model")
+with tempfile.TemporaryDirectory() as tmpdir:
+    checkpoint = Path(tmpdir) / "test.nxstate"
+    instance.save_state(checkpoint.as_posix())
+    restored = Nexus(3, 3, 32, 32)
+    restored.load_state(checkpoint.as_posix())
+assert (restored.run_capture(100) == instance.run_capture(100)).all()
+print(f"# Restored model matches from cycle {instance.get_cycle() - 100}")
+
+print("# Stepping the restored model with 2 threads")
+restored.set_threads(2)
+assert (restored.run_capture(100) == instance.run_capture(100)).all()
+print(f"# Threaded model matches from cycle {instance.get_cycle() - 100}")
+
+print("# Stepping an 8x8 mesh serially and with 2 threads")
+design_8x8 = Path(__file__).parent / "design_8x8.json"
+results    = []
+for threads in (1, 2):
+    large = Nexus(8, 8, 8, 8)
+    large.set_quiet(True)
+    NXLoader(large, design_8x8.as_posix())
+    large.set_threads(threads)
+    large.reset_counters()
+    stimulus = np.random.default_rng(0).integers(
+        0, 2, (300, len(large.get_input_names())), dtype=np.uint8
+    )
+    capture  = large.run_with_stimulus(stimulus)
+    counters = large.get_counters()
+    results.append((
+        capture, large.get_mesh(),
+        { x: counters[x] for x in ("instructions", "restarts", "emitted", "stalls") },
+    ))
+(serial, serial_mesh, serial_counts), (pooled, pooled_mesh, pooled_counts) = results
+assert pooled_mesh.get_pooled_count() > 0
+assert (serial == pooled).all()
+assert serial_mesh.get_step_count() == pooled_mesh.get_step_count()
+assert serial_mesh.get_node_step_count() == pooled_mesh.get_node_step_count()
+assert all((serial_counts[x] == pooled_counts[x]).all() for x in serial_counts)
+print(
+    f"# Threaded 8x8 mesh matches over {serial_mesh.get_step_count()} steps, "
+    f"{pooled_mesh.get_pooled_count()} anti-diagonals stepped by the pool"
+)
+
+print("# Running with periodic checkpoints and restoring the latest")
+with tempfile.TemporaryDirectory() as tmpdir:
+    written = run_with_checkpoints(restored, 250, 100, tmpdir, keep=2)
+    assert [x for _, x in list_checkpoints(tmpdir)] == written[-2:]
+    end     = restored.get_cycle()
+    capture = restored.run_capture(100)
+    cycle   = restore_latest(restored, tmpdir)
+    assert cycle == restored.get_cycle()
+    restored.run(end - cycle)
+    assert (restored.run_capture(100) == capture).all()
+print(f"# Replayed from checkpoint at cycle {cycle} matches")
+
+print("# Streaming waveforms as VCD and in the compact format")
+with tempfile.TemporaryDirectory() as tmpdir:
+    for suffix in ("vcd", "nxw"):
+        waves = Nexus(3, 3, 32, 32)
+        waves.set_quiet(True)
+        NXLoader(waves, (Path(__file__).parent / "design.json").as_posix())
+        waves.open_waves((Path(tmpdir) / f"waves.{suffix}").as_posix())
+        waves.run(500)
+        waves.close_waves()
+    compact_to_vcd(Path(tmpdir) / "waves.nxw", Path(tmpdir) / "converted.vcd")
+    assert filecmp.cmp(Path(tmpdir) / "waves.vcd", Path(tmpdir) / "converted.vcd", shallow=False)
+print("# Converted compact waveform matches the streamed VCD")
+
+print("# Reporting mesh activity")
+active = inst_mesh.get_active_histogram()
+print(
+    f"# {inst_mesh.get_node_step_count()} node steps over "
+    f"{inst_mesh.get_step_count()} mesh steps, at most {np.flatnonzero(active).max()} "
+    f"of {len(active) - 1} nodes active"
+)
+
+print("# Reading performance counters")
+counters = instance.get_counters(reset=True)
+busiest  = np.unravel_index(counters["instructions"].argmax(), counters["instructions"].shape)
+settle   = counters["settle_histogram"]
+steps    = (settle * np.arange(len(settle), dtype=np.uint64)).sum()
+assert steps == counters["settle_steps"].sum()
+assert (np.bincount(counters["settle_steps"], minlength=len(settle)) == settle).all()
+print(
+    f"# {len(counters['settle_steps'])} cycles from {counters['start']} took "
+    f"{steps} steps, busiest node {tuple(map(int, busiest))} "
+    f"executed {counters['instructions'].max()} instructions"
+)
+cleared  = instance.get_counters()
+assert cleared["instructions"].sum() == 0
+assert len(cleared["settle_steps"]) == 0 and len(cleared["settle_histogram"]) == 0
+
+print("# Running stimulus files across a process pool")
+with tempfile.TemporaryDirectory() as tmpdir:
+    stimuli = []
+    for seed in range(4):
+        stimuli.append(Path(tmpdir) / f"stimulus_{seed}.npy")
+        np.save(stimuli[-1], np.random.default_rng(seed).integers(
+            0, 2, (1000, len(instance.get_input_names())), dtype=np.uint8
+        ))
+    design = Path(__file__).parent / "design.json"
+    report = run_farm(design, stimuli, workers=2, shard_size=1)
+    rerun  = run_farm(design, stimuli, workers=2, expected=report.digests, fail_fast=True)
+assert not rerun.mismatches
+print(f"# {report.summary().splitlines()[0]}")
+
 print("# All done!")
@@ -0,0 +1,108 @@
+# Copyright 2021, Peter Birch, mailto:peter@lightlogic.co.uk
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+from collections import namedtuple
+import struct
+
+# Compact waveform header
+MAGIC   = b"NXWAVE\0\0"
+VERSION = 1
+
+Signal = namedtuple("Signal", ["scope", "name", "width", "is_state"])
+
+def read_varint(fh):
+    """ Read an unsigned LEB128 varint, returning None at the end of file """
+    value, shift = 0, 0
+    while True:
+        byte = fh.read(1)
+        if not byte:
+            if shift: raise Exception("Truncated varint in waveform")
+            return None
+        value |= (byte[0] & 0x7F) << shift
+        shift += 7
+        if not byte[0] & 0x80: return value
+
+def read_compact(path):
+    """
+    Read a waveform written by nxmodel in the compact format, yielding the
+    signal declarations followed by every record of value changes.
+
+    Args:
+        path: Path to the compact waveform
+
+    Yields: The list of Signal declarations first, then a tuple of the cycle
+            and a dictionary of signal index to integer value for each record
+    """
+    with open(path, "rb") as fh:
+        if fh.read(len(MAGIC)) != MAGIC:
+            raise Exception(f"{path} is not a compact waveform")
+        version, = struct.unpack("<I", fh.read(4))
+        if version != VERSION:
+            raise Exception(f"Unsupported compact waveform version {version}")
+        signals = []
+        for _ in range(read_varint(fh)):
+            scope    = fh.read(read_varint(fh)).decode("utf-8")
+            name     = fh.read(read_varint(fh)).decode("utf-8")
+            width    = read_varint(fh)
+            is_state = fh.read(1) != b"\0"
+            signals.append(Signal(scope, name, width, is_state))
+        yield signals
+        cycle = 0
+        while True:
+            delta = read_varint(fh)
+            if delta is None: break
+            cycle  += delta
+            changes = {}
+            for _ in range(read_varint(fh)):
+                index = read_varint(fh)
+                size  = (signals[index].width + 7) // 8
+                changes[index] = int.from_bytes(fh.read(size), "little")
+            yield cycle, changes
+
+def compact_to_vcd(src, dst):
+    """ Convert a compact waveform into a VCD.
+
+    Args:
+        src: Path to the compact waveform
+        dst: Path to write the VCD to
+    """
+    records = read_compact(src)
+    signals = next(records)
+    codes   = []
+    with open(dst, "w") as fh:
+        fh.write("$version nxmodel $end\n$timescale 1ns $end\n")
+        scope = None
+        for index, signal in enumerate(signals):
+            code, value = "", index
+            while True:
+                code  += chr(ord("!") + (value % 94))
+                value //= 94
+                if not value: break
+            codes.append(code)
+            if signal.scope != scope:
+                if scope is not None: fh.write("$upscope $end\n")
+                scope = signal.scope
+                fh.write(f"$scope module {scope} $end\n")
+            name = "_".join(signal.name.split())
+            rng  = f" [{signal.width - 1}:0]" if signal.width > 1 else ""
+            fh.write(f"$var wire {signal.width} {code} {name}{rng} $end\n")
+        if scope is not None: fh.write("$upscope $end\n")
+        fh.write("$enddefinitions $end\n")
+        for cycle, changes in records:
+            fh.write(f"#{cycle}\n")
+            for index, value in changes.items():
+                width = signals[index].width
+                if width == 1: fh.write(f"{value}{codes[index]}\n")
+                else         : fh.write(f"b{value:0{width}b} {codes[index]}\n")
@@ -41,6 +41,8 @@ int main (int argc, char * argv []) {
         ("cycles", "Number of cycles to run for", cxxopts::value<uint32_t>()->default_value("10"))
         // VCD dumping
         ("vcd", "Path to write VCD out to", cxxopts::value<std::string>())
+        // Threading
+        ("threads", "Threads used to step the mesh (0 for all)", cxxopts::value<uint32_t>()->default_value("1"))
         // Debug/verbosity
         ("v,verbose", "Enable verbose output")
         ("h,help",    "Print help and usage information");
@@ -88,17 +90,23 @@ int main (int argc, char * argv []) {
     std::filesystem::path path = positional[0];
     NXModel::NXLoader loader(model, std::filesystem::canonical(path), verbose);
 
-    // Run for the requested number of cycles
-    uint32_t cycles = options["cycles"].as<uint32_t>();
-    model->run(cycles);
-
-    // Optionally write out a VCD
+    // Optionally stream out a VCD as the model runs (as nothing else consumes
+    // the output history, only the latest cycle is retained)
+    model->set_history(1);
     if (options.count("vcd")) {
-        model->dump_vcd(
+        model->open_waves(
             std::filesystem::absolute(options["vcd"].as<std::string>()).string()
         );
     }
 
+    // Step the mesh with the requested number of threads
+    model->set_threads(options["threads"].as<uint32_t>());
+
+    // Run for the requested number of cycles
+    uint32_t cycles = options["cycles"].as<uint32_t>();
+    model->run(cycles);
+    model->close_waves();
+
     // Clean up
     if (verbose) std::cout << "[NXModel] Cleaning up" << std::endl;
     delete model;
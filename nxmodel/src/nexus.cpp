@@ -14,7 +14,10 @@
 
 #include <assert.h>
 #include <chrono>
+#include <cstring>
+#include <fstream>
 #include <sstream>
+#include <stdexcept>
 
 #include "vcd_writer.h"
 
@@ -22,15 +25,82 @@
 
 using namespace NXModel;
 
+// Checkpoints start with a fixed header, followed by the state of every node
+// (in row-major order), the egress pipe, the output state, and the named ports
+// and state of the design. All fields are little-endian and every section is
+// a multiple of 64 bits, so the file can be memory mapped and walked directly.
+static const char     CHECKPOINT_MAGIC[8] = { 'N', 'X', 'S', 'T', 'A', 'T', 'E', '\0' };
+static const uint32_t CHECKPOINT_VERSION  = 1;
+
+typedef struct {
+    char     magic[8];
+    uint32_t version;
+    uint32_t rows;
+    uint32_t columns;
+    uint32_t node_inputs;
+    uint32_t node_outputs;
+    uint32_t reserved;
+    uint64_t cycle;
+} checkpoint_header_t;
+
+static void write_string (std::ostream & os, const std::string & value)
+{
+    uint32_t length = value.size();
+    uint32_t pad    = (8 - ((sizeof(length) + length) % 8)) % 8;
+    uint64_t zero   = 0;
+    os.write((const char *)&length, sizeof(length));
+    os.write(value.data(), length);
+    os.write((const char *)&zero, pad);
+}
+
+static std::string read_string (std::istream & is)
+{
+    uint32_t length = 0;
+    uint64_t zero   = 0;
+    is.read((char *)&length, sizeof(length));
+    if (!is.good()) return "";
+    std::string value(length, '\0');
+    is.read(&value[0], length);
+    is.read((char *)&zero, (8 - ((sizeof(length) + length) % 8)) % 8);
+    return value;
+}
+
+static void write_keys (std::ostream & os, const std::vector<Nexus::output_key_t> & keys)
+{
+    uint64_t count = keys.size();
+    os.write((const char *)&count, sizeof(count));
+    for (const auto & key : keys) {
+        uint32_t fields[4] = { std::get<0>(key), std::get<1>(key), std::get<2>(key), 0 };
+        os.write((const char *)fields, sizeof(fields));
+    }
+}
+
+static std::vector<Nexus::output_key_t> read_keys (std::istream & is)
+{
+    uint64_t count = 0;
+    is.read((char *)&count, sizeof(count));
+    std::vector<Nexus::output_key_t> keys;
+    for (uint64_t idx = 0; idx < count; idx++) {
+        uint32_t fields[4];
+        is.read((char *)fields, sizeof(fields));
+        if (!is.good()) break;
+        keys.push_back({ fields[0], fields[1], fields[2] });
+    }
+    return keys;
+}
+
 Nexus::Nexus (
     uint32_t rows,
     uint32_t columns,
     uint32_t node_inputs,
     uint32_t node_outputs,
     bool     verbose /* = false */
-)   : m_rows    ( rows          )
-    , m_columns ( columns       )
-    , m_verbose ( verbose       )
+)   : m_rows         ( rows          )
+    , m_columns      ( columns       )
+    , m_verbose      ( verbose       )
+    , m_quiet        ( false         )
+    , m_cycle        ( 0             )
+    , m_settle_start ( 0             )
 {
     // Link the ingress & egress pipes
     m_mesh    = std::make_shared<NXMesh>(
@@ -38,81 +108,269 @@ Nexus::Nexus (
     );
     m_ingress = m_mesh->get_node(0, 0)->get_pipe(DIRECTION_NORTH);
     m_egress  = std::make_shared<NXMessagePipe>();
-    m_mesh->get_node(m_rows-1, 0)->attach(DIRECTION_SOUTH, m_egress);
+    // Every node on the bottom row drains into the egress, as outputs are
+    // addressed to columns across the boundary and the clockwise fallback of
+    // an unconnected pipe would bounce them between bottom row nodes
+    for (uint32_t column = 0; column < m_columns; column++) {
+        m_mesh->get_node(m_rows-1, column)->attach(DIRECTION_SOUTH, m_egress);
+    }
+    // Create the output history
+    m_history = std::make_shared<NXHistory>();
 }
 
 void Nexus::run (uint32_t cycles)
 {
-    std::cout << "[NXMesh] Running for " << cycles << " cycles" << std::endl;
+    std::lock_guard<std::mutex> guard(m_lock);
+    if (!m_quiet) std::cout << "[NXMesh] Running for " << cycles << " cycles" << std::endl;
     // Take timestamp at start of run
     std::chrono::steady_clock::time_point begin = std::chrono::steady_clock::now();
     // Run for the requested number of cycles
     for (uint32_t cycle = 0; cycle < cycles; cycle++) {
-        // std::cout << "[NXMesh] Starting cycle " << cycle << std::endl;
-        // Step until idle
-        uint32_t steps = 0;
-        do  {
-            m_mesh->step((steps == 0));
-            steps++;
-        } while (!m_mesh->is_idle());
-        // std::cout << "[NXMesh] Finished cycle " << cycle << " in "
-        //           << steps << " steps" << std::endl;
-        // Summarise final output state
-        summary_t * summary = new summary_t();
-        // - Base the summary on the previous cycle
-        if (m_output.size() > 0) {
-            summary_t * last = m_output.back();
-            for (typename summary_t::iterator it = last->begin(); it != last->end(); it++) {
+        // Step until idle and digest the egress
+        step_cycle();
+        // Summarise the output
+        if (m_verbose) {
+            std::cout << "[Nexus] Cycle " << cycle << " state: " << std::endl;
+            for (typename summary_t::iterator it = m_state.begin(); it != m_state.end(); it++) {
                 output_key_t key   = it->first;
                 bool         state = it->second;
-                (*summary)[key] = state;
+                std::cout << " - " << std::get<0>(key)
+                          << ", "  << std::get<1>(key)
+                          << ", "  << std::get<2>(key)
+                          << " = " << state << std::endl;
             }
         }
-        // - Digest all queued egress messages
-        while (!m_egress->is_idle()) {
-            node_header_t header = m_egress->next_header();
-            switch (header.command) {
-                // Summarise final signal state
-                case NODE_COMMAND_SIGNAL : {
-                    node_signal_t msg;
-                    m_egress->dequeue(msg);
-                    output_key_t key = { msg.header.row, msg.header.column, msg.index };
-                    (*summary)[key] = msg.state;
-                    break;
+    }
+    // Work out delta
+    log_rate(begin, cycles);
+}
+
+void Nexus::run_capture (
+    uint32_t                  cycles,
+    std::vector<output_key_t> keys,
+    uint8_t                 * buffer,
+    bool                      packed /* = false */
+) {
+    run_buffered(cycles, NULL, keys, buffer, packed);
+}
+
+void Nexus::run_stimulus (
+    uint32_t                  cycles,
+    const stimulus_t        & stimulus,
+    std::vector<output_key_t> keys,
+    uint8_t                 * buffer,
+    bool                      packed /* = false */
+) {
+    // Check every target lies within the mesh
+    uint32_t node_inputs = m_mesh->get_node(0, 0)->get_input_count();
+    for (uint32_t idx = 0; idx < stimulus.targets.size(); idx++) {
+        input_key_t target = stimulus.targets[idx];
+        if (
+            (std::get<0>(target) >= m_rows     ) ||
+            (std::get<1>(target) >= m_columns  ) ||
+            (std::get<2>(target) >= node_inputs)
+        ) {
+            std::stringstream ss;
+            ss << "Stimulus target R" << std::get<0>(target) << "C"
+               << std::get<1>(target) << "I" << std::get<2>(target)
+               << " lies outside of the mesh";
+            throw std::invalid_argument(ss.str());
+        }
+        assert(stimulus.columns[idx] < stimulus.width);
+    }
+    run_buffered(cycles, &stimulus, keys, buffer, packed);
+}
+
+void Nexus::run_buffered (
+    uint32_t                  cycles,
+    const stimulus_t        * stimulus,
+    std::vector<output_key_t> keys,
+    uint8_t                 * buffer,
+    bool                      packed
+) {
+    std::lock_guard<std::mutex> guard(m_lock);
+    if (!m_quiet) std::cout << "[NXMesh] Running for " << cycles << " cycles" << std::endl;
+    // Take timestamp at start of run
+    std::chrono::steady_clock::time_point begin = std::chrono::steady_clock::now();
+    // Map every captured key to the columns it occupies
+    std::map<output_key_t, std::vector<uint32_t>> columns;
+    std::vector<uint8_t> row(keys.size(), 0);
+    for (uint32_t idx = 0; idx < keys.size(); idx++) {
+        columns[keys[idx]].push_back(idx);
+        summary_t::iterator it = m_state.find(keys[idx]);
+        if (it != m_state.end()) row[idx] = it->second ? 1 : 0;
+    }
+    // Net changes across the run, handed to the history once it completes
+    summary_t net;
+    // Run for the requested number of cycles
+    uint32_t width = packed ? ((keys.size() + 7) / 8) : keys.size();
+    for (uint32_t cycle = 0; cycle < cycles; cycle++) {
+        // Drive the stimulus for this cycle
+        if (stimulus != NULL) inject(*stimulus, cycle);
+        // Step until idle and digest the egress, without recording history
+        step_cycle(false);
+        // Apply only the bits that changed this cycle
+        for (changes_t::iterator it = m_changes.begin(); it != m_changes.end(); it++) {
+            net[it->first] = it->second;
+            std::map<output_key_t, std::vector<uint32_t>>::iterator match = columns.find(it->first);
+            if (match == columns.end()) continue;
+            for (uint32_t column : match->second) row[column] = it->second ? 1 : 0;
+        }
+        // Write out the row
+        uint8_t * ptr = &buffer[(uint64_t)cycle * width];
+        if (packed) {
+            for (uint32_t idx = 0; idx < width; idx++) ptr[idx] = 0;
+            for (uint32_t idx = 0; idx < row.size(); idx++) ptr[idx / 8] |= (row[idx] << (idx % 8));
+        } else {
+            std::copy(row.begin(), row.end(), ptr);
+        }
+    }
+    // Outputs were captured directly, so only keep the history consistent
+    if (cycles > 0) m_history->skip(m_cycle - 1, changes_t(net.begin(), net.end()));
+    // Work out delta
+    log_rate(begin, cycles);
+}
+
+void Nexus::inject (const stimulus_t & stimulus, uint32_t cycle)
+{
+    const uint8_t * row = &stimulus.values[(uint64_t)cycle * stimulus.width];
+    for (uint32_t idx = 0; idx < stimulus.targets.size(); idx++) {
+        // Signals are sent as combinational so that they take effect within
+        // this cycle, the message also sets the value for the next cycle
+        node_signal_t msg;
+        msg.header.row     = std::get<0>(stimulus.targets[idx]);
+        msg.header.column  = std::get<1>(stimulus.targets[idx]);
+        msg.header.command = NODE_COMMAND_SIGNAL;
+        msg.index          = std::get<2>(stimulus.targets[idx]);
+        msg.is_seq         = false;
+        msg.state          = (row[stimulus.columns[idx]] != 0);
+        m_ingress->enqueue(msg);
+    }
+}
+
+void Nexus::set_threads (uint32_t threads)
+{
+    std::lock_guard<std::mutex> guard(m_lock);
+    m_mesh->set_threads(threads);
+}
+
+void Nexus::step_cycle (bool record /* = true */)
+{
+    // Step until idle
+    uint32_t steps = 0;
+    do  {
+        m_mesh->step((steps == 0));
+        steps++;
+    } while (!m_mesh->is_idle());
+    m_settle.push_back(steps);
+    if (steps >= m_settle_histogram.size()) m_settle_histogram.resize(steps + 1, 0);
+    m_settle_histogram[steps]++;
+    // Digest all queued egress messages, noting the value each signal held
+    // before this cycle so that only net changes are recorded (a glitching
+    // output may send several messages within one cycle)
+    std::map<output_key_t, int> initial;
+    m_changes.clear();
+    while (!m_egress->is_idle()) {
+        node_header_t header = m_egress->next_header();
+        switch (header.command) {
+            // Track final signal state
+            case NODE_COMMAND_SIGNAL : {
+                node_signal_t msg;
+                m_egress->dequeue(msg);
+                output_key_t key = { msg.header.row, msg.header.column, msg.index };
+                if (initial.find(key) == initial.end()) {
+                    summary_t::iterator it = m_state.find(key);
+                    initial[key] = (it == m_state.end()) ? -1 : it->second;
                 }
-                // Collect trace messages
-                case NODE_COMMAND_TRACE : {
-                    node_trace_t msg;
-                    m_egress->dequeue(msg);
+                m_state[key] = msg.state;
+                break;
+            }
+            // Collect trace messages
+            case NODE_COMMAND_TRACE : {
+                node_trace_t msg;
+                m_egress->dequeue(msg);
+                if (!m_quiet) {
                     std::cout << "[Nexus] Got trace message from "
                               << std::dec << (int)msg.header.row << ", "
                               << std::dec << (int)msg.header.column
                               << std::endl;
-                    break;
-                }
-                // Anything else, just drop
-                default : {
-                    m_egress->dequeue_raw();
-                    continue;
                 }
+                break;
             }
-        }
-        // - Summarise the output
-        if (m_verbose) {
-            std::cout << "[Nexus] Cycle " << cycle << " state: " << std::endl;
-            for (typename summary_t::iterator it = summary->begin(); it != summary->end(); it++) {
-                output_key_t key   = it->first;
-                bool         state = it->second;
-                std::cout << " - " << std::get<0>(key)
-                          << ", "  << std::get<1>(key)
-                          << ", "  << std::get<2>(key)
-                          << " = " << state << std::endl;
+            // Anything else, just drop
+            default : {
+                m_egress->dequeue_raw();
+                continue;
             }
         }
-        // Record state
-        m_output.push_back(summary);
     }
-    // Work out delta
+    for (auto & entry : initial) {
+        bool state = m_state[entry.first];
+        // A signal that was never driven rests low
+        if (entry.second < 0 && !state) {
+            m_state.erase(entry.first);
+            continue;
+        }
+        if (entry.second != (int)state) m_changes.push_back({ entry.first, state });
+    }
+    // Record only the bits that changed
+    if (m_waves) {
+        NXWaveform::changes_t state;
+        sample_waves(state);
+        m_waves->sample(m_cycle + 1, m_changes, state);
+    }
+    if (record) m_history->record(m_cycle, m_changes);
+    m_cycle++;
+}
+
+void Nexus::sample_waves (NXWaveform::changes_t & changes)
+{
+    for (uint32_t idx = 0; idx < m_wave_keys.size(); idx++) {
+        input_key_t key   = m_wave_keys[idx];
+        bool        value = m_mesh->get_node(
+            std::get<0>(key), std::get<1>(key)
+        )->get_current_input(std::get<2>(key));
+        if (value == m_wave_last[idx]) continue;
+        m_wave_last[idx] = value;
+        changes.push_back({ key, value });
+    }
+}
+
+void Nexus::open_waves (const std::string path, bool state /* = true */)
+{
+    std::lock_guard<std::mutex> guard(m_lock);
+    if (m_waves) m_waves->close();
+    m_waves = NXWaveform::create(path);
+    // Declare every output port, and the first node input holding each flop
+    for (const std::string & name : m_port_names) {
+        m_waves->add_signal("outputs", name, m_ports[name], false);
+    }
+    if (state) {
+        for (const std::string & name : m_input_names) {
+            m_waves->add_signal("state", name, { m_inputs[name].front() }, true);
+        }
+    }
+    // Write out the initial state
+    m_wave_keys = m_waves->get_state_keys();
+    m_wave_last = std::vector<bool>(m_wave_keys.size(), false);
+    NXWaveform::changes_t outputs(m_state.begin(), m_state.end());
+    NXWaveform::changes_t inputs;
+    sample_waves(inputs);
+    m_waves->begin(m_cycle, outputs, inputs);
+}
+
+void Nexus::close_waves (void)
+{
+    std::lock_guard<std::mutex> guard(m_lock);
+    if (m_waves) m_waves->close();
+    m_waves     = NULL;
+    m_wave_keys.clear();
+    m_wave_last.clear();
+}
+
+void Nexus::log_rate (std::chrono::steady_clock::time_point begin, uint32_t cycles)
+{
+    if (m_quiet || cycles == 0) return;
     std::chrono::steady_clock::time_point end = std::chrono::steady_clock::now();
     uint64_t delta_ns = std::chrono::duration_cast<std::chrono::nanoseconds>(end - begin).count();
     uint64_t rate     = delta_ns / ((uint64_t)cycles);
@@ -122,13 +380,17 @@ void Nexus::run (uint32_t cycles)
 
 void Nexus::dump_vcd (const std::string path)
 {
-    std::cout << "[Nexus] Writing VCD to " << path << std::endl;
+    std::lock_guard<std::mutex> guard(m_lock);
+    if (!m_quiet) std::cout << "[Nexus] Writing VCD to " << path << std::endl;
     vcd::VCDWriter writer(path);
-    // Register all outputs
+    // Register every output seen in the held history
     std::map<output_key_t, vcd::VarPtr> output_vars;
+    std::map<output_key_t, bool>        initial(m_history->get_base());
+    for (const NXHistory::entry_t & entry : m_history->get_entries()) {
+        for (const auto & change : entry.changes) initial.insert({ change.first, false });
+    }
     for (
-        typename summary_t::iterator it = m_output.back()->begin();
-        it != m_output.back()->end(); it++
+        typename summary_t::iterator it = initial.begin(); it != initial.end(); it++
     ) {
         output_key_t key = it->first;
         std::stringstream ss;
@@ -137,34 +399,233 @@ void Nexus::dump_vcd (const std::string path)
         output_vars[key] = writer.register_var(
             "dut", ss.str().c_str(), vcd::VariableType::reg, 1
         );
+        // Set an initial value
+        writer.change(output_vars[key], 0, it->second ? "1" : "0");
     }
-    // Set an initial value for all signals
-    for (
-        std::map<output_key_t, vcd::VarPtr>::iterator it = output_vars.begin();
-        it != output_vars.end(); it++
-    ) writer.change((vcd::VarPtr)it->second, 0, "0");
-    // Run through every timestamp
+    // Run through every held cycle, writing only the values that changed
     int step = 1;
-    while (m_output.size()) {
-        summary_t * summary = m_output.front();
-        for (
-            typename summary_t::iterator it = summary->begin();
-            it != summary->end(); it++
-        ) {
-            output_key_t key   = it->first;
-            bool         state = it->second;
-            writer.change(output_vars[key], step, state ? "1" : "0");
+    for (const NXHistory::entry_t & entry : m_history->get_entries()) {
+        for (const auto & change : entry.changes) {
+            writer.change(output_vars[change.first], step, change.second ? "1" : "0");
         }
         step += 1;
-        m_output.pop_front();
-        delete summary;
     }
+    m_history->drain();
 }
 
 Nexus::summary_t * Nexus::pop_output (void)
 {
-    assert(m_output.size() > 0);
-    summary_t * output = m_output.front();
-    m_output.pop_front();
-    return output;
+    std::lock_guard<std::mutex> guard(m_lock);
+    return m_history->pop();
+}
+
+void Nexus::add_output (std::string name, std::vector<output_key_t> bits)
+{
+    if (!m_ports.count(name)) m_port_names.push_back(name);
+    m_ports[name] = bits;
+}
+
+std::vector<Nexus::output_key_t> Nexus::get_output_keys (std::vector<std::string> names)
+{
+    std::vector<output_key_t> keys;
+    for (const std::string & name : names) {
+        if (!m_ports.count(name)) {
+            throw std::invalid_argument("Unknown output port '" + name + "'");
+        }
+        keys.insert(keys.end(), m_ports[name].begin(), m_ports[name].end());
+    }
+    return keys;
+}
+
+void Nexus::add_input (std::string name, input_key_t key)
+{
+    if (!m_inputs.count(name)) m_input_names.push_back(name);
+    m_inputs[name].push_back(key);
+}
+
+std::vector<Nexus::input_key_t> Nexus::get_input_keys (std::vector<std::string> names)
+{
+    std::vector<input_key_t> keys;
+    for (const std::string & name : names) {
+        if (!m_inputs.count(name)) {
+            throw std::invalid_argument("Unknown state '" + name + "'");
+        }
+        keys.insert(keys.end(), m_inputs[name].begin(), m_inputs[name].end());
+    }
+    return keys;
+}
+
+void Nexus::save_state (const std::string path)
+{
+    std::lock_guard<std::mutex> guard(m_lock);
+    std::ofstream os(path, std::ios::binary | std::ios::trunc);
+    if (!os.is_open()) throw std::runtime_error("Failed to open checkpoint " + path);
+    std::shared_ptr<NXNode> origin = m_mesh->get_node(0, 0);
+    // Header
+    checkpoint_header_t header;
+    std::memcpy(header.magic, CHECKPOINT_MAGIC, sizeof(header.magic));
+    header.version      = CHECKPOINT_VERSION;
+    header.rows         = m_rows;
+    header.columns      = m_columns;
+    header.node_inputs  = origin->get_input_count();
+    header.node_outputs = origin->get_output_count();
+    header.reserved     = 0;
+    header.cycle        = m_cycle;
+    os.write((const char *)&header, sizeof(header));
+    // Every node and its inbound pipes, then the egress
+    for (uint32_t row = 0; row < m_rows; row++) {
+        for (uint32_t column = 0; column < m_columns; column++) {
+            m_mesh->get_node(row, column)->save(os);
+        }
+    }
+    m_egress->save(os);
+    // Output state
+    std::vector<output_key_t> keys;
+    std::vector<uint64_t>     values((m_state.size() + 63) / 64, 0);
+    for (summary_t::iterator it = m_state.begin(); it != m_state.end(); it++) {
+        if (it->second) values[keys.size() / 64] |= (1ULL << (keys.size() % 64));
+        keys.push_back(it->first);
+    }
+    write_keys(os, keys);
+    os.write((const char *)values.data(), values.size() * sizeof(uint64_t));
+    // Named output ports and state
+    uint64_t count = m_port_names.size();
+    os.write((const char *)&count, sizeof(count));
+    for (const std::string & name : m_port_names) {
+        write_string(os, name);
+        write_keys(os, m_ports[name]);
+    }
+    count = m_input_names.size();
+    os.write((const char *)&count, sizeof(count));
+    for (const std::string & name : m_input_names) {
+        write_string(os, name);
+        write_keys(os, m_inputs[name]);
+    }
+    if (!os.good()) throw std::runtime_error("Failed to write checkpoint " + path);
+}
+
+void Nexus::load_state (const std::string path)
+{
+    std::lock_guard<std::mutex> guard(m_lock);
+    std::ifstream is(path, std::ios::binary);
+    if (!is.is_open()) throw std::runtime_error("Failed to open checkpoint " + path);
+    std::shared_ptr<NXNode> origin = m_mesh->get_node(0, 0);
+    // Check the header matches this instance
+    checkpoint_header_t header;
+    is.read((char *)&header, sizeof(header));
+    if (!is.good() || std::memcmp(header.magic, CHECKPOINT_MAGIC, sizeof(header.magic)) != 0) {
+        throw std::invalid_argument(path + " is not a checkpoint");
+    }
+    if (header.version != CHECKPOINT_VERSION) {
+        throw std::invalid_argument(
+            path + " has unsupported checkpoint version " + std::to_string(header.version)
+        );
+    }
+    if (
+        (header.rows         != m_rows                    ) ||
+        (header.columns      != m_columns                 ) ||
+        (header.node_inputs  != origin->get_input_count() ) ||
+        (header.node_outputs != origin->get_output_count())
+    ) {
+        std::stringstream ss;
+        ss << "Checkpoint " << path << " is for a " << header.rows << "x"
+           << header.columns << " mesh with " << header.node_inputs
+           << " inputs and " << header.node_outputs << " outputs per node";
+        throw std::invalid_argument(ss.str());
+    }
+    // Read every node and the egress into a scratch mesh, and everything else
+    // into temporaries, so that a truncated checkpoint leaves this instance
+    // untouched
+    NXMesh scratch(m_rows, m_columns, header.node_inputs, header.node_outputs);
+    NXMessagePipe egress;
+    for (uint32_t row = 0; row < m_rows && is.good(); row++) {
+        for (uint32_t column = 0; column < m_columns && is.good(); column++) {
+            scratch.get_node(row, column)->load(is);
+        }
+    }
+    egress.load(is);
+    // Output state
+    std::vector<output_key_t> keys = read_keys(is);
+    std::vector<uint64_t>     values((keys.size() + 63) / 64, 0);
+    is.read((char *)values.data(), values.size() * sizeof(uint64_t));
+    summary_t state;
+    for (uint64_t idx = 0; idx < keys.size(); idx++) {
+        state[keys[idx]] = ((values[idx / 64] >> (idx % 64)) & 1) != 0;
+    }
+    // Named output ports and state
+    uint64_t count = 0;
+    std::vector<std::string>                         port_names, input_names;
+    std::map<std::string, std::vector<output_key_t>> ports;
+    std::map<std::string, std::vector<input_key_t>>  inputs;
+    is.read((char *)&count, sizeof(count));
+    for (uint64_t idx = 0; idx < count && is.good(); idx++) {
+        std::string name = read_string(is);
+        port_names.push_back(name);
+        ports[name] = read_keys(is);
+    }
+    is.read((char *)&count, sizeof(count));
+    for (uint64_t idx = 0; idx < count && is.good(); idx++) {
+        std::string name = read_string(is);
+        input_names.push_back(name);
+        inputs[name] = read_keys(is);
+    }
+    if (!is.good()) throw std::runtime_error("Truncated checkpoint " + path);
+    // Apply the checkpoint, transferring the scratch nodes across as an image
+    std::stringstream image;
+    for (uint32_t row = 0; row < m_rows; row++) {
+        for (uint32_t column = 0; column < m_columns; column++) {
+            scratch.get_node(row, column)->save(image);
+        }
+    }
+    egress.save(image);
+    for (uint32_t row = 0; row < m_rows; row++) {
+        for (uint32_t column = 0; column < m_columns; column++) {
+            m_mesh->get_node(row, column)->load(image);
+        }
+    }
+    m_egress->load(image);
+    m_mesh->wake_all();
+    m_state       = state;
+    m_port_names  = port_names;
+    m_ports       = ports;
+    m_input_names = input_names;
+    m_inputs      = inputs;
+    // Resume from the checkpointed cycle
+    m_cycle = header.cycle;
+    m_history->reset(m_state);
+    clear_counters();
+}
+
+Nexus::counters_t Nexus::get_counters (bool reset /* = false */)
+{
+    std::lock_guard<std::mutex> guard(m_lock);
+    counters_t counters;
+    counters.start     = m_settle_start;
+    counters.settle    = m_settle;
+    counters.histogram = m_settle_histogram;
+    for (uint32_t row = 0; row < m_rows; row++) {
+        for (uint32_t column = 0; column < m_columns; column++) {
+            counters.nodes.push_back(m_mesh->get_node(row, column)->get_counters());
+        }
+    }
+    if (reset) clear_counters();
+    return counters;
+}
+
+void Nexus::reset_counters (void)
+{
+    std::lock_guard<std::mutex> guard(m_lock);
+    clear_counters();
+}
+
+void Nexus::clear_counters (void)
+{
+    for (uint32_t row = 0; row < m_rows; row++) {
+        for (uint32_t column = 0; column < m_columns; column++) {
+            m_mesh->get_node(row, column)->reset_counters();
+        }
+    }
+    m_settle_start = m_cycle;
+    m_settle.clear();
+    m_settle_histogram.clear();
 }
@@ -12,17 +12,23 @@
 // See the License for the specific language governing permissions and
 // limitations under the License.
 
+#include <chrono>
 #include <filesystem>
 #include <iostream>
-#include <list>
 #include <map>
 #include <memory>
+#include <mutex>
 #include <stdbool.h>
 #include <stdint.h>
+#include <string>
 #include <tuple>
+#include <utility>
+#include <vector>
 
+#include "nxhistory.hpp"
 #include "nxmesh.hpp"
 #include "nxmessagepipe.hpp"
+#include "nxwaveform.hpp"
 
 #ifndef __NEXUS_HPP__
 #define __NEXUS_HPP__
@@ -36,9 +42,27 @@ namespace NXModel {
         // Data Structures
         // =====================================================================
 
-        typedef std::tuple<uint32_t, uint32_t, uint32_t> output_key_t;
+        typedef NXHistory::output_key_t output_key_t;
 
-        typedef std::map<output_key_t, bool> summary_t;
+        typedef NXHistory::summary_t summary_t;
+
+        typedef NXHistory::changes_t changes_t;
+
+        typedef std::tuple<uint32_t, uint32_t, uint32_t> input_key_t;
+
+        typedef struct {
+            std::vector<input_key_t> targets; // Node input driven by each target
+            std::vector<uint32_t>    columns; // Stimulus column of each target
+            uint32_t                 width;   // Number of stimulus columns
+            const uint8_t          * values;  // Stimulus (cycles x width bytes)
+        } stimulus_t;
+
+        typedef struct {
+            uint64_t                         start;     // Cycle counting began
+            std::vector<uint32_t>            settle;    // Mesh steps of each cycle
+            std::vector<uint64_t>            histogram; // Cycles taking each step count
+            std::vector<NXNode::counters_t>  nodes;     // Counters in row-major order
+        } counters_t;
 
         // =====================================================================
         // Constructor
@@ -86,6 +110,33 @@ namespace NXModel {
          */
         std::shared_ptr<NXMessagePipe> get_egress (void) { return m_egress; }
 
+        /** Suppress console logging of run progress and achieved frequency
+         *
+         * @param quiet True to disable logging, False to enable it
+         */
+        void set_quiet (bool quiet) { m_quiet = quiet; }
+
+        /** Return whether console logging is suppressed
+         *
+         * @return True if logging is disabled, False otherwise
+         */
+        bool get_quiet (void) { return m_quiet; }
+
+        /** Set the number of threads used to step the mesh. Results are the
+         *  same for any number of threads above one, and match stepping with
+         *  a single thread once each cycle has settled.
+         *
+         * @param threads number of threads (1 steps serially, 0 uses one per
+         *                hardware thread)
+         */
+        void set_threads (uint32_t threads);
+
+        /** Return the number of threads used to step the mesh
+         *
+         * @return integer count of threads
+         */
+        uint32_t get_threads (void) { return m_mesh->get_threads(); }
+
         /** Run for a specified number of cycles
          *
          * @param cycles number of cycles to run for
@@ -98,11 +149,24 @@ namespace NXModel {
          */
         void dump_vcd (const std::string path);
 
+        /** Start streaming a waveform, which is written as each cycle completes
+         *  using the names of the design's output ports and state. The format
+         *  is VCD when the path ends with '.vcd', otherwise the compact format.
+         *
+         * @param path  path to write the waveform to
+         * @param state whether to also trace the design's state
+         */
+        void open_waves (const std::string path, bool state = true);
+
+        /** Stop streaming the waveform and close the file
+         */
+        void close_waves (void);
+
         /** Check if there are any output vectors available
          *
          * @return True if output is available, False otherwise
          */
-        bool is_output_available (void) { return !m_output.empty(); }
+        bool is_output_available (void) { return !m_history->is_empty(); }
 
         /** Pop the next output vector from the store
          *
@@ -110,8 +174,187 @@ namespace NXModel {
          */
         summary_t * pop_output (void);
 
+        /** Bound the number of cycles of output history held in memory, once
+         *  full the oldest cycle is evicted (and optionally spilled to disk)
+         *
+         * @param max_cycles maximum number of cycles to hold (0 is unbounded)
+         * @param spill      optional path to append evicted cycles to
+         */
+        void set_history (uint32_t max_cycles, std::string spill = "")
+        {
+            std::lock_guard<std::mutex> guard(m_lock);
+            m_history->set_depth(max_cycles, spill);
+        }
+
+        /** Return a pointer to the output history
+         *
+         * @return pointer to instance of NXHistory
+         */
+        std::shared_ptr<NXHistory> get_history (void) { return m_history; }
+
+        /** Return the number of cycles run so far
+         *
+         * @return integer count of cycles
+         */
+        uint64_t get_cycle (void) { return m_cycle; }
+
+        /** Return the performance counters of every node, along with the
+         *  number of mesh steps taken to settle each cycle and a histogram of
+         *  the same, accumulated since the counters were last reset (or a
+         *  checkpoint was loaded). The per-cycle steps grow with every cycle
+         *  run, so long runs should reset the counters as they are read.
+         *
+         * @param reset whether to reset the counters once read
+         * @return instance of counters_t
+         */
+        counters_t get_counters (bool reset = false);
+
+        /** Reset the performance counters
+         */
+        void reset_counters (void);
+
+        /** Write a checkpoint of the full model state, which can be restored
+         *  into any instance with the same geometry
+         *
+         * @param path path to write the checkpoint to
+         */
+        void save_state (const std::string path);
+
+        /** Restore the full model state from a checkpoint, discarding any
+         *  held output history
+         *
+         * @param path path to read the checkpoint from
+         */
+        void load_state (const std::string path);
+
+        /** Register a named output port of the design
+         *
+         * @param name name of the port
+         * @param bits egress key of each bit of the port (LSB first)
+         */
+        void add_output (std::string name, std::vector<output_key_t> bits);
+
+        /** Return the names of all registered output ports
+         *
+         * @return names of the ports in the order they were registered
+         */
+        std::vector<std::string> get_output_names (void) { return m_port_names; }
+
+        /** Resolve named output ports into a flat list of egress keys
+         *
+         * @param names names of the ports to resolve
+         * @return egress key of every bit of every port, in order
+         */
+        std::vector<output_key_t> get_output_keys (std::vector<std::string> names);
+
+        /** Run for a specified number of cycles, capturing the state of the
+         *  selected outputs into a flat buffer
+         *
+         * @param cycles number of cycles to run for
+         * @param keys   egress keys of the outputs to capture (one per column)
+         * @param buffer buffer to fill, which must hold cycles x columns bytes
+         *               or cycles x ceil(columns / 8) bytes when packed
+         * @param packed pack eight columns per byte (LSB first) when true
+         */
+        void run_capture (
+            uint32_t                  cycles,
+            std::vector<output_key_t> keys,
+            uint8_t                 * buffer,
+            bool                      packed = false
+        );
+
+        /** Register a named piece of state held by the design
+         *
+         * @param name name of the flop
+         * @param key  node input (row, column, index) holding the flop
+         */
+        void add_input (std::string name, input_key_t key);
+
+        /** Return the names of all registered pieces of state
+         *
+         * @return names of the flops in the order they were registered
+         */
+        std::vector<std::string> get_input_names (void) { return m_input_names; }
+
+        /** Resolve named pieces of state into the node inputs that hold them
+         *
+         * @param names names of the flops to resolve
+         * @return every node input holding any of the flops, in order
+         */
+        std::vector<input_key_t> get_input_keys (std::vector<std::string> names);
+
+        /** Run for a specified number of cycles, driving node inputs from a
+         *  stimulus at the start of every cycle and capturing the state of the
+         *  selected outputs into a flat buffer
+         *
+         * @param cycles    number of cycles to run for
+         * @param stimulus  the node inputs to drive and their values
+         * @param keys      egress keys of the outputs to capture
+         * @param buffer    buffer to fill (see run_capture)
+         * @param packed    pack eight columns per byte (LSB first) when true
+         */
+        void run_stimulus (
+            uint32_t                  cycles,
+            const stimulus_t        & stimulus,
+            std::vector<output_key_t> keys,
+            uint8_t                 * buffer,
+            bool                      packed = false
+        );
+
     private:
 
+        // =====================================================================
+        // Private Methods
+        // =====================================================================
+
+        /** Step the mesh until it settles and digest the egress messages,
+         *  updating the output state and the bits that changed
+         *
+         * @param record whether to record the bits that changed into the history
+         */
+        void step_cycle (bool record = true);
+
+        /** Clear the performance counters (the caller must hold m_lock)
+         */
+        void clear_counters (void);
+
+        /** Run for a number of cycles, optionally driving a stimulus and
+         *  capturing outputs into a flat buffer
+         *
+         * @param cycles   number of cycles to run for
+         * @param stimulus pointer to the stimulus, or NULL to drive nothing
+         * @param keys     egress keys of the outputs to capture
+         * @param buffer   buffer to fill (see run_capture)
+         * @param packed   pack eight columns per byte (LSB first) when true
+         */
+        void run_buffered (
+            uint32_t                  cycles,
+            const stimulus_t        * stimulus,
+            std::vector<output_key_t> keys,
+            uint8_t                 * buffer,
+            bool                      packed
+        );
+
+        /** Inject one cycle of stimulus into the mesh
+         *
+         * @param stimulus the node inputs to drive and their values
+         * @param cycle    the row of the stimulus to inject
+         */
+        void inject (const stimulus_t & stimulus, uint32_t cycle);
+
+        /** Sample the state traced by the waveform
+         *
+         * @param changes list to fill with the traced inputs that changed
+         */
+        void sample_waves (NXWaveform::changes_t & changes);
+
+        /** Log the simulated frequency achieved by a run
+         *
+         * @param begin  timestamp taken at the start of the run
+         * @param cycles number of cycles that were run
+         */
+        void log_rate (std::chrono::steady_clock::time_point begin, uint32_t cycles);
+
         // =====================================================================
         // Private Members
         // =====================================================================
@@ -122,6 +365,11 @@ namespace NXModel {
 
         // Verbosity
         bool m_verbose;
+        bool m_quiet;
+
+        // Serialises calls that advance or consume the model, so that an
+        // instance shared between threads is never stepped concurrently
+        std::mutex m_lock;
 
         // Mesh
         std::shared_ptr<NXMesh> m_mesh;
@@ -131,7 +379,29 @@ namespace NXModel {
         std::shared_ptr<NXMessagePipe> m_egress;
 
         // Track output state
-        std::list<summary_t *> m_output;
+        uint64_t                   m_cycle;
+        summary_t                  m_state;
+        changes_t                  m_changes;
+        std::shared_ptr<NXHistory> m_history;
+
+        // Mesh steps taken to settle each cycle since m_settle_start, and the
+        // number of cycles that took each count of steps (indexed by the count)
+        uint64_t              m_settle_start;
+        std::vector<uint32_t> m_settle;
+        std::vector<uint64_t> m_settle_histogram;
+
+        // Streaming waveform and the last value of each traced input
+        std::shared_ptr<NXWaveform> m_waves;
+        std::vector<input_key_t>    m_wave_keys;
+        std::vector<bool>           m_wave_last;
+
+        // Named output ports of the design
+        std::vector<std::string>                         m_port_names;
+        std::map<std::string, std::vector<output_key_t>> m_ports;
+
+        // Named state of the design
+        std::vector<std::string>                        m_input_names;
+        std::map<std::string, std::vector<input_key_t>> m_inputs;
 
     };
 
@@ -0,0 +1,138 @@
+// Copyright 2021, Peter Birch, mailto:peter@lightlogic.co.uk
+//
+// Licensed under the Apache License, Version 2.0 (the "License");
+// you may not use this file except in compliance with the License.
+// You may obtain a copy of the License at
+//
+// http://www.apache.org/licenses/LICENSE-2.0
+//
+// Unless required by applicable law or agreed to in writing, software
+// distributed under the License is distributed on an "AS IS" BASIS,
+// WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+// See the License for the specific language governing permissions and
+// limitations under the License.
+
+#include <algorithm>
+#include <assert.h>
+#include <stdexcept>
+
+#include "nxhistory.hpp"
+
+using namespace NXModel;
+
+// Spilled cycles are written as a 64-bit cycle number and a 32-bit count of
+// changes, followed by each change as 16-bit row, column, index, and state
+// fields (all little-endian)
+
+void NXHistory::set_depth (uint32_t max_cycles, std::string spill /* = "" */)
+{
+    m_depth = max_cycles;
+    // Open a new spill file if the path has changed
+    if (spill != m_spill_path) {
+        if (m_spill.is_open()) m_spill.close();
+        m_spill_path = spill;
+        if (!m_spill_path.empty()) {
+            m_spill.open(m_spill_path, std::ios::binary | std::ios::trunc);
+            if (!m_spill.is_open()) {
+                throw std::runtime_error("Failed to open spill file " + m_spill_path);
+            }
+        }
+    }
+    // Trim down to the new depth
+    while (m_depth > 0 && m_entries.size() > m_depth) evict();
+}
+
+void NXHistory::record (uint64_t cycle, const changes_t & changes)
+{
+    m_entries.push_back({ cycle, changes });
+    if (m_depth > 0 && m_entries.size() > m_depth) evict();
+}
+
+void NXHistory::skip (uint64_t cycle, const changes_t & changes)
+{
+    if      (m_entries.empty()) apply(changes);
+    else if (!changes.empty() ) record(cycle, changes);
+}
+
+NXHistory::summary_t * NXHistory::pop (void)
+{
+    assert(!m_entries.empty());
+    apply(m_entries.front().changes);
+    m_entries.pop_front();
+    return new summary_t(m_base);
+}
+
+void NXHistory::drain (void)
+{
+    for (const entry_t & entry : m_entries) apply(entry.changes);
+    m_entries.clear();
+}
+
+void NXHistory::evict (void)
+{
+    const entry_t & entry = m_entries.front();
+    if (m_spill.is_open() && !entry.changes.empty()) {
+        uint32_t count = entry.changes.size();
+        m_spill.write((const char *)&entry.cycle, sizeof(entry.cycle));
+        m_spill.write((const char *)&count, sizeof(count));
+        for (const auto & change : entry.changes) {
+            uint16_t fields[4] = {
+                (uint16_t)std::get<0>(change.first),
+                (uint16_t)std::get<1>(change.first),
+                (uint16_t)std::get<2>(change.first),
+                (uint16_t)(change.second ? 1 : 0)
+            };
+            m_spill.write((const char *)fields, sizeof(fields));
+        }
+    }
+    apply(entry.changes);
+    m_entries.pop_front();
+}
+
+void NXHistory::apply (const changes_t & changes)
+{
+    for (const auto & change : changes) m_base[change.first] = change.second;
+}
+
+NXHistoryIterator::NXHistoryIterator (std::shared_ptr<NXHistory> history)
+    : m_history    ( history )
+    , m_next_cycle ( 0       )
+{
+    m_history->flush();
+    if (!m_history->get_spill_path().empty()) {
+        m_spill.open(m_history->get_spill_path(), std::ios::binary);
+    }
+}
+
+bool NXHistoryIterator::next (NXHistory::entry_t & entry)
+{
+    // Read from the spill file until it is exhausted
+    if (m_spill.is_open()) {
+        uint32_t count;
+        if (
+            m_spill.read((char *)&entry.cycle, sizeof(entry.cycle)) &&
+            m_spill.read((char *)&count, sizeof(count))
+        ) {
+            entry.changes.clear();
+            for (uint32_t idx = 0; idx < count; idx++) {
+                uint16_t fields[4];
+                m_spill.read((char *)fields, sizeof(fields));
+                entry.changes.push_back({ { fields[0], fields[1], fields[2] }, fields[3] != 0 });
+            }
+            m_next_cycle = entry.cycle + 1;
+            return true;
+        }
+        m_spill.close();
+    }
+    // Then move on to the cycles held in memory, skipping those without changes
+    const std::deque<NXHistory::entry_t> & entries = m_history->get_entries();
+    auto it = std::lower_bound(
+        entries.begin(), entries.end(), m_next_cycle,
+        [](const NXHistory::entry_t & item, uint64_t cycle) { return item.cycle < cycle; }
+    );
+    while (it != entries.end() && it->changes.empty()) it++;
+    if (it == entries.end()) return false;
+    entry        = *it;
+    m_next_cycle = entry.cycle + 1;
+    return true;
+}
@@ -0,0 +1,205 @@
+// Copyright 2021, Peter Birch, mailto:peter@lightlogic.co.uk
+//
+// Licensed under the Apache License, Version 2.0 (the "License");
+// you may not use this file except in compliance with the License.
+// You may obtain a copy of the License at
+//
+// http://www.apache.org/licenses/LICENSE-2.0
+//
+// Unless required by applicable law or agreed to in writing, software
+// distributed under the License is distributed on an "AS IS" BASIS,
+// WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+// See the License for the specific language governing permissions and
+// limitations under the License.
+
+#include <deque>
+#include <fstream>
+#include <map>
+#include <memory>
+#include <stdint.h>
+#include <string>
+#include <tuple>
+#include <utility>
+#include <vector>
+
+#ifndef __NXHISTORY_HPP__
+#define __NXHISTORY_HPP__
+
+namespace NXModel {
+
+    class NXHistory {
+    public:
+
+        // =====================================================================
+        // Data Structures
+        // =====================================================================
+
+        typedef std::tuple<uint32_t, uint32_t, uint32_t> output_key_t;
+
+        typedef std::map<output_key_t, bool> summary_t;
+
+        typedef std::vector<std::pair<output_key_t, bool>> changes_t;
+
+        typedef struct {
+            uint64_t  cycle;
+            changes_t changes;
+        } entry_t;
+
+        // =====================================================================
+        // Constructor
+        // =====================================================================
+
+        NXHistory (void) : m_depth ( 0 ) { }
+
+        // =====================================================================
+        // Public Methods
+        // =====================================================================
+
+        /** Bound the number of cycles held in memory
+         *
+         * @param max_cycles maximum number of cycles to hold (0 is unbounded)
+         * @param spill      optional path to append cycles evicted from memory
+         */
+        void set_depth (uint32_t max_cycles, std::string spill = "");
+
+        /** Return the maximum number of cycles held in memory
+         *
+         * @return integer number of cycles, zero if unbounded
+         */
+        uint32_t get_depth (void) { return m_depth; }
+
+        /** Return the path that evicted cycles are spilled to
+         *
+         * @return path to the spill file, empty if spilling is disabled
+         */
+        std::string get_spill_path (void) { return m_spill_path; }
+
+        /** Record the output bits that changed in a cycle
+         *
+         * @param cycle   the cycle number
+         * @param changes the bits that changed and their new values
+         */
+        void record (uint64_t cycle, const changes_t & changes);
+
+        /** Account for a run of cycles that were not recorded, folding their
+         *  net changes straight into the base state when no cycles are held
+         *  or otherwise holding them as a single entry
+         *
+         * @param cycle   the last cycle of the run
+         * @param changes the net bits that changed across the run
+         */
+        void skip (uint64_t cycle, const changes_t & changes);
+
+        /** Check if there are any cycles held in memory
+         *
+         * @return True if no cycles are held, False otherwise
+         */
+        bool is_empty (void) { return m_entries.empty(); }
+
+        /** Return the number of cycles held in memory
+         *
+         * @return integer count of cycles
+         */
+        uint64_t get_size (void) { return m_entries.size(); }
+
+        /** Remove the oldest cycle held in memory
+         *
+         * @return pointer to the full output state at the end of that cycle
+         */
+        summary_t * pop (void);
+
+        /** Remove every cycle held in memory, folding them into the base state
+         */
+        void drain (void);
+
+        /** Discard every cycle held in memory and restart from a given state
+         *
+         * @param base the output state to restart from
+         */
+        void reset (const summary_t & base) { m_entries.clear(); m_base = base; }
+
+        /** Return the output state before the oldest cycle held in memory
+         *
+         * @return reference to the base state
+         */
+        const summary_t & get_base (void) { return m_base; }
+
+        /** Return the cycles held in memory (oldest first)
+         *
+         * @return reference to the held entries
+         */
+        const std::deque<entry_t> & get_entries (void) { return m_entries; }
+
+        /** Flush any buffered writes to the spill file
+         */
+        void flush (void) { if (m_spill.is_open()) m_spill.flush(); }
+
+    private:
+
+        // =====================================================================
+        // Private Methods
+        // =====================================================================
+
+        /** Evict the oldest cycle, spilling it to disk if enabled
+         */
+        void evict (void);
+
+        /** Apply a set of changes to the base state
+         *
+         * @param changes the changes to apply
+         */
+        void apply (const changes_t & changes);
+
+        // =====================================================================
+        // Private Members
+        // =====================================================================
+
+        // Maximum number of cycles to hold
+        uint32_t m_depth;
+
+        // Cycles held in memory and the state before the oldest of them
+        std::deque<entry_t> m_entries;
+        summary_t           m_base;
+
+        // Spill file for evicted cycles
+        std::string   m_spill_path;
+        std::ofstream m_spill;
+
+    };
+
+    class NXHistoryIterator {
+    public:
+
+        // =====================================================================
+        // Constructor
+        // =====================================================================
+
+        NXHistoryIterator (std::shared_ptr<NXHistory> history);
+
+        // =====================================================================
+        // Public Methods
+        // =====================================================================
+
+        /** Fetch the next cycle in which outputs changed, reading any spilled
+         *  cycles before those held in memory
+         *
+         * @param entry reference to fill with the cycle and its changes
+         * @return True if an entry was returned, False once exhausted
+         */
+        bool next (NXHistory::entry_t & entry);
+
+    private:
+
+        // =====================================================================
+        // Private Members
+        // =====================================================================
+
+        std::shared_ptr<NXHistory> m_history;
+        std::ifstream              m_spill;
+        uint64_t                   m_next_cycle;
+
+    };
+
+}
+
+#endif // __NXHISTORY_HPP__
@@ -12,7 +12,16 @@
 // See the License for the specific language governing permissions and
 // limitations under the License.
 
+#include <algorithm>
+#include <cstdio>
+#include <cstring>
 #include <iomanip>
+#include <stdexcept>
+
+#include <fcntl.h>
+#include <sys/mman.h>
+#include <sys/stat.h>
+#include <unistd.h>
 
 #include "json.hpp"
 
@@ -21,6 +30,74 @@
 
 using namespace NXModel;
 
+// =============================================================================
+// Binary Container Layout
+// =============================================================================
+
+// NOTE: These layouts must match those defined in common/python/nxbinary.py
+
+static const char     NXB_MAGIC[4] = { 'N', 'X', 'B', '\0' };
+static const uint16_t NXB_VERSION  = 1;
+
+enum {
+    NXB_SECT_NODES    = 0,
+    NXB_SECT_INSTRS   = 1,
+    NXB_SECT_LOOPBACK = 2,
+    NXB_SECT_OUTPUTS  = 3,
+    NXB_SECT_MAPPINGS = 4,
+    NXB_SECT_METADATA = 5,
+    NXB_NUM_SECTIONS  = 6
+};
+
+typedef struct {
+    char     magic[4];
+    uint16_t version;
+    uint16_t sections;
+    uint32_t rows;
+    uint32_t columns;
+    uint32_t inputs;
+    uint32_t outputs;
+    uint32_t registers;
+    uint32_t slots;
+} nxb_header_t;
+
+typedef struct {
+    uint32_t id;
+    uint32_t item_size;
+    uint64_t offset;
+    uint64_t size;
+} nxb_section_t;
+
+typedef struct {
+    uint16_t row;
+    uint16_t column;
+    uint32_t instr_start;
+    uint32_t instr_count;
+} nxb_node_t;
+
+typedef struct {
+    uint32_t start;
+    uint32_t count;
+} nxb_output_t;
+
+typedef struct {
+    uint16_t row;
+    uint16_t column;
+    uint16_t index;
+    uint8_t  is_seq;
+    uint8_t  pad;
+} nxb_mapping_t;
+
+static_assert(sizeof(nxb_header_t ) == 32, "Unexpected binary header size");
+static_assert(sizeof(nxb_section_t) == 24, "Unexpected binary section size");
+static_assert(sizeof(nxb_node_t   ) == 12, "Unexpected binary node size");
+static_assert(sizeof(nxb_output_t ) ==  8, "Unexpected binary output size");
+static_assert(sizeof(nxb_mapping_t) ==  8, "Unexpected binary mapping size");
+
+// =============================================================================
+// NXLoader
+// =============================================================================
+
 NXLoader::NXLoader(Nexus * model, std::filesystem::path path, bool verbose)
 {
     load(model, path, verbose);
@@ -32,9 +109,32 @@ NXLoader::NXLoader(Nexus * model, std::string path, bool verbose)
 }
 
 void NXLoader::load(Nexus * model, std::filesystem::path path, bool verbose)
+{
+    // Binary designs are identified by their magic, anything else is JSON
+    char magic[sizeof(NXB_MAGIC)] = { 0 };
+    std::ifstream fh(path, std::ios::binary);
+    fh.read(magic, sizeof(magic));
+    fh.close();
+    if (memcmp(magic, NXB_MAGIC, sizeof(NXB_MAGIC)) == 0) {
+        load_binary(model, path, verbose);
+    } else {
+        load_json(model, path, verbose);
+    }
+    // Run the mesh until it sinks all of the queued messages
+    uint32_t steps = 0;
+    while (!model->get_mesh()->is_idle()) {
+        model->get_mesh()->step(false);
+        steps++;
+    }
+    if (verbose) {
+        std::cout << "[NXLoader] Ran mesh for " << steps << " steps" << std::endl;
+    }
+}
+
+void NXLoader::load_json(Nexus * model, std::filesystem::path path, bool verbose)
 {
     std::ifstream fh(path);
-    nlohmann::json data;
+    nlohmann::ordered_json data;
     fh >> data;
     // Sanity check the design against the model
     uint32_t design_rows = data["configuration"]["rows"];
@@ -51,76 +151,263 @@ void NXLoader::load(Nexus * model, std::filesystem::path path, bool verbose)
     );
     // Load up all of the instructions and output mappings
     for (const auto & node : data["nodes"]) {
-        uint32_t row    = node["row"];
-        uint32_t column = node["column"];
-        // Configure loopback lines
-        uint32_t loopback = node["loopback"];
+        std::vector<uint32_t> instrs;
+        for (const auto & json_instr : node["instructions"]) instrs.push_back(json_instr);
+        mappings_t outputs;
+        for (const auto & json_outputs : node["outputs"]) {
+            outputs.emplace_back();
+            for (const auto & mapping : json_outputs) {
+                output_mapping_t entry;
+                entry.row    = mapping["row"];
+                entry.column = mapping["column"];
+                entry.index  = mapping["index"];
+                entry.is_seq = mapping["is_seq"];
+                outputs.back().push_back(entry);
+            }
+        }
+        load_node(
+            model, node["row"], node["column"], node["loopback"], instrs,
+            outputs, verbose
+        );
+    }
+    // Register the named output ports and flops
+    if (data.contains("reports")) load_reports(model, data["reports"]);
+    // Close the file
+    fh.close();
+}
+
+void NXLoader::load_binary(Nexus * model, std::filesystem::path path, bool verbose)
+{
+    // Map the whole file
+    int fd = open(path.c_str(), O_RDONLY);
+    if (fd < 0) throw std::runtime_error("Failed to open design " + path.string());
+    struct stat info;
+    if (fstat(fd, &info) != 0) {
+        close(fd);
+        throw std::runtime_error("Failed to stat design " + path.string());
+    }
+    uint64_t length = info.st_size;
+    if (length < sizeof(nxb_header_t)) {
+        close(fd);
+        throw std::runtime_error("Binary design " + path.string() + " is truncated");
+    }
+    const uint8_t * base = (const uint8_t *)mmap(
+        NULL, length, PROT_READ, MAP_SHARED, fd, 0
+    );
+    close(fd);
+    if (base == MAP_FAILED) throw std::runtime_error("Failed to map design " + path.string());
+    // Release the mapping before reporting a malformed design
+    auto fail = [&](const std::string & reason) {
+        munmap((void *)base, length);
+        throw std::runtime_error("Binary design " + path.string() + " " + reason);
+    };
+    // Check the header
+    const nxb_header_t * header = (const nxb_header_t *)base;
+    if (header->version != NXB_VERSION) {
+        fail("has unsupported version " + std::to_string(header->version));
+    }
+    if (verbose) {
+        std::cout << "[NXLoader] Mapped " << path << " - "
+                  << " rows: " << header->rows << ", "
+                  << " columns: " << header->columns
+                  << std::endl;
+    }
+    assert(
+        (header->rows    == model->get_rows()   ) &&
+        (header->columns == model->get_columns())
+    );
+    // Locate each section, checking that it lies within the file
+    uint64_t table = sizeof(nxb_header_t) + ((uint64_t)header->sections * sizeof(nxb_section_t));
+    if (table > length) fail("is truncated within its section table");
+    const nxb_section_t * sections[NXB_NUM_SECTIONS] = { NULL };
+    for (uint32_t idx = 0; idx < header->sections; idx++) {
+        const nxb_section_t * section = (const nxb_section_t *)(
+            base + sizeof(nxb_header_t) + (idx * sizeof(nxb_section_t))
+        );
+        if (section->offset > length || section->size > (length - section->offset)) {
+            fail("is truncated within section " + std::to_string(section->id));
+        }
+        if (section->id < NXB_NUM_SECTIONS) sections[section->id] = section;
+    }
+    for (uint32_t idx = 0; idx < NXB_NUM_SECTIONS; idx++) {
+        if (sections[idx] == NULL) fail("is missing section " + std::to_string(idx));
+    }
+    const nxb_node_t    * nodes    = (const nxb_node_t    *)(base + sections[NXB_SECT_NODES   ]->offset);
+    const uint32_t      * instrs   = (const uint32_t      *)(base + sections[NXB_SECT_INSTRS  ]->offset);
+    const uint32_t      * loopback = (const uint32_t      *)(base + sections[NXB_SECT_LOOPBACK]->offset);
+    const nxb_output_t  * outputs  = (const nxb_output_t  *)(base + sections[NXB_SECT_OUTPUTS ]->offset);
+    const nxb_mapping_t * mappings = (const nxb_mapping_t *)(base + sections[NXB_SECT_MAPPINGS]->offset);
+    uint64_t num_nodes  = sections[NXB_SECT_NODES   ]->size / sizeof(nxb_node_t);
+    uint64_t num_instrs = sections[NXB_SECT_INSTRS  ]->size / sizeof(uint32_t);
+    uint64_t num_maps   = sections[NXB_SECT_MAPPINGS]->size / sizeof(nxb_mapping_t);
+    uint32_t lb_words   = std::max(1U, (header->inputs + 31) / 32);
+    if (sections[NXB_SECT_OUTPUTS]->size < (num_nodes * header->outputs * sizeof(nxb_output_t))) {
+        fail("has too few output lookups for " + std::to_string(num_nodes) + " nodes");
+    }
+    if (sections[NXB_SECT_LOOPBACK]->size < (num_nodes * lb_words * sizeof(uint32_t))) {
+        fail("has too few loopback masks for " + std::to_string(num_nodes) + " nodes");
+    }
+    // Check every node's instructions and output mappings before loading any
+    for (uint64_t idx_node = 0; idx_node < num_nodes; idx_node++) {
+        const nxb_node_t & node = nodes[idx_node];
+        if (node.row >= header->rows || node.column >= header->columns) {
+            fail("places node " + std::to_string(idx_node) + " outside of the mesh");
+        }
+        if (((uint64_t)node.instr_start + node.instr_count) > num_instrs) {
+            fail("has instructions of node " + std::to_string(idx_node) + " out of range");
+        }
+        for (uint32_t idx_out = 0; idx_out < header->outputs; idx_out++) {
+            const nxb_output_t & output = outputs[(idx_node * header->outputs) + idx_out];
+            if (((uint64_t)output.start + output.count) > num_maps) {
+                fail("has mappings of node " + std::to_string(idx_node) + " out of range");
+            }
+        }
+    }
+    // Parse the metadata
+    const nxb_section_t * meta = sections[NXB_SECT_METADATA];
+    nlohmann::ordered_json metadata;
+    try {
+        metadata = nlohmann::ordered_json::parse(
+            base + meta->offset, base + meta->offset + meta->size
+        );
+    } catch (const nlohmann::json::parse_error &) {
+        fail("has malformed metadata");
+    }
+    // Load up all of the instructions and output mappings
+    for (uint64_t idx_node = 0; idx_node < num_nodes; idx_node++) {
+        const nxb_node_t & node = nodes[idx_node];
+        std::vector<uint32_t> node_instrs(
+            instrs + node.instr_start, instrs + node.instr_start + node.instr_count
+        );
+        // Nodes without any messages have no output lookups (as in JSON)
+        mappings_t node_outputs;
+        bool       has_msgs = false;
+        for (uint32_t idx_out = 0; idx_out < header->outputs; idx_out++) {
+            const nxb_output_t & output = outputs[(idx_node * header->outputs) + idx_out];
+            node_outputs.emplace_back();
+            for (uint32_t idx_map = 0; idx_map < output.count; idx_map++) {
+                const nxb_mapping_t & mapping = mappings[output.start + idx_map];
+                output_mapping_t entry;
+                entry.row    = mapping.row;
+                entry.column = mapping.column;
+                entry.index  = mapping.index;
+                entry.is_seq = mapping.is_seq;
+                node_outputs.back().push_back(entry);
+                has_msgs = true;
+            }
+        }
+        if (!has_msgs) node_outputs.clear();
+        load_node(
+            model, node.row, node.column, loopback[idx_node * lb_words],
+            node_instrs, node_outputs, verbose
+        );
+    }
+    // Register the named output ports and flops
+    if (metadata.contains("reports")) load_reports(model, metadata["reports"]);
+    // Release the mapping
+    munmap((void *)base, length);
+}
+
+void NXLoader::load_node(
+    Nexus                       * model,
+    uint32_t                      row,
+    uint32_t                      column,
+    uint32_t                      loopback,
+    const std::vector<uint32_t> & instrs,
+    const mappings_t            & outputs,
+    bool                          verbose
+) {
+    // Configure loopback lines
+    if (verbose) {
+        std::cout << "[NXLoader] Setting loopback row: " << row
+                  << ", column: " << column << ", loopback 0x"
+                  << std::hex << (int)loopback << std::dec << std::endl;
+    }
+    for (int idx = 1; idx >= 0; idx -= 1) {
+        node_control_t msg;
+        msg.header.row     = row;
+        msg.header.column  = column;
+        msg.header.command = NODE_COMMAND_CONTROL;
+        msg.param          = NODE_PARAMETER_LOOPBACK;
+        msg.value          = (loopback >> (16 * idx)) & 0xFFFF;
+        model->get_ingress()->enqueue(msg);
+    }
+    // Load instructions
+    for (uint32_t instr : instrs) {
         if (verbose) {
-            std::cout << "[NXLoader] Setting loopback row: " << row
-                      << ", column: " << column << ", loopback 0x"
-                      << std::hex << (int)loopback << std::dec << std::endl;
+            std::cout << "[NXLoader] Loading row: " << row
+                      << ", column: " << column << ", instruction: 0x"
+                      << std::hex << std::setw(8) << std::setfill('0') << instr
+                      << std::dec << std::endl;
         }
-        for (int idx = 1; idx >= 0; idx -= 1) {
-            node_control_t msg;
+        // Load over two 16-bit chunks
+        for (uint32_t idx = 0; idx < 2; idx++) {
+            node_load_t msg;
             msg.header.row     = row;
             msg.header.column  = column;
-            msg.header.command = NODE_COMMAND_CONTROL;
-            msg.param          = NODE_PARAMETER_LOOPBACK;
-            msg.value          = (loopback >> (16 * idx)) & 0xFFFF;
+            msg.header.command = NODE_COMMAND_LOAD;
+            msg.last           = (idx == 1);
+            msg.data           = (instr >> (16 * (1 - idx))) & 0xFFFF;
             model->get_ingress()->enqueue(msg);
         }
-        // Load instructions
-        for (const auto & json_instr : node["instructions"]) {
-            uint32_t instr = json_instr;
-            if (verbose) {
-                std::cout << "[NXLoader] Loading row: " << row
-                          << ", column: " << column << ", instruction: 0x"
-                          << std::hex << std::setw(8) << std::setfill('0') << instr
-                          << std::dec << std::endl;
-            }
-            // Load over two 16-bit chunks
-            for (uint32_t idx = 0; idx < 2; idx++) {
-                node_load_t msg;
-                msg.header.row     = row;
-                msg.header.column  = column;
-                msg.header.command = NODE_COMMAND_LOAD;
-                msg.last           = (idx == 1);
-                msg.data           = (instr >> (16 * (1 - idx))) & 0xFFFF;
-                model->get_ingress()->enqueue(msg);
-            }
-        }
-        // Set the number of instructions
-        node_control_t ctrl_instr;
-        ctrl_instr.header.row     = row;
-        ctrl_instr.header.column  = column;
-        ctrl_instr.header.command = NODE_COMMAND_CONTROL;
-        ctrl_instr.param          = NODE_PARAMETER_INSTRUCTIONS;
-        ctrl_instr.value          = node["instructions"].size();
-        model->get_ingress()->enqueue(ctrl_instr);
+    }
+    // Set the number of instructions
+    node_control_t ctrl_instr;
+    ctrl_instr.header.row     = row;
+    ctrl_instr.header.column  = column;
+    ctrl_instr.header.command = NODE_COMMAND_CONTROL;
+    ctrl_instr.param          = NODE_PARAMETER_INSTRUCTIONS;
+    ctrl_instr.value          = instrs.size();
+    model->get_ingress()->enqueue(ctrl_instr);
+    if (verbose) {
+        std::cout << "[NXLoader] Setting instruction count row: " << row
+                  << ", column: " << column << ", count "
+                  << instrs.size() << std::endl;
+    }
+    // Setup the output lookups
+    uint32_t next_address = instrs.size() + outputs.size();
+    for (const auto & mappings : outputs) {
+        // Generate the lookup
+        output_lookup_t lookup;
+        lookup.start  = next_address;
+        lookup.stop   = next_address + mappings.size() - 1;
+        lookup.active = (mappings.size() > 0);
+        uint32_t encoded = 0;
+        pack_output_lookup(lookup, (uint8_t *)&encoded);
         if (verbose) {
-            std::cout << "[NXLoader] Setting instruction count row: " << row
-                      << ", column: " << column << ", count "
-                      << node["instructions"].size() << std::endl;
+            std::cout << "[NXLoader] Loading lookup - row: " << row
+                      << ", column: " << column << ", start: 0x"
+                      << std::hex << lookup.start << ", stop: 0x"
+                      << lookup.stop << std::dec << ", active: "
+                      << (lookup.active ? "YES" : "NO") << std::endl;
         }
-        // Setup the output lookups
-        uint32_t output_index = 0;
-        uint32_t next_address = node["instructions"].size() + node["outputs"].size();
-        for (const auto & outputs : node["outputs"]) {
-            // Generate the lookup
-            output_lookup_t lookup;
-            lookup.start  = next_address;
-            lookup.stop   = next_address + outputs.size() - 1;
-            lookup.active = (outputs.size() > 0);
+        // Load the lookup over two steps
+        for (uint32_t idx = 0; idx < 2; idx++) {
+            node_load_t msg;
+            msg.header.row     = row;
+            msg.header.column  = column;
+            msg.header.command = NODE_COMMAND_LOAD;
+            msg.last           = (idx == 1);
+            msg.data           = (encoded >> (16 * (1 - idx))) & 0xFFFF;
+            model->get_ingress()->enqueue(msg);
+        }
+        // Offset the address
+        next_address += mappings.size();
+    }
+    // Load the output mappings
+    for (const auto & mappings : outputs) {
+        for (const auto & entry : mappings) {
             uint32_t encoded = 0;
-            pack_output_lookup(lookup, (uint8_t *)&encoded);
+            pack_output_mapping(entry, (uint8_t *)&encoded);
             if (verbose) {
-                std::cout << "[NXLoader] Loading lookup - row: " << row
-                          << ", column: " << column << ", start: 0x"
-                          << std::hex << lookup.start << ", stop: 0x"
-                          << lookup.stop << std::dec << ", active: "
-                          << (lookup.active ? "YES" : "NO") << std::endl;
+                std::cout << "[NXLoader] Loading mapping - row: " << row
+                          << ", column: " << column
+                          << ", target row: " << (int)entry.row
+                          << ", target column: " << (int)entry.column
+                          << ", target index: " << (int)entry.index
+                          << ", target is seq: " << (int)entry.is_seq << std::endl;
             }
-            // Load the lookup over two steps
+            // Load the mapping over two steps
             for (uint32_t idx = 0; idx < 2; idx++) {
                 node_load_t msg;
                 msg.header.row     = row;
@@ -130,52 +417,28 @@ void NXLoader::load(Nexus * model, std::filesystem::path path, bool verbose)
                 msg.data           = (encoded >> (16 * (1 - idx))) & 0xFFFF;
                 model->get_ingress()->enqueue(msg);
             }
-            // Increment to the next output
-            output_index++;
-            // Offset the address
-            next_address += outputs.size();
         }
-        // Load the output mappings
-        for (const auto & outputs : node["outputs"]) {
-            for (const auto & mapping : outputs) {
-                // Generate the mapping
-                output_mapping_t entry;
-                entry.row    = mapping["row"];
-                entry.column = mapping["column"];
-                entry.index  = mapping["index"];
-                entry.is_seq = mapping["is_seq"];
-                uint32_t encoded = 0;
-                pack_output_mapping(entry, (uint8_t *)&encoded);
-                if (verbose) {
-                    std::cout << "[NXLoader] Loading mapping - row: " << row
-                              << ", column: " << column
-                              << ", target row: " << (int)entry.row
-                              << ", target column: " << (int)entry.column
-                              << ", target index: " << (int)entry.index
-                              << ", target is seq: " << (int)entry.is_seq << std::endl;
-                }
-                // Load the mapping over two steps
-                for (uint32_t idx = 0; idx < 2; idx++) {
-                    node_load_t msg;
-                    msg.header.row     = row;
-                    msg.header.column  = column;
-                    msg.header.command = NODE_COMMAND_LOAD;
-                    msg.last           = (idx == 1);
-                    msg.data           = (encoded >> (16 * (1 - idx))) & 0xFFFF;
-                    model->get_ingress()->enqueue(msg);
-                }
+    }
+}
+
+void NXLoader::load_reports(Nexus * model, const nlohmann::ordered_json & reports)
+{
+    // Register the named output ports (bits are identified by egress key)
+    if (reports.contains("outputs")) {
+        for (const auto & port : reports["outputs"].items()) {
+            std::vector<Nexus::output_key_t> bits;
+            for (const auto & bit : port.value()) {
+                bits.push_back({ bit[3], bit[4], bit[5] });
             }
+            model->add_output(port.key(), bits);
         }
     }
-    // Run the mesh until it sinks all of the queued messages
-    uint32_t steps = 0;
-    while (!model->get_mesh()->is_idle()) {
-        model->get_mesh()->step(false);
-        steps++;
-    }
-    if (verbose) {
-        std::cout << "[NXLoader] Ran mesh for " << steps << " steps" << std::endl;
+    // Register the node inputs holding each named flop
+    if (reports.contains("state")) {
+        for (const auto & entry : reports["state"].items()) {
+            uint32_t row, column, index;
+            if (sscanf(entry.key().c_str(), "R%uC%uI%u", &row, &column, &index) != 3) continue;
+            model->add_input(entry.value(), { row, column, index });
+        }
     }
-    // Close the file
-    fh.close();
 }
@@ -17,7 +17,9 @@
 #include <fstream>
 #include <iostream>
 #include <string>
+#include <vector>
 
+#include "json.hpp"
 #include "nexus.hpp"
 
 #ifndef __NXLOADER_HPP__
@@ -36,12 +38,64 @@ namespace NXModel {
 
     private:
 
+        // =====================================================================
+        // Data Structures
+        // =====================================================================
+
+        // Message mappings of every output of a node
+        typedef std::vector<std::vector<output_mapping_t>> mappings_t;
+
         // =====================================================================
         // Private Methods
         // =====================================================================
 
         void load(Nexus * model, std::filesystem::path path, bool verbose = false);
 
+        /** Load a design exported by nxcompile as JSON
+         *
+         * @param model   the model to load into
+         * @param path    path to the design
+         * @param verbose whether to log each message
+         */
+        void load_json(Nexus * model, std::filesystem::path path, bool verbose);
+
+        /** Load a design exported by nxcompile as a binary container, which is
+         *  memory mapped so that the same file can be shared between many
+         *  processes
+         *
+         * @param model   the model to load into
+         * @param path    path to the design
+         * @param verbose whether to log each message
+         */
+        void load_binary(Nexus * model, std::filesystem::path path, bool verbose);
+
+        /** Queue the messages that program a single node
+         *
+         * @param model    the model to load into
+         * @param row      row of the node
+         * @param column   column of the node
+         * @param loopback loopback mask of the node
+         * @param instrs   encoded instructions
+         * @param outputs  message mappings of each output
+         * @param verbose  whether to log each message
+         */
+        void load_node(
+            Nexus                       * model,
+            uint32_t                      row,
+            uint32_t                      column,
+            uint32_t                      loopback,
+            const std::vector<uint32_t> & instrs,
+            const mappings_t            & outputs,
+            bool                          verbose
+        );
+
+        /** Register the named output ports and flops of a design
+         *
+         * @param model   the model to load into
+         * @param reports the reports section of the design
+         */
+        void load_reports(Nexus * model, const nlohmann::ordered_json & reports);
+
     };
 
 }
@@ -12,6 +12,7 @@
 // See the License for the specific language governing permissions and
 // limitations under the License.
 
+#include <algorithm>
 #include <assert.h>
 
 #include "nxmesh.hpp"
@@ -24,9 +25,21 @@ NXMesh::NXMesh (
     uint32_t node_inputs,
     uint32_t node_outputs,
     bool     verbose /* = false */
-)   : m_rows    ( rows    )
-    , m_columns ( columns )
-    , m_verbose ( verbose )
+)   : m_rows         ( rows    )
+    , m_columns      ( columns )
+    , m_verbose      ( verbose )
+    , m_position     ( -1      )
+    , m_triggered    ( false   )
+    , m_queued       ( 0       )
+    , m_steps        ( 0       )
+    , m_node_steps   ( 0       )
+    , m_pooled       ( 0       )
+    , m_threads      ( 1       )
+    , m_diagonal     ( -1      )
+    , m_band_trigger ( false   )
+    , m_generation   ( 0       )
+    , m_pending      ( 0       )
+    , m_shutdown     ( false   )
 {
     // Create the nodes
     for (uint32_t row = 0; row < m_rows; row++) {
@@ -51,6 +64,21 @@ NXMesh::NXMesh (
                 node->attach(DIRECTION_EAST, (*m_nodes[row])[column+1]->get_pipe(DIRECTION_WEST));
         }
     }
+    // Monitor every inbound pipe so that nodes are woken by messages
+    m_flags.resize(m_rows * m_columns, 0);
+    m_histogram.resize((m_rows * m_columns) + 1, 0);
+    m_diagonals.resize(m_rows + m_columns - 1);
+    for (uint32_t row = 0; row < m_rows; row++) {
+        for (uint32_t column = 0; column < m_columns; column++) {
+            uint32_t index = (row * m_columns) + column;
+            for (int dirx = 0; dirx < 4; dirx++) {
+                std::shared_ptr<NXMessagePipe> pipe = get_node(row, column)->get_pipe(
+                    (direction_t)dirx
+                );
+                pipe->set_monitor([this, index] () { wake(index); }, &m_queued);
+            }
+        }
+    }
 }
 
 std::shared_ptr<NXNode> NXMesh::get_node (uint32_t row, uint32_t column)
@@ -61,20 +89,200 @@ std::shared_ptr<NXNode> NXMesh::get_node (uint32_t row, uint32_t column)
 
 bool NXMesh::is_idle (void)
 {
-    bool is_idle = true;
-    for (uint32_t row = 0; row < m_rows; row++) {
-        for (uint32_t column = 0; column < m_columns; column++) {
-            is_idle &= (*m_nodes[row])[column]->is_idle();
-            if (!is_idle) break;
+    return (m_queued == 0);
+}
+
+void NXMesh::step (bool trigger)
+{
+    // Promote nodes woken since the last step
+    for (uint32_t index : m_next) {
+        m_flags[index] = (m_flags[index] & ~SCHED_NEXT) | SCHED_NOW;
+        m_now.push(index);
+    }
+    m_next.clear();
+    // On a trigger, step every node that may have new input state (which on
+    // the first trigger is every node)
+    if (trigger) {
+        if (!m_triggered) {
+            m_touched.clear();
+            for (uint32_t index = 0; index < m_flags.size(); index++) {
+                m_touched.push_back(index);
+            }
+        }
+        for (uint32_t index : m_touched) {
+            m_flags[index] &= ~SCHED_TOUCHED;
+            if (m_flags[index] & SCHED_NOW) continue;
+            m_flags[index] |= SCHED_NOW;
+            m_now.push(index);
         }
-        if (!is_idle) break;
+        m_touched.clear();
+        m_triggered = true;
     }
-    return is_idle;
+    // Step nodes in row-major order
+    uint32_t active = 0;
+    if (m_threads > 1) active = step_parallel(trigger);
+    else while (!m_now.empty()) {
+        uint32_t index = m_now.top();
+        m_now.pop();
+        m_flags[index] &= ~SCHED_NOW;
+        m_position = index;
+        (*m_nodes[index / m_columns])[index % m_columns]->step(trigger);
+        if (!(m_flags[index] & SCHED_TOUCHED)) {
+            m_flags[index] |= SCHED_TOUCHED;
+            m_touched.push_back(index);
+        }
+        active++;
+    }
+    m_position = -1;
+    // Update statistics
+    m_steps      += 1;
+    m_node_steps += active;
+    m_histogram[active]++;
 }
 
-void NXMesh::step (bool trigger)
+void NXMesh::wake (uint32_t index)
+{
+    // During a parallel step, nodes on a later anti-diagonal are stepped
+    // within this step (which for a neighbour means exactly those that are
+    // after the current node in row-major order)
+    if (m_diagonal >= 0) {
+        std::lock_guard<std::mutex> lock(m_wake_lock);
+        uint32_t diagonal = (index / m_columns) + (index % m_columns);
+        if (((int64_t)diagonal) > m_diagonal) {
+            if (m_flags[index] & SCHED_NOW) return;
+            m_flags[index] |= SCHED_NOW;
+            m_diagonals[diagonal].push_back(index);
+        } else {
+            if (m_flags[index] & SCHED_NEXT) return;
+            m_flags[index] |= SCHED_NEXT;
+            m_next.push_back(index);
+        }
+        return;
+    }
+    // Nodes after the current position are stepped within this step, exactly
+    // as they would be when sweeping the mesh
+    if (m_position >= 0 && ((int64_t)index) > m_position) {
+        if (m_flags[index] & SCHED_NOW) return;
+        m_flags[index] |= SCHED_NOW;
+        m_now.push(index);
+    } else {
+        if (m_flags[index] & SCHED_NEXT) return;
+        m_flags[index] |= SCHED_NEXT;
+        m_next.push_back(index);
+    }
+}
+
+void NXMesh::wake_all (void)
+{
+    for (uint32_t index = 0; index < m_flags.size(); index++) {
+        if (!(m_flags[index] & SCHED_NEXT)) {
+            m_flags[index] |= SCHED_NEXT;
+            m_next.push_back(index);
+        }
+    }
+    m_triggered = false;
+}
+
+void NXMesh::set_threads (uint32_t threads)
+{
+    if (threads == 0) threads = std::max(1U, std::thread::hardware_concurrency());
+    // Stop any existing workers
+    if (!m_workers.empty()) {
+        {
+            std::lock_guard<std::mutex> lock(m_pool_lock);
+            m_shutdown = true;
+        }
+        m_pool_start.notify_all();
+        for (std::thread & worker : m_workers) worker.join();
+        m_workers.clear();
+        m_shutdown = false;
+    }
+    // The calling thread steps the first band, workers step the rest
+    m_threads = threads;
+    for (uint32_t band = 1; band < m_threads; band++) {
+        m_workers.emplace_back(&NXMesh::worker, this, band, m_generation);
+    }
+}
+
+uint32_t NXMesh::step_parallel (bool trigger)
+{
+    // Sort the active nodes onto their anti-diagonals
+    while (!m_now.empty()) {
+        uint32_t index = m_now.top();
+        m_now.pop();
+        m_diagonals[(index / m_columns) + (index % m_columns)].push_back(index);
+    }
+    // Step each anti-diagonal in turn, as nodes on the same anti-diagonal are
+    // never neighbours they can be stepped concurrently. Handing a few nodes
+    // to the workers costs more than stepping them directly, but the result is
+    // the same either way.
+    uint32_t stepped = 0;
+    m_band_trigger   = trigger;
+    for (uint32_t diagonal = 0; diagonal < m_diagonals.size(); diagonal++) {
+        if (m_diagonals[diagonal].empty()) continue;
+        m_active.swap(m_diagonals[diagonal]);
+        for (uint32_t index : m_active) m_flags[index] &= ~SCHED_NOW;
+        m_diagonal = diagonal;
+        if (m_active.size() < (m_threads * PARALLEL_MIN_NODES)) {
+            for (uint32_t band = 0; band < m_threads; band++) step_band(band);
+        } else {
+            {
+                std::lock_guard<std::mutex> lock(m_pool_lock);
+                m_pending = m_workers.size();
+                m_generation++;
+            }
+            m_pool_start.notify_all();
+            step_band(0);
+            std::unique_lock<std::mutex> lock(m_pool_lock);
+            m_pool_done.wait(lock, [this] { return m_pending == 0; });
+            m_pooled++;
+        }
+        m_diagonal = -1;
+        for (uint32_t index : m_active) {
+            if (!(m_flags[index] & SCHED_TOUCHED)) {
+                m_flags[index] |= SCHED_TOUCHED;
+                m_touched.push_back(index);
+            }
+        }
+        stepped += m_active.size();
+        m_active.clear();
+    }
+    return stepped;
+}
+
+void NXMesh::step_band (uint32_t band)
+{
+    uint32_t first = (m_active.size() * band      ) / m_threads;
+    uint32_t last  = (m_active.size() * (band + 1)) / m_threads;
+    for (uint32_t idx = first; idx < last; idx++) {
+        uint32_t index = m_active[idx];
+        (*m_nodes[index / m_columns])[index % m_columns]->step(m_band_trigger);
+    }
+}
+
+void NXMesh::worker (uint32_t band, uint64_t generation)
+{
+    while (true) {
+        {
+            std::unique_lock<std::mutex> lock(m_pool_lock);
+            m_pool_start.wait(lock, [this, generation] {
+                return m_shutdown || (m_generation != generation);
+            });
+            if (m_shutdown) return;
+            generation = m_generation;
+        }
+        step_band(band);
+        {
+            std::lock_guard<std::mutex> lock(m_pool_lock);
+            if (--m_pending == 0) m_pool_done.notify_one();
+        }
+    }
+}
+
+void NXMesh::reset_stats (void)
 {
-    for (uint32_t row = 0; row < m_rows; row++)
-        for (uint32_t column = 0; column < m_columns; column++)
-            (*m_nodes[row])[column]->step(trigger);
+    m_steps      = 0;
+    m_node_steps = 0;
+    m_pooled     = 0;
+    std::fill(m_histogram.begin(), m_histogram.end(), 0);
 }
@@ -14,7 +14,13 @@
 
 #include <stdint.h>
 
+#include <atomic>
+#include <condition_variable>
+#include <functional>
 #include <memory>
+#include <mutex>
+#include <queue>
+#include <thread>
 #include <vector>
 
 #include "nxnode.hpp"
@@ -45,7 +51,16 @@ namespace NXModel {
 
         ~NXMesh (void)
         {
-            for (uint32_t row = 0; row < m_rows; row++) delete m_nodes[row];
+            set_threads(1);
+            for (uint32_t row = 0; row < m_rows; row++) {
+                // Detach monitors as pipes may outlive the mesh
+                for (auto & node : *m_nodes[row]) {
+                    for (int dirx = 0; dirx < 4; dirx++) {
+                        node->get_pipe((direction_t)dirx)->set_monitor(nullptr, NULL);
+                    }
+                }
+                delete m_nodes[row];
+            }
         }
 
         // =====================================================================
@@ -66,12 +81,74 @@ namespace NXModel {
          */
         bool is_idle (void);
 
-        /** Step forward every node in the mesh
+        /** Step forward every active node in the mesh. Nodes become active
+         *  when a message is queued into one of their inbound pipes, and on a
+         *  trigger every node that was active since the previous trigger is
+         *  stepped so that it can pick up its next input state. Nodes are
+         *  stepped in row-major order, so a node woken by an earlier node in
+         *  the same step is stepped immediately - exactly matching a sweep
+         *  of the whole mesh.
+         *
+         *  When running with multiple threads, the active nodes are stepped
+         *  one anti-diagonal (row + column) at a time, with the nodes of each
+         *  anti-diagonal split into bands that are stepped concurrently. The
+         *  north and west neighbours of a node lie on the previous
+         *  anti-diagonal and the south and east neighbours on the next, so
+         *  every pair of neighbours is stepped in the same order as in the
+         *  row-major sweep while the nodes of an anti-diagonal share no
+         *  pipes. Every node therefore sees exactly the messages it would
+         *  when stepping serially, giving identical message traffic.
          *
          * @param trigger signifies the start of a new cycle
          */
         void step (bool trigger);
 
+        /** Mark every node as active, for use when node state has been
+         *  modified outside of the normal flow of messages
+         */
+        void wake_all (void);
+
+        /** Set the number of threads used to step the mesh
+         *
+         * @param threads number of threads (1 steps serially, 0 uses one
+         *                per hardware thread)
+         */
+        void set_threads (uint32_t threads);
+
+        /** Return the number of threads used to step the mesh
+         *
+         * @return integer count of threads
+         */
+        uint32_t get_threads (void) { return m_threads; }
+
+        /** Return the number of steps taken
+         *
+         * @return integer count of steps
+         */
+        uint64_t get_step_count (void) { return m_steps; }
+
+        /** Return the number of times any node has been stepped
+         *
+         * @return integer count of node steps
+         */
+        uint64_t get_node_step_count (void) { return m_node_steps; }
+
+        /** Return the number of anti-diagonals handed to the worker threads
+         *
+         * @return integer count of anti-diagonals
+         */
+        uint64_t get_pooled_count (void) { return m_pooled; }
+
+        /** Return a histogram of the number of nodes active in each step
+         *
+         * @return vector where entry N counts the steps with N active nodes
+         */
+        std::vector<uint64_t> get_active_histogram (void) { return m_histogram; }
+
+        /** Clear the step counts and active node histogram
+         */
+        void reset_stats (void);
+
     private:
 
         // =====================================================================
@@ -88,6 +165,104 @@ namespace NXModel {
         // Nodes in mesh
         std::vector<std::vector<std::shared_ptr<NXNode>> *> m_nodes;
 
+        // =====================================================================
+        // Private Methods
+        // =====================================================================
+
+        /** Schedule a node that has had a message queued
+         *
+         * @param index row-major index of the node
+         */
+        void wake (uint32_t index);
+
+        /** Step the active nodes one anti-diagonal at a time, handing the
+         *  nodes of each anti-diagonal to the worker threads
+         *
+         * @param trigger signifies the start of a new cycle
+         * @return number of nodes stepped
+         */
+        uint32_t step_parallel (bool trigger);
+
+        /** Step one band of the active anti-diagonal
+         *
+         * @param band index of the band to step
+         */
+        void step_band (uint32_t band);
+
+        /** Main loop of a worker thread
+         *
+         * @param band       index of the band stepped by this worker
+         * @param generation generation of the pool when the worker started
+         */
+        void worker (uint32_t band, uint64_t generation);
+
+        // =====================================================================
+        // Scheduling
+        // =====================================================================
+
+        // Flags held for each node
+        enum {
+            SCHED_NOW     = 1, // Queued for the current step
+            SCHED_NEXT    = 2, // Queued for the next step
+            SCHED_TOUCHED = 4  // Stepped since the last trigger
+        };
+        std::vector<uint8_t> m_flags;
+
+        // Nodes to step in this step (in row-major order) and the next step
+        std::priority_queue<
+            uint32_t, std::vector<uint32_t>, std::greater<uint32_t>
+        > m_now;
+        std::vector<uint32_t> m_next;
+
+        // Nodes stepped since the last trigger
+        std::vector<uint32_t> m_touched;
+
+        // Index of the node currently being stepped (-1 outside of a step)
+        int64_t m_position;
+
+        // Whether the first trigger has been seen
+        bool m_triggered;
+
+        // Number of messages queued in all inbound pipes
+        std::atomic<uint64_t> m_queued;
+
+        // Statistics
+        uint64_t              m_steps;
+        uint64_t              m_node_steps;
+        uint64_t              m_pooled;
+        std::vector<uint64_t> m_histogram;
+
+        // =====================================================================
+        // Threading
+        // =====================================================================
+
+        // Fewest active nodes per thread on an anti-diagonal worth handing to
+        // the workers
+        static const uint32_t PARALLEL_MIN_NODES = 4;
+
+        // Number of threads, including the caller of step
+        uint32_t m_threads;
+
+        // Nodes to step on each anti-diagonal, the anti-diagonal being stepped
+        // (-1 outside of a parallel step) and a lock serialising wakes from
+        // concurrently stepped nodes
+        std::vector<std::vector<uint32_t>> m_diagonals;
+        int64_t                            m_diagonal;
+        std::mutex                         m_wake_lock;
+
+        // Nodes and trigger of the anti-diagonal being stepped
+        std::vector<uint32_t> m_active;
+        bool                  m_band_trigger;
+
+        // Worker threads and their synchronisation
+        std::vector<std::thread> m_workers;
+        std::mutex               m_pool_lock;
+        std::condition_variable  m_pool_start;
+        std::condition_variable  m_pool_done;
+        uint64_t                 m_generation;
+        uint32_t                 m_pending;
+        bool                     m_shutdown;
+
     };
 
 }
@@ -18,12 +18,35 @@
 using namespace NXModel;
 using namespace NXConstants;
 
+void NXMessagePipe::set_monitor (
+    std::function<void(void)> on_enqueue, std::atomic<uint64_t> * counter
+) {
+    m_on_enqueue = on_enqueue;
+    m_counter    = counter;
+    if (m_counter) (*m_counter) += m_messages.size();
+}
+
+void NXMessagePipe::push (entry_t entry)
+{
+    m_messages.push(entry);
+    if (m_counter) (*m_counter)++;
+    if (m_on_enqueue) m_on_enqueue();
+}
+
+NXMessagePipe::entry_t NXMessagePipe::pop (void)
+{
+    entry_t entry = m_messages.front();
+    m_messages.pop();
+    if (m_counter) (*m_counter)--;
+    return entry;
+}
+
 void NXMessagePipe::enqueue (node_load_t message)
 {
     entry_t entry;
     entry.header = message.header;
     pack_node_load(message, (uint8_t *)&entry.encoded);
-    m_messages.push(entry);
+    push(entry);
 }
 
 void NXMessagePipe::enqueue (node_signal_t message)
@@ -31,7 +54,7 @@ void NXMessagePipe::enqueue (node_signal_t message)
     entry_t entry;
     entry.header = message.header;
     pack_node_signal(message, (uint8_t *)&entry.encoded);
-    m_messages.push(entry);
+    push(entry);
 }
 
 void NXMessagePipe::enqueue (node_control_t message)
@@ -39,7 +62,7 @@ void NXMessagePipe::enqueue (node_control_t message)
     entry_t entry;
     entry.header = message.header;
     pack_node_control(message, (uint8_t *)&entry.encoded);
-    m_messages.push(entry);
+    push(entry);
 }
 
 void NXMessagePipe::enqueue (node_trace_t message)
@@ -47,7 +70,7 @@ void NXMessagePipe::enqueue (node_trace_t message)
     entry_t entry;
     entry.header = message.header;
     pack_node_trace(message, (uint8_t *)&entry.encoded);
-    m_messages.push(entry);
+    push(entry);
 }
 
 void NXMessagePipe::enqueue (node_raw_t message)
@@ -55,12 +78,12 @@ void NXMessagePipe::enqueue (node_raw_t message)
     entry_t entry;
     entry.header = message.header;
     pack_node_raw(message, (uint8_t *)&entry.encoded);
-    m_messages.push(entry);
+    push(entry);
 }
 
 void NXMessagePipe::enqueue_raw (entry_t entry)
 {
-    m_messages.push(entry);
+    push(entry);
 }
 
 bool NXMessagePipe::is_idle (void)
@@ -85,47 +108,78 @@ node_header_t NXMessagePipe::next_header (void)
 void NXMessagePipe::dequeue (node_load_t & message)
 {
     if (m_messages.empty()) assert(!"Called dequeue on empty pipe");
-    entry_t front = m_messages.front();
-    m_messages.pop();
+    entry_t front = pop();
     message = unpack_node_load((uint8_t *)&front.encoded);
 }
 
 void NXMessagePipe::dequeue (node_signal_t & message)
 {
     if (m_messages.empty()) assert(!"Called dequeue on empty pipe");
-    entry_t front = m_messages.front();
-    m_messages.pop();
+    entry_t front = pop();
     message = unpack_node_signal((uint8_t *)&front.encoded);
 }
 
 void NXMessagePipe::dequeue (node_control_t & message)
 {
     if (m_messages.empty()) assert(!"Called dequeue on empty pipe");
-    entry_t front = m_messages.front();
-    m_messages.pop();
+    entry_t front = pop();
     message = unpack_node_control((uint8_t *)&front.encoded);
 }
 
 void NXMessagePipe::dequeue (node_trace_t & message)
 {
     if (m_messages.empty()) assert(!"Called dequeue on empty pipe");
-    entry_t front = m_messages.front();
-    m_messages.pop();
+    entry_t front = pop();
     message = unpack_node_trace((uint8_t *)&front.encoded);
 }
 
 void NXMessagePipe::dequeue (node_raw_t & message)
 {
     if (m_messages.empty()) assert(!"Called dequeue on empty pipe");
-    entry_t front = m_messages.front();
-    m_messages.pop();
+    entry_t front = pop();
     message = unpack_node_raw((uint8_t *)&front.encoded);
 }
 
 NXMessagePipe::entry_t NXMessagePipe::dequeue_raw (void)
 {
     if (m_messages.empty()) assert(!"Called dequeue on empty pipe");
-    entry_t entry = m_messages.front();
-    m_messages.pop();
-    return entry;
+    return pop();
+}
+
+void NXMessagePipe::save (std::ostream & os)
+{
+    // Each entry is stored as the packed header (padded to 32 bits) followed
+    // by the 64-bit encoded message
+    uint64_t count = m_messages.size();
+    os.write((const char *)&count, sizeof(count));
+    for (uint64_t idx = 0; idx < count; idx++) {
+        entry_t  entry  = m_messages.front();
+        uint32_t header = 0;
+        uint32_t pad    = 0;
+        pack_node_header(entry.header, (uint8_t *)&header);
+        os.write((const char *)&header,        sizeof(header       ));
+        os.write((const char *)&pad,           sizeof(pad          ));
+        os.write((const char *)&entry.encoded, sizeof(entry.encoded));
+        // Rotate the entry to the back to preserve the queue
+        m_messages.pop();
+        m_messages.push(entry);
+    }
+}
+
+void NXMessagePipe::load (std::istream & is)
+{
+    while (!m_messages.empty()) pop();
+    uint64_t count = 0;
+    is.read((char *)&count, sizeof(count));
+    for (uint64_t idx = 0; idx < count; idx++) {
+        entry_t  entry;
+        uint32_t header = 0;
+        uint32_t pad    = 0;
+        is.read((char *)&header,        sizeof(header       ));
+        is.read((char *)&pad,           sizeof(pad          ));
+        is.read((char *)&entry.encoded, sizeof(entry.encoded));
+        if (!is.good()) break;
+        entry.header = unpack_node_header((uint8_t *)&header);
+        push(entry);
+    }
 }
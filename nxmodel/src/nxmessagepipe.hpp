@@ -12,7 +12,11 @@
 // See the License for the specific language governing permissions and
 // limitations under the License.
 
+#include <atomic>
+#include <functional>
 #include <iostream>
+#include <istream>
+#include <ostream>
 #include <queue>
 #include <stdint.h>
 #include <stdbool.h>
@@ -42,12 +46,23 @@ namespace NXModel {
         // Constructor
         // =====================================================================
 
-        NXMessagePipe (void) { }
+        NXMessagePipe (void) : m_counter ( NULL ) { }
 
         // =====================================================================
         // Public Methods
         // =====================================================================
 
+        /** Attach a monitor that is notified whenever a message is enqueued
+         *  and a counter that tracks the number of queued messages
+         *
+         * @param on_enqueue function to call on every enqueue
+         * @param counter    pointer to a shared count of queued messages (which
+         *                   may be updated by pipes on different threads)
+         */
+        void set_monitor (
+            std::function<void(void)> on_enqueue, std::atomic<uint64_t> * counter
+        );
+
         /** Append a message into the pipe
          *
          * @param message the message to append
@@ -99,8 +114,36 @@ namespace NXModel {
          */
         entry_t dequeue_raw (void);
 
+        /** Write every queued message to a checkpoint
+         *
+         * @param os stream to write to
+         */
+        void save (std::ostream & os);
+
+        /** Replace the queued messages with those read from a checkpoint
+         *
+         * @param is stream to read from
+         */
+        void load (std::istream & is);
+
     private:
 
+        // =====================================================================
+        // Private Methods
+        // =====================================================================
+
+        /** Push an entry onto the queue and notify the monitor
+         *
+         * @param entry the entry to push
+         */
+        void push (entry_t entry);
+
+        /** Pop the entry from the head of the queue
+         *
+         * @return the entry
+         */
+        entry_t pop (void);
+
         // =====================================================================
         // Members
         // =====================================================================
@@ -108,6 +151,10 @@ namespace NXModel {
         // Queue of messages
         std::queue<entry_t> m_messages;
 
+        // Monitor
+        std::function<void(void)>   m_on_enqueue;
+        std::atomic<uint64_t>     * m_counter;
+
     };
 }
 
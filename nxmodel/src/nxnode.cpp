@@ -37,6 +37,7 @@ std::shared_ptr<NXMessagePipe> NXNode::get_pipe (direction_t dirx)
 void NXNode::reset (void)
 {
     m_seen_first = false;
+    m_evaluated  = false;
     m_accumulator = 0;
     m_memory.clear();
     m_num_instr   = 0;
@@ -61,6 +62,7 @@ void NXNode::step (bool trigger)
 {
     // On the first triggered cycle, always evaluate instructions
     bool ip_delta = (!m_seen_first && trigger);
+    if (trigger) m_evaluated = false;
 
     // If a trigger is received, copy next->current
     if (trigger) {
@@ -79,11 +81,24 @@ void NXNode::step (bool trigger)
 
     // Perform execution
     bool op_delta = false;
-    if (ip_delta) op_delta = evaluate();
+    if (ip_delta) {
+        // Evaluating again within a cycle is a restart
+        if (m_evaluated) m_counters.restarts++;
+        m_evaluated = true;
+        op_delta    = evaluate();
+        m_counters.instructions += m_num_instr;
+    }
 
     // Generate outbound messages
     if (op_delta) transmit();
 
+    // A link carries one message at a time, so any further messages sent down
+    // the same link in this step must wait
+    for (int idx = 0; idx < 4; idx++) {
+        if (m_link_use[idx] > 1) m_counters.stalls += m_link_use[idx] - 1;
+        m_link_use[idx] = 0;
+    }
+
     // Record whether a trigger has ever been seen
     m_seen_first |= trigger;
 }
@@ -152,7 +167,7 @@ bool NXNode::digest (void)
                         }
                         m_inputs_next[msg.index] = msg.state;
                         if (!msg.is_seq) {
-                            curr_delta = (m_inputs_curr[msg.index] != msg.state);
+                            curr_delta |= (m_inputs_curr[msg.index] != msg.state);
                             m_inputs_curr[msg.index] = msg.state;
                         }
                         break;
@@ -192,6 +207,7 @@ bool NXNode::digest (void)
                 route(header.row, header.column, header.command)->enqueue_raw(
                     m_inbound[idx_pipe]->dequeue_raw()
                 );
+                m_counters.bypassed++;
             }
         }
     }
@@ -327,6 +343,7 @@ void NXNode::transmit (void)
             }
             // Dispatch the message
             route(mapping.row, mapping.column, NODE_COMMAND_SIGNAL)->enqueue(msg);
+            m_counters.emitted++;
         }
         // Always update the last sent state
         m_outputs_last[index] = state;
@@ -358,6 +375,7 @@ void NXNode::transmit (void)
             }
             // Dispatch the message
             route(m_row, m_column, NODE_COMMAND_TRACE)->enqueue(msg);
+            m_counters.emitted++;
         }
 
     }
@@ -390,8 +408,85 @@ std::shared_ptr<NXMessagePipe> NXNode::route (
         uint32_t trial = (start + idx_off) % 4;
         if (m_outbound[trial] == NULL) continue;
         tgt_pipe = m_outbound[trial];
+        m_link_use[trial]++;
         break;
     }
     assert(tgt_pipe != NULL);
     return tgt_pipe;
 }
+
+void NXNode::save (std::ostream & os)
+{
+    uint32_t num_memory = m_memory.size();
+    uint32_t flags      = (m_seen_first ? 1 : 0) | (m_trace_en ? 2 : 0);
+    os.write((const char *)&m_num_instr,   sizeof(m_num_instr  ));
+    os.write((const char *)&num_memory,    sizeof(num_memory   ));
+    os.write((const char *)&m_accumulator, sizeof(m_accumulator));
+    os.write((const char *)&flags,         sizeof(flags        ));
+    os.write((const char *)&m_loopback,    sizeof(m_loopback   ));
+    // Memory is padded to a multiple of 64 bits to keep sections aligned
+    uint32_t pad = 0;
+    os.write((const char *)m_memory.data(), num_memory * sizeof(uint32_t));
+    if (num_memory % 2) os.write((const char *)&pad, sizeof(pad));
+    // Input and output state
+    save_io(os, m_inputs_curr );
+    save_io(os, m_inputs_next );
+    save_io(os, m_outputs     );
+    save_io(os, m_outputs_last);
+    // Messages waiting in the inbound pipes
+    for (int idx = 0; idx < 4; idx++) m_inbound[idx]->save(os);
+}
+
+void NXNode::load (std::istream & is)
+{
+    uint32_t num_memory = 0;
+    uint32_t flags      = 0;
+    is.read((char *)&m_num_instr,   sizeof(m_num_instr  ));
+    is.read((char *)&num_memory,    sizeof(num_memory   ));
+    is.read((char *)&m_accumulator, sizeof(m_accumulator));
+    is.read((char *)&flags,         sizeof(flags        ));
+    is.read((char *)&m_loopback,    sizeof(m_loopback   ));
+    if (!is.good()) return;
+    m_seen_first = ((flags & 1) != 0);
+    m_trace_en   = ((flags & 2) != 0);
+    uint32_t pad = 0;
+    m_memory.resize(num_memory);
+    is.read((char *)m_memory.data(), num_memory * sizeof(uint32_t));
+    if (num_memory % 2) is.read((char *)&pad, sizeof(pad));
+    load_io(is, m_inputs_curr );
+    load_io(is, m_inputs_next );
+    load_io(is, m_outputs     );
+    load_io(is, m_outputs_last);
+    for (int idx = 0; idx < 4; idx++) m_inbound[idx]->load(is);
+}
+
+void NXNode::save_io (std::ostream & os, io_state_t & state)
+{
+    // Stored as a count of 64-bit words, followed by a bitmap of the indices
+    // that are present and a bitmap of their values
+    uint64_t words = 0;
+    if (!state.empty()) words = (state.rbegin()->first / 64) + 1;
+    std::vector<uint64_t> present(words, 0), values(words, 0);
+    for (io_state_t::iterator it = state.begin(); it != state.end(); it++) {
+        present[it->first / 64] |= (1ULL << (it->first % 64));
+        if (it->second) values[it->first / 64] |= (1ULL << (it->first % 64));
+    }
+    os.write((const char *)&words,         sizeof(words));
+    os.write((const char *)present.data(), words * sizeof(uint64_t));
+    os.write((const char *)values.data(),  words * sizeof(uint64_t));
+}
+
+void NXNode::load_io (std::istream & is, io_state_t & state)
+{
+    uint64_t words = 0;
+    is.read((char *)&words, sizeof(words));
+    if (!is.good()) return;
+    std::vector<uint64_t> present(words, 0), values(words, 0);
+    is.read((char *)present.data(), words * sizeof(uint64_t));
+    is.read((char *)values.data(),  words * sizeof(uint64_t));
+    state.clear();
+    for (uint32_t index = 0; index < (words * 64); index++) {
+        if (((present[index / 64] >> (index % 64)) & 1) == 0) continue;
+        state[index] = ((values[index / 64] >> (index % 64)) & 1) != 0;
+    }
+}
@@ -40,6 +40,15 @@ namespace NXModel {
         typedef std::vector<uint32_t> memory_t;
         typedef std::map<uint32_t, bool> io_state_t;
 
+        // Performance counters
+        typedef struct {
+            uint64_t instructions; // Instructions executed
+            uint64_t restarts;     // Re-evaluations within a cycle
+            uint64_t emitted;      // Messages generated by this node
+            uint64_t bypassed;     // Messages routed through this node
+            uint64_t stalls;       // Messages queued behind another on a link
+        } counters_t;
+
         // =====================================================================
         // Constructor
         // =====================================================================
@@ -60,11 +69,14 @@ namespace NXModel {
             , m_num_instr   ( 0       )
             , m_loopback    ( 0       )
             , m_trace_en    ( 0       )
+            , m_evaluated   ( false   )
         {
             for (int i = 0; i < 4; i++) {
                 m_inbound[i]  = std::make_shared<NXMessagePipe>();
                 m_outbound[i] = NULL;
+                m_link_use[i] = 0;
             }
+            reset_counters();
         }
 
         // =====================================================================
@@ -102,6 +114,16 @@ namespace NXModel {
          */
         void step (bool trigger);
 
+        /** Return the performance counters
+         *
+         * @return the counters accumulated since the last reset
+         */
+        counters_t get_counters (void) { return m_counters; }
+
+        /** Clear the performance counters
+         */
+        void reset_counters (void) { m_counters = {}; }
+
         /** Return the contents of the memory
          *
          * @return vector of the contents of the memory
@@ -126,6 +148,13 @@ namespace NXModel {
          */
         io_state_t get_current_outputs (void);
 
+        /** Retrieve the current state of a single input
+         *
+         * @param index input to retrieve
+         * @return the boolean value
+         */
+        bool get_current_input (uint32_t index) { return get_input(index); }
+
         /** Return the number of instructions loaded
          *
          * @return integer count of instructions
@@ -144,6 +173,20 @@ namespace NXModel {
          */
         uint32_t get_input_count (void) { return m_num_inputs; }
 
+        /** Write the full state of the node and its inbound pipes to a
+         *  checkpoint
+         *
+         * @param os stream to write to
+         */
+        void save (std::ostream & os);
+
+        /** Restore the full state of the node and its inbound pipes from a
+         *  checkpoint
+         *
+         * @param is stream to read from
+         */
+        void load (std::istream & is);
+
     private:
 
         // =====================================================================
@@ -180,7 +223,8 @@ namespace NXModel {
          */
         bool get_output (uint32_t index);
 
-        /** Return the correct target pipe for a message
+        /** Return the correct target pipe for a message, noting the use of
+         *  the link as a message is always sent to the returned pipe
          *
          * @param row target row
          * @param column target column
@@ -190,6 +234,20 @@ namespace NXModel {
             uint32_t row, uint32_t column, node_command_t command
         );
 
+        /** Write an input or output state as presence and value bitmaps
+         *
+         * @param os    stream to write to
+         * @param state the state to write
+         */
+        void save_io (std::ostream & os, io_state_t & state);
+
+        /** Read an input or output state written by save_io
+         *
+         * @param is    stream to read from
+         * @param state the state to replace
+         */
+        void load_io (std::istream & is, io_state_t & state);
+
         // =====================================================================
         // Private Members
         // =====================================================================
@@ -225,6 +283,11 @@ namespace NXModel {
         io_state_t m_outputs;
         io_state_t m_outputs_last;
 
+        // Performance counters
+        counters_t              m_counters;
+        bool                    m_evaluated;
+        std::array<uint32_t, 4> m_link_use;
+
     };
 }
 
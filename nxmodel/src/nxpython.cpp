@@ -13,11 +13,14 @@
 // limitations under the License.
 
 #include <filesystem>
+#include <optional>
 
+#include <pybind11/numpy.h>
 #include <pybind11/pybind11.h>
 #include <pybind11/stl.h>
 
 #include "nexus.hpp"
+#include "nxhistory.hpp"
 #include "nxloader.hpp"
 
 namespace py = pybind11;
@@ -91,22 +94,178 @@ PYBIND11_MODULE(nxmodel, m) {
 
     // Expose classes
     py::class_<Nexus, std::shared_ptr<Nexus>>(m, "Nexus")
-        .def(py::init<uint32_t, uint32_t, uint32_t, uint32_t>())
+        .def(
+            py::init<uint32_t, uint32_t, uint32_t, uint32_t, bool>(),
+            py::arg("rows"), py::arg("columns"), py::arg("node_inputs"),
+            py::arg("node_outputs"), py::arg("verbose") = false
+        )
         .def("get_rows",            &Nexus::get_rows           )
         .def("get_columns",         &Nexus::get_columns        )
         .def("get_mesh",            &Nexus::get_mesh           )
         .def("get_ingress",         &Nexus::get_ingress        )
         .def("get_egress",          &Nexus::get_egress         )
-        .def("run",                 &Nexus::run                )
-        .def("dump_vcd",            &Nexus::dump_vcd           )
+        .def("set_quiet",           &Nexus::set_quiet          )
+        .def("get_quiet",           &Nexus::get_quiet          )
+        .def("set_threads",         &Nexus::set_threads, py::call_guard<py::gil_scoped_release>())
+        .def("get_threads",         &Nexus::get_threads        )
+        .def("run",                 &Nexus::run,        py::call_guard<py::gil_scoped_release>())
+        .def("dump_vcd",            &Nexus::dump_vcd,   py::call_guard<py::gil_scoped_release>())
+        .def(
+            "open_waves", &Nexus::open_waves,
+            py::arg("path"), py::arg("state") = true
+        )
+        .def("close_waves",         &Nexus::close_waves        )
         .def("is_output_available", &Nexus::is_output_available)
-        .def("pop_output",          &Nexus::pop_output         );
+        .def("pop_output",          &Nexus::pop_output, py::call_guard<py::gil_scoped_release>())
+        .def("get_cycle",           &Nexus::get_cycle          )
+        .def("get_history",         &Nexus::get_history        )
+        .def("save_state",          &Nexus::save_state, py::call_guard<py::gil_scoped_release>())
+        .def("load_state",          &Nexus::load_state, py::call_guard<py::gil_scoped_release>())
+        .def(
+            "set_history", &Nexus::set_history,
+            py::arg("max_cycles"), py::arg("spill") = "",
+            py::call_guard<py::gil_scoped_release>()
+        )
+        .def("iter_changes", [](Nexus & model) {
+            return std::make_shared<NXHistoryIterator>(model.get_history());
+        })
+        .def("get_output_names",    &Nexus::get_output_names   )
+        .def("get_output_keys",     &Nexus::get_output_keys    )
+        .def(
+            "run_capture",
+            [](
+                Nexus                                   & model,
+                uint32_t                                  cycles,
+                std::optional<std::vector<std::string>>   outputs,
+                bool                                      packed
+            ) -> py::array_t<uint8_t> {
+                // Resolve the columns, defaulting to every port of the design
+                std::vector<Nexus::output_key_t> keys = model.get_output_keys(
+                    outputs ? *outputs : model.get_output_names()
+                );
+                size_t width = packed ? ((keys.size() + 7) / 8) : keys.size();
+                py::array_t<uint8_t> result({ (size_t)cycles, width });
+                uint8_t * buffer = result.mutable_data();
+                {
+                    py::gil_scoped_release release;
+                    model.run_capture(cycles, keys, buffer, packed);
+                }
+                return result;
+            },
+            py::arg("cycles"),
+            py::arg("outputs") = py::none(),
+            py::arg("packed")  = false
+        )
+        .def("get_input_names",     &Nexus::get_input_names    )
+        .def("get_input_keys",      &Nexus::get_input_keys     )
+        .def(
+            "run_with_stimulus",
+            [](
+                Nexus                                   & model,
+                py::array_t<uint8_t, py::array::c_style | py::array::forcecast> stimulus,
+                std::optional<py::list>                   inputs,
+                std::optional<std::vector<std::string>>   outputs,
+                bool                                      packed
+            ) -> py::array_t<uint8_t> {
+                if (stimulus.ndim() != 2) {
+                    throw std::invalid_argument("Stimulus must be a (cycles, inputs) array");
+                }
+                // Resolve every column to the node inputs it drives, each
+                // column is either a named flop or a (row, column, index)
+                Nexus::stimulus_t stim;
+                stim.width  = stimulus.shape(1);
+                stim.values = stimulus.data();
+                py::list columns = inputs ? *inputs : py::cast(model.get_input_names());
+                if (columns.size() != stim.width) {
+                    throw std::invalid_argument(
+                        "Stimulus has " + std::to_string(stim.width) + " columns but " +
+                        std::to_string(columns.size()) + " inputs were given"
+                    );
+                }
+                for (uint32_t idx = 0; idx < columns.size(); idx++) {
+                    std::vector<Nexus::input_key_t> keys;
+                    if (py::isinstance<py::str>(columns[idx])) {
+                        keys = model.get_input_keys({ columns[idx].cast<std::string>() });
+                    } else {
+                        keys.push_back(columns[idx].cast<Nexus::input_key_t>());
+                    }
+                    for (const auto & key : keys) {
+                        stim.targets.push_back(key);
+                        stim.columns.push_back(idx);
+                    }
+                }
+                // Resolve the outputs to capture
+                std::vector<Nexus::output_key_t> keys = model.get_output_keys(
+                    outputs ? *outputs : model.get_output_names()
+                );
+                uint32_t cycles = stimulus.shape(0);
+                size_t   width  = packed ? ((keys.size() + 7) / 8) : keys.size();
+                py::array_t<uint8_t> result({ (size_t)cycles, width });
+                uint8_t * buffer = result.mutable_data();
+                {
+                    py::gil_scoped_release release;
+                    model.run_stimulus(cycles, stim, keys, buffer, packed);
+                }
+                return result;
+            },
+            py::arg("stimulus"),
+            py::arg("inputs")  = py::none(),
+            py::arg("outputs") = py::none(),
+            py::arg("packed")  = false
+        )
+        .def(
+            "get_counters",
+            [](Nexus & model, bool reset) -> py::dict {
+                Nexus::counters_t counters;
+                {
+                    py::gil_scoped_release release;
+                    counters = model.get_counters(reset);
+                }
+                // Per-node counters are shaped (rows, columns)
+                auto per_node = [&] (uint64_t NXNode::counters_t::* field) {
+                    py::array_t<uint64_t> result({ model.get_rows(), model.get_columns() });
+                    uint64_t * data = result.mutable_data();
+                    for (size_t idx = 0; idx < counters.nodes.size(); idx++) {
+                        data[idx] = counters.nodes[idx].*field;
+                    }
+                    return result;
+                };
+                py::array_t<uint32_t> settle(counters.settle.size());
+                std::copy(counters.settle.begin(), counters.settle.end(), settle.mutable_data());
+                py::array_t<uint64_t> histogram(counters.histogram.size());
+                std::copy(counters.histogram.begin(), counters.histogram.end(), histogram.mutable_data());
+                py::dict result;
+                result["start"]            = counters.start;
+                result["settle_steps"]     = settle;
+                result["settle_histogram"] = histogram;
+                result["instructions"]     = per_node(&NXNode::counters_t::instructions);
+                result["restarts"]         = per_node(&NXNode::counters_t::restarts    );
+                result["emitted"]          = per_node(&NXNode::counters_t::emitted     );
+                result["bypassed"]         = per_node(&NXNode::counters_t::bypassed    );
+                result["stalls"]           = per_node(&NXNode::counters_t::stalls      );
+                return result;
+            },
+            py::arg("reset") = false
+        )
+        .def("reset_counters",      &Nexus::reset_counters, py::call_guard<py::gil_scoped_release>());
 
     py::class_<NXMesh, std::shared_ptr<NXMesh>>(m, "NXMesh")
         .def(py::init<uint32_t, uint32_t, uint32_t, uint32_t>())
-        .def("get_node", &NXMesh::get_node)
-        .def("is_idle",  &NXMesh::is_idle )
-        .def("step",     &NXMesh::step    );
+        .def("get_node",             &NXMesh::get_node            )
+        .def("is_idle",              &NXMesh::is_idle             )
+        .def("step",                 &NXMesh::step                )
+        .def("wake_all",             &NXMesh::wake_all            )
+        .def("get_threads",          &NXMesh::get_threads         )
+        .def("get_step_count",       &NXMesh::get_step_count      )
+        .def("get_node_step_count",  &NXMesh::get_node_step_count )
+        .def("get_pooled_count",     &NXMesh::get_pooled_count    )
+        .def("get_active_histogram", [](NXMesh & mesh) {
+            std::vector<uint64_t> hist = mesh.get_active_histogram();
+            py::array_t<uint64_t> result(hist.size());
+            std::copy(hist.begin(), hist.end(), result.mutable_data());
+            return result;
+        })
+        .def("reset_stats",          &NXMesh::reset_stats         );
 
     py::class_<NXNode, std::shared_ptr<NXNode>>(m, "NXNode")
         .def(py::init<uint32_t, uint32_t, uint32_t, uint32_t>())
@@ -140,6 +299,27 @@ PYBIND11_MODULE(nxmodel, m) {
         .def("next_header", &NXMessagePipe::next_header)
         .def("next_type",   &NXMessagePipe::next_type);
 
+    py::class_<NXHistory, std::shared_ptr<NXHistory>>(m, "NXHistory")
+        .def("get_depth",      &NXHistory::get_depth     )
+        .def("get_spill_path", &NXHistory::get_spill_path)
+        .def("get_size",       &NXHistory::get_size      )
+        .def("is_empty",       &NXHistory::is_empty      );
+
+    py::class_<NXHistoryIterator, std::shared_ptr<NXHistoryIterator>>(m, "NXHistoryIterator")
+        .def("__iter__", [](std::shared_ptr<NXHistoryIterator> self) { return self; })
+        .def("__next__", [](NXHistoryIterator & self) {
+            NXHistory::entry_t entry;
+            if (!self.next(entry)) throw py::stop_iteration();
+            py::list changes;
+            for (const auto & change : entry.changes) {
+                changes.append(py::make_tuple(
+                    std::get<0>(change.first), std::get<1>(change.first),
+                    std::get<2>(change.first), change.second
+                ));
+            }
+            return py::make_tuple(entry.cycle, changes);
+        });
+
     py::class_<NXLoader>(m, "NXLoader")
-        .def(py::init<Nexus *, std::string>());
+        .def(py::init<Nexus *, std::string>(), py::call_guard<py::gil_scoped_release>());
 }
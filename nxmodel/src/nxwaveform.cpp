@@ -0,0 +1,208 @@
+// Copyright 2021, Peter Birch, mailto:peter@lightlogic.co.uk
+//
+// Licensed under the Apache License, Version 2.0 (the "License");
+// you may not use this file except in compliance with the License.
+// You may obtain a copy of the License at
+//
+// http://www.apache.org/licenses/LICENSE-2.0
+//
+// Unless required by applicable law or agreed to in writing, software
+// distributed under the License is distributed on an "AS IS" BASIS,
+// WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+// See the License for the specific language governing permissions and
+// limitations under the License.
+
+#include <assert.h>
+#include <cctype>
+#include <stdexcept>
+
+#include "nxwaveform.hpp"
+
+using namespace NXModel;
+
+NXWaveform::NXWaveform (std::string path)
+{
+    m_file.open(path, std::ios::binary | std::ios::trunc);
+    if (!m_file.is_open()) throw std::runtime_error("Failed to open waveform " + path);
+}
+
+std::shared_ptr<NXWaveform> NXWaveform::create (std::string path)
+{
+    std::string suffix = (path.size() >= 4) ? path.substr(path.size() - 4) : "";
+    if (suffix == ".vcd") return std::make_shared<NXVCDWaveform>(path);
+    return std::make_shared<NXCompactWaveform>(path);
+}
+
+void NXWaveform::add_signal (
+    std::string scope, std::string name, std::vector<key_t> bits, bool is_state
+) {
+    uint32_t index = m_signals.size();
+    m_signals.push_back({ scope, name, bits, is_state, std::vector<bool>(bits.size(), false) });
+    for (uint32_t bit = 0; bit < bits.size(); bit++) {
+        (is_state ? m_state : m_outputs)[bits[bit]].push_back({ index, bit });
+    }
+    m_dirty.push_back(false);
+}
+
+std::vector<NXWaveform::key_t> NXWaveform::get_state_keys (void)
+{
+    std::vector<key_t> keys;
+    for (const auto & entry : m_state) keys.push_back(entry.first);
+    return keys;
+}
+
+void NXWaveform::begin (uint64_t cycle, const changes_t & outputs, const changes_t & state)
+{
+    std::vector<uint32_t> changed;
+    apply(outputs, m_outputs, changed);
+    apply(state,   m_state,   changed);
+    write_header();
+    // Dump the value of every signal
+    std::vector<uint32_t> all;
+    for (uint32_t index = 0; index < m_signals.size(); index++) {
+        all.push_back(index);
+        m_dirty[index] = false;
+    }
+    write_changes(cycle, all);
+}
+
+void NXWaveform::sample (uint64_t cycle, const changes_t & outputs, const changes_t & state)
+{
+    std::vector<uint32_t> changed;
+    apply(outputs, m_outputs, changed);
+    apply(state,   m_state,   changed);
+    if (changed.empty()) return;
+    for (uint32_t index : changed) m_dirty[index] = false;
+    write_changes(cycle, changed);
+}
+
+void NXWaveform::apply (
+    const changes_t                                                & changes,
+    std::map<key_t, std::vector<std::pair<uint32_t, uint32_t>>>   & lookup,
+    std::vector<uint32_t>                                          & changed
+) {
+    for (const auto & change : changes) {
+        auto match = lookup.find(change.first);
+        if (match == lookup.end()) continue;
+        for (const auto & target : match->second) {
+            signal_t & signal = m_signals[target.first];
+            if (signal.values[target.second] == change.second) continue;
+            signal.values[target.second] = change.second;
+            if (!m_dirty[target.first]) {
+                m_dirty[target.first] = true;
+                changed.push_back(target.first);
+            }
+        }
+    }
+}
+
+// =============================================================================
+// VCD
+// =============================================================================
+
+void NXVCDWaveform::write_header (void)
+{
+    m_file << "$version nxmodel $end" << std::endl;
+    m_file << "$timescale 1ns $end" << std::endl;
+    // Allocate a short identifier code to every signal
+    std::string scope = "";
+    for (uint32_t index = 0; index < m_signals.size(); index++) {
+        std::string code;
+        uint32_t    value = index;
+        do {
+            code  += (char)('!' + (value % 94));
+            value /= 94;
+        } while (value > 0);
+        m_codes.push_back(code);
+        // Open a new scope when required
+        signal_t & signal = m_signals[index];
+        if (signal.scope != scope) {
+            if (!scope.empty()) m_file << "$upscope $end" << std::endl;
+            scope = signal.scope;
+            m_file << "$scope module " << scope << " $end" << std::endl;
+        }
+        // Whitespace is not legal within a VCD name
+        std::string name = signal.name;
+        for (char & chr : name) if (isspace(chr)) chr = '_';
+        m_file << "$var wire " << signal.bits.size() << " " << code << " " << name;
+        if (signal.bits.size() > 1) m_file << " [" << (signal.bits.size() - 1) << ":0]";
+        m_file << " $end" << std::endl;
+    }
+    if (!scope.empty()) m_file << "$upscope $end" << std::endl;
+    m_file << "$enddefinitions $end" << std::endl;
+}
+
+void NXVCDWaveform::write_changes (uint64_t cycle, const std::vector<uint32_t> & changed)
+{
+    m_file << "#" << cycle << "\n";
+    for (uint32_t index : changed) {
+        signal_t & signal = m_signals[index];
+        if (signal.values.size() == 1) {
+            m_file << (signal.values[0] ? "1" : "0") << m_codes[index] << "\n";
+        } else {
+            m_file << "b";
+            for (uint32_t bit = signal.values.size(); bit > 0; bit--) {
+                m_file << (signal.values[bit - 1] ? "1" : "0");
+            }
+            m_file << " " << m_codes[index] << "\n";
+        }
+    }
+}
+
+// =============================================================================
+// Compact
+// =============================================================================
+
+// The compact format starts with an 8 byte magic and a 32-bit version, then
+// lists every signal as its scope, name, width, and whether it is state. Value
+// changes follow as records holding the number of cycles since the previous
+// record, the number of signals that changed, then the index and packed value
+// (LSB first, rounded up to whole bytes) of each changed signal. All counts,
+// lengths, and indices are unsigned LEB128 varints.
+
+static const char     COMPACT_MAGIC[8] = { 'N', 'X', 'W', 'A', 'V', 'E', '\0', '\0' };
+static const uint32_t COMPACT_VERSION  = 1;
+
+void NXCompactWaveform::write_varint (uint64_t value)
+{
+    do {
+        uint8_t byte = value & 0x7F;
+        value >>= 7;
+        if (value) byte |= 0x80;
+        m_file.put((char)byte);
+    } while (value);
+}
+
+void NXCompactWaveform::write_header (void)
+{
+    m_file.write(COMPACT_MAGIC, sizeof(COMPACT_MAGIC));
+    m_file.write((const char *)&COMPACT_VERSION, sizeof(COMPACT_VERSION));
+    write_varint(m_signals.size());
+    for (signal_t & signal : m_signals) {
+        write_varint(signal.scope.size());
+        m_file.write(signal.scope.data(), signal.scope.size());
+        write_varint(signal.name.size());
+        m_file.write(signal.name.data(), signal.name.size());
+        write_varint(signal.bits.size());
+        m_file.put(signal.is_state ? 1 : 0);
+    }
+}
+
+void NXCompactWaveform::write_changes (uint64_t cycle, const std::vector<uint32_t> & changed)
+{
+    assert(cycle >= m_last_cycle);
+    write_varint(cycle - m_last_cycle);
+    write_varint(changed.size());
+    for (uint32_t index : changed) {
+        signal_t & signal = m_signals[index];
+        write_varint(index);
+        for (uint32_t base = 0; base < signal.values.size(); base += 8) {
+            uint8_t byte = 0;
+            for (uint32_t bit = base; bit < signal.values.size() && bit < (base + 8); bit++) {
+                byte |= (signal.values[bit] ? 1 : 0) << (bit - base);
+            }
+            m_file.put((char)byte);
+        }
+    }
+    m_last_cycle = cycle;
+}
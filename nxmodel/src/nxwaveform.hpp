@@ -0,0 +1,184 @@
+// Copyright 2021, Peter Birch, mailto:peter@lightlogic.co.uk
+//
+// Licensed under the Apache License, Version 2.0 (the "License");
+// you may not use this file except in compliance with the License.
+// You may obtain a copy of the License at
+//
+// http://www.apache.org/licenses/LICENSE-2.0
+//
+// Unless required by applicable law or agreed to in writing, software
+// distributed under the License is distributed on an "AS IS" BASIS,
+// WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+// See the License for the specific language governing permissions and
+// limitations under the License.
+
+#include <fstream>
+#include <map>
+#include <memory>
+#include <stdint.h>
+#include <string>
+#include <tuple>
+#include <utility>
+#include <vector>
+
+#ifndef __NXWAVEFORM_HPP__
+#define __NXWAVEFORM_HPP__
+
+namespace NXModel {
+
+    class NXWaveform {
+    public:
+
+        // =====================================================================
+        // Data Structures
+        // =====================================================================
+
+        typedef std::tuple<uint32_t, uint32_t, uint32_t> key_t;
+
+        typedef std::vector<std::pair<key_t, bool>> changes_t;
+
+        typedef struct {
+            std::string        scope;
+            std::string        name;
+            std::vector<key_t> bits;
+            bool               is_state;
+            std::vector<bool>  values;
+        } signal_t;
+
+        // =====================================================================
+        // Constructor & Destructor
+        // =====================================================================
+
+        NXWaveform (std::string path);
+
+        virtual ~NXWaveform (void) { }
+
+        // =====================================================================
+        // Public Methods
+        // =====================================================================
+
+        /** Open a waveform writer, picking the format from the file suffix
+         *  ('.vcd' for VCD, anything else for the compact format)
+         *
+         * @param path path to write to
+         * @return pointer to the writer
+         */
+        static std::shared_ptr<NXWaveform> create (std::string path);
+
+        /** Declare a signal, must be called before begin
+         *
+         * @param scope    scope to place the signal within
+         * @param name     name of the signal
+         * @param bits     source of each bit (LSB first), either an egress key
+         *                 or a node input when the signal is state
+         * @param is_state whether the bits are node inputs rather than egress
+         */
+        void add_signal (
+            std::string scope, std::string name, std::vector<key_t> bits, bool is_state
+        );
+
+        /** Return the node inputs that need to be sampled for state signals
+         *
+         * @return list of node input keys
+         */
+        std::vector<key_t> get_state_keys (void);
+
+        /** Write out the declarations and the initial value of every signal
+         *
+         * @param cycle   the cycle to start from
+         * @param outputs the current value of every egress key
+         * @param state   the current value of every sampled node input
+         */
+        void begin (uint64_t cycle, const changes_t & outputs, const changes_t & state);
+
+        /** Write out the signals that changed in a cycle
+         *
+         * @param cycle   the cycle that completed
+         * @param outputs egress bits that changed in the cycle
+         * @param state   sampled node inputs that changed in the cycle
+         */
+        void sample (uint64_t cycle, const changes_t & outputs, const changes_t & state);
+
+        /** Flush and close the output file
+         */
+        void close (void) { if (m_file.is_open()) m_file.close(); }
+
+    protected:
+
+        // =====================================================================
+        // Protected Methods
+        // =====================================================================
+
+        /** Write the file header and signal declarations
+         */
+        virtual void write_header (void) = 0;
+
+        /** Write the new value of a set of signals
+         *
+         * @param cycle   the cycle the values were taken at
+         * @param changed indices of the signals that changed
+         */
+        virtual void write_changes (uint64_t cycle, const std::vector<uint32_t> & changed) = 0;
+
+        // =====================================================================
+        // Protected Members
+        // =====================================================================
+
+        std::ofstream         m_file;
+        std::vector<signal_t> m_signals;
+
+    private:
+
+        // =====================================================================
+        // Private Methods
+        // =====================================================================
+
+        /** Apply changes to the signal values
+         *
+         * @param changes the changes to apply
+         * @param lookup  map from key to the signal and bit it drives
+         * @param changed list of changed signal indices to extend
+         */
+        void apply (
+            const changes_t                                                & changes,
+            std::map<key_t, std::vector<std::pair<uint32_t, uint32_t>>>   & lookup,
+            std::vector<uint32_t>                                          & changed
+        );
+
+        // =====================================================================
+        // Private Members
+        // =====================================================================
+
+        // Map from egress keys and node inputs to (signal, bit)
+        std::map<key_t, std::vector<std::pair<uint32_t, uint32_t>>> m_outputs;
+        std::map<key_t, std::vector<std::pair<uint32_t, uint32_t>>> m_state;
+
+        // Marks signals that have already changed in the current cycle
+        std::vector<bool> m_dirty;
+
+    };
+
+    class NXVCDWaveform : public NXWaveform {
+    public:
+        NXVCDWaveform (std::string path) : NXWaveform(path) { }
+    protected:
+        void write_header (void);
+        void write_changes (uint64_t cycle, const std::vector<uint32_t> & changed);
+    private:
+        std::vector<std::string> m_codes;
+    };
+
+    class NXCompactWaveform : public NXWaveform {
+    public:
+        NXCompactWaveform (std::string path) : NXWaveform(path), m_last_cycle ( 0 ) { }
+    protected:
+        void write_header (void);
+        void write_changes (uint64_t cycle, const std::vector<uint32_t> & changed);
+    private:
+        void write_varint (uint64_t value);
+        uint64_t m_last_cycle;
+    };
+
+}
+
+#endif // __NXWAVEFORM_HPP__
@@ -0,0 +1,56 @@
+# Copyright 2021, Peter Birch, mailto:peter@lightlogic.co.uk
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import json
+import time
+
+import click
+
+from .sim import NXSim
+
+@click.command()
+@click.option("--cycles", type=int, default=100, help="Number of cycles to run for")
+@click.option("--lanes",  type=int, default=64,  help="Number of independent lanes to simulate")
+@click.option("--seed",   type=int, default=None, help="Randomise the initial state of every flop with this seed")
+@click.option("--trace",  type=click.File("w"),   help="Write the boundary outputs of every lane on every cycle as JSON")
+@click.argument("design", type=click.Path(exists=True, dir_okay=False))
+def main(cycles, lanes, seed, trace, design):
+    """ Simulate a compiled design using the bit-parallel software model.
+
+    Arguments:\n
+        DESIGN: Path to the compiled design (binary or JSON).
+    """
+    sim = NXSim(design, lanes=lanes)
+    if seed is not None: sim.randomise_state(seed)
+    print(f"[NXSim] Running {lanes} lanes for {cycles} cycles")
+    history = []
+    start   = time.perf_counter()
+    for _ in range(cycles):
+        sim.step()
+        if trace:
+            history.append({
+                k: [int(x) for x in v] for k, v in sim.get_outputs().items()
+            })
+    delta = time.perf_counter() - start
+    print(
+        f"[NXSim] Achieved {cycles / delta:.0f} cycles/s "
+        f"({(cycles * lanes) / delta:.0f} lane-cycles/s)"
+    )
+    if trace: json.dump(history, trace)
+    for name, value in sim.get_outputs().items():
+        print(f"[NXSim] {name} = {', '.join(str(x) for x in value[:8])}"
+              f"{', ...' if lanes > 8 else ''}")
+
+if __name__ == "__main__":
+    main(prog_name="nxsim")
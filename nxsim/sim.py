@@ -0,0 +1,323 @@
+# Copyright 2021, Peter Birch, mailto:peter@lightlogic.co.uk
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import logging
+import re
+
+import numpy as np
+
+from nxloader import NXLoader
+
+log = logging.getLogger("nxsim")
+
+# Design reports
+DSG_REP_STATE   = "state"
+DSG_REP_OUTPUTS = "outputs"
+
+# All ones in a lane word
+ONES = np.uint64((1 << 64) - 1)
+
+def pack_lanes(values):
+    """ Pack per-lane boolean values into 64-bit lane words.
+
+    Args:
+        values: Array-like of booleans, one per lane (the last axis)
+
+    Returns: NumPy uint64 array with the last axis holding the lane words
+    """
+    values = np.asarray(values, dtype=bool)
+    pad    = (-values.shape[-1]) % 64
+    if pad:
+        values = np.concatenate(
+            (values, np.zeros(values.shape[:-1] + (pad,), dtype=bool)), axis=-1
+        )
+    packed = np.packbits(values, axis=-1, bitorder="little")
+    return packed.view("<u8").astype(np.uint64)
+
+def unpack_lanes(words, lanes):
+    """ Unpack 64-bit lane words into per-lane boolean values.
+
+    Args:
+        words: NumPy uint64 array with the last axis holding the lane words
+        lanes: Number of lanes to return
+
+    Returns: NumPy boolean array, one entry per lane in the last axis
+    """
+    raw = np.ascontiguousarray(words, dtype="<u8").view(np.uint8)
+    return np.unpackbits(raw, axis=-1, bitorder="little")[..., :lanes].astype(bool)
+
+class NXSim:
+    """
+    Bit-parallel software simulator for compiled designs. Every lane holds an
+    independent copy of the design's state, with 64 lanes carried per word, and
+    every node of the mesh executes the same program counter at once so the
+    cost of each step is shared across the whole mesh.
+
+    Each cycle follows the behaviour of nxmodel: sequential inputs take their
+    next value, then every node evaluates its program with combinational
+    signals re-evaluated until they settle, before sequential signals and
+    loopbacks are captured ready for the next cycle.
+    """
+
+    def __init__(self, design, lanes=64):
+        """ Initialise the NXSim instance.
+
+        Args:
+            design: NXLoader instance, or anything NXLoader accepts
+            lanes : Number of independent lanes to simulate
+        """
+        self.loader = design if isinstance(design, NXLoader) else NXLoader(design)
+        self.lanes  = lanes
+        self.words  = (lanes + 63) // 64
+        self.cycle  = 0
+        self.rows, self.columns = self.loader.cfg_rows, self.loader.cfg_cols
+        self.num_inputs, self.num_outputs = self.loader.cfg_ins, self.loader.cfg_outs
+        self.num_nodes = self.rows * self.columns
+        self.reports   = self.loader.reports
+        self.__build_program()
+        self.__build_routing()
+        self.reset()
+
+    def node_index(self, row, column):
+        """ Flat index of a node within the simulator's state arrays """
+        return (row * self.columns) + column
+
+    def __build_program(self):
+        """ Gather every node's instructions into (steps, nodes) field arrays """
+        fields = self.loader.instr_fields
+        counts = np.zeros(self.num_nodes, dtype=np.int64)
+        starts = np.zeros(self.num_nodes, dtype=np.int64)
+        for entry in self.loader.nodes:
+            idx = self.node_index(int(entry["row"]), int(entry["column"]))
+            counts[idx] = int(entry["instr_count"])
+            starts[idx] = int(entry["instr_start"])
+        self.steps      = int(counts.max()) if len(counts) else 0
+        self.num_instrs = int(counts.sum())
+        # Index of each step's instruction within the design
+        step_idx = np.arange(self.steps)[:, None]
+        valid    = step_idx < counts[None, :]
+        gather   = np.where(valid, starts[None, :] + step_idx, 0)
+        def take(name):
+            values = fields[name].astype(np.int64)
+            return np.where(valid, values[gather] if len(values) else 0, 0)
+        # Sources and truth table select masks
+        self.src = {}
+        for pos in ("a", "b", "c"):
+            self.src[pos] = (take(f"src_{pos}"), take(f"src_{pos}_ip").astype(bool))
+        # Size the register file from the registers actually referenced
+        used = [take("tgt_reg")] + [x[~ip] for x, ip in self.src.values()]
+        self.num_regs = max([1] + [int(x.max()) + 1 for x in used if x.size])
+        truth      = take("truth")
+        self.truth = [
+            np.where(((truth >> bit) & 1) == 1, ONES, np.uint64(0))[..., None]
+            for bit in range(8)
+        ]
+        # Unused slots write to a scratch register and a scratch output
+        self.target = np.where(valid, take("tgt_reg"), self.num_regs)
+        gen_out     = take("gen_out").astype(bool)
+        out_index   = np.cumsum(gen_out, axis=0) - 1
+        self.out_col = np.where(valid & gen_out, out_index, self.num_outputs)
+
+    def __build_routing(self):
+        """ Flatten output mappings into arrays of sources and targets """
+        sources, targets, is_seq, egress, loops = [], [], [], {}, []
+        for node_idx, entry in enumerate(self.loader.nodes):
+            src = self.node_index(int(entry["row"]), int(entry["column"]))
+            for out_idx, output in enumerate(self.loader.output_table[node_idx]):
+                start, count = int(output["start"]), int(output["count"])
+                for mapping in self.loader.mappings[start:start+count]:
+                    tgt_row, tgt_col = int(mapping["row"]), int(mapping["column"])
+                    tgt_idx = int(mapping["index"])
+                    # Signals leaving the mesh are boundary outputs
+                    if tgt_row >= self.rows:
+                        egress[tgt_row, tgt_col, tgt_idx] = (src, out_idx)
+                        continue
+                    sources.append((src, out_idx))
+                    targets.append((self.node_index(tgt_row, tgt_col), tgt_idx))
+                    is_seq.append(bool(mapping["is_seq"]))
+            # Loopbacks capture an output into the input of the same index
+            mask  = self.loader.state[int(entry["row"])][int(entry["column"])].loopback
+            loops += [(src, x) for x in range(self.num_inputs) if (mask >> x) & 1]
+        sources = np.array(sources, dtype=np.int64).reshape(-1, 2)
+        targets = np.array(targets, dtype=np.int64).reshape(-1, 2)
+        is_seq  = np.array(is_seq, dtype=bool)
+        self.comb_src, self.comb_tgt = sources[~is_seq].T, targets[~is_seq].T
+        self.seq_src,  self.seq_tgt  = sources[is_seq].T,  targets[is_seq].T
+        self.loop   = np.array(loops, dtype=np.int64).reshape(-1, 2).T
+        self.egress = egress
+
+    def reset(self):
+        """ Return every lane to the initial (all zero) state """
+        shape = (self.num_nodes, self.num_inputs, self.words)
+        self.inputs_curr = np.zeros(shape, dtype=np.uint64)
+        self.inputs_next = np.zeros(shape, dtype=np.uint64)
+        self.registers   = np.zeros(
+            (self.num_nodes, self.num_regs + 1, self.words), dtype=np.uint64
+        )
+        self.outputs     = np.zeros(
+            (self.num_nodes, self.num_outputs + 1, self.words), dtype=np.uint64
+        )
+        self.cycle = 0
+
+    def evaluate(self, capture=False):
+        """ Execute the program of every node once against the current inputs.
+
+        Args:
+            capture: Whether to return the result of every instruction
+
+        Returns: When capturing, a NumPy array of shape (steps, nodes, words)
+                 holding the result of each instruction, otherwise None
+        """
+        nodes = np.arange(self.num_nodes)
+        regs, ins, outs = self.registers, self.inputs_curr, self.outputs
+        regs[:] = 0
+        captured = (
+            np.zeros((self.steps, self.num_nodes, self.words), dtype=np.uint64)
+            if capture else None
+        )
+        for step in range(self.steps):
+            values = []
+            for pos in ("a", "b", "c"):
+                index, is_ip = self.src[pos]
+                values.append(np.where(
+                    is_ip[step][:, None],
+                    ins[nodes, np.minimum(index[step], self.num_inputs - 1)],
+                    regs[nodes, np.minimum(index[step], self.num_regs)],
+                ))
+            a, b, c = values
+            # Select the truth table entry using a tree of multiplexers
+            def mux(sel, one, zero): return zero ^ (sel & (one ^ zero))
+            tt     = [x[step] for x in self.truth]
+            c_sel  = [mux(c, tt[idx + 1], tt[idx]) for idx in range(0, 8, 2)]
+            b_sel  = [mux(b, c_sel[1], c_sel[0]), mux(b, c_sel[3], c_sel[2])]
+            result = mux(a, b_sel[1], b_sel[0])
+            regs[nodes, self.target[step]]  = result
+            outs[nodes, self.out_col[step]] = result
+            if capture: captured[step] = result
+        return captured
+
+    def step(self, cycles=1):
+        """ Advance every lane by a number of cycles.
+
+        Args:
+            cycles: Number of cycles to run
+        """
+        for _ in range(cycles):
+            # Sequential inputs take their next value
+            self.inputs_curr[:] = self.inputs_next
+            # Evaluate until a pass changes no combinational signal - every pass
+            # resolves at least one more instruction along each path through
+            # the design, so a path can only still be changing after as many
+            # passes as there are instructions if it loops back on itself
+            for _ in range(self.num_instrs + 1):
+                self.evaluate()
+                updated = self.outputs[self.comb_src[0], self.comb_src[1]]
+                current = self.inputs_curr[self.comb_tgt[0], self.comb_tgt[1]]
+                if np.array_equal(updated, current): break
+                self.inputs_curr[self.comb_tgt[0], self.comb_tgt[1]] = updated
+            else:
+                raise Exception(f"Combinational signals oscillate in cycle {self.cycle}")
+            # Capture sequential signals and loopbacks for the next cycle
+            self.inputs_next[:] = self.inputs_curr
+            self.inputs_next[self.seq_tgt[0], self.seq_tgt[1]] = \
+                self.outputs[self.seq_src[0], self.seq_src[1]]
+            self.inputs_next[self.loop[0], self.loop[1]] = \
+                self.outputs[self.loop[0], self.loop[1]]
+            self.cycle += 1
+
+    def set_input(self, row, column, index, values):
+        """
+        Set the value of a node input in every lane, taking effect immediately
+        and persisting until the input is next driven.
+
+        Args:
+            row   : Row of the node
+            column: Column of the node
+            index : Input index within the node
+            values: Per-lane booleans
+        """
+        words = pack_lanes(values)[..., :self.words]
+        node  = self.node_index(row, column)
+        self.inputs_curr[node, index] = words
+        self.inputs_next[node, index] = words
+
+    def set_state(self, name, values):
+        """ Set the value held by a flop (as named in the state report).
+
+        Args:
+            name  : Name of the flop's output bit
+            values: Per-lane booleans
+        """
+        found = False
+        for key, flop in self.reports.get(DSG_REP_STATE, {}).items():
+            if flop != name: continue
+            row, column, index = map(int, re.match(r"R(\d+)C(\d+)I(\d+)", key).groups())
+            self.set_input(row, column, index, values)
+            found = True
+        if not found: raise Exception(f"Unknown state '{name}'")
+
+    def randomise_state(self, seed=None):
+        """ Give every flop of every lane a random value.
+
+        Args:
+            seed: Seed for the random number generator
+        """
+        rng  = np.random.default_rng(seed)
+        seen = set()
+        for flop in self.reports.get(DSG_REP_STATE, {}).values():
+            if flop in seen: continue
+            seen.add(flop)
+            self.set_state(flop, rng.integers(0, 2, self.lanes).astype(bool))
+
+    def get_output(self, name):
+        """ Read a boundary output of the design in every lane.
+
+        Args:
+            name: Name of the output port
+
+        Returns: NumPy array of the integer value of the output in each lane
+        """
+        bits  = self.reports[DSG_REP_OUTPUTS][name]
+        value = np.zeros(self.lanes, dtype=object if len(bits) > 63 else np.int64)
+        for idx_bit, (src_row, src_col, src_idx, *_) in enumerate(bits):
+            state = unpack_lanes(
+                self.outputs[self.node_index(src_row, src_col), src_idx], self.lanes
+            )
+            value += state.astype(value.dtype) << idx_bit
+        return value
+
+    def get_outputs(self):
+        """ Read every boundary output of the design in every lane.
+
+        Returns: Dictionary of output name to per-lane integer values
+        """
+        return {
+            x: self.get_output(x) for x in self.reports.get(DSG_REP_OUTPUTS, {})
+        }
+
+    def summary(self, lane=0):
+        """
+        Summarise the signals leaving the mesh in a single lane, keyed in the
+        same way as the output summaries of nxmodel.
+
+        Args:
+            lane: The lane to summarise
+
+        Returns: Dictionary of (row, column, index) to boolean state
+        """
+        word, bit = divmod(lane, 64)
+        return {
+            key: bool((int(self.outputs[node, idx, word]) >> bit) & 1)
+            for key, (node, idx) in self.egress.items()
+        }